@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic corpus of IFL-style grade workbooks for benchmarking.
+
+Each workbook has one grade sheet (a title block, a header row and one row
+per student with an ID, name, scores and a letter grade) among optional
+attendance/notes sheets. Options control the number of sheets, students,
+extra distractor columns, how often IDs are stored as floats or text, and
+how often a sheet carries a phantom used range from stray formatting.
+With --layouts, workbooks share a few fixed layouts (sheet names and grade
+sheet position), as copies of the same template do.
+Filenames mix class code and term ID spellings the way instructors write
+them, including some with no term or no class code. A terms.csv listing
+every term used is written next to the workbooks.
+
+Usage: python -m benchmarks.corpus OUTPUT_DIR [--files N] [--rows N] ...
+"""
+import csv
+import random
+import argparse
+from pathlib import Path
+from datetime import datetime, timedelta
+
+from openpyxl import Workbook
+from openpyxl.styles import Font
+
+# Term IDs in the shapes found in terms.csv, including ones that are
+# prefixes of others so filename matching has to pick the longest
+TERMS = [
+    '2019-2020T3E', '2022AT3E', '2022T4E', '2022T4ET4E', '2023T2E', '2023T2BT2E',
+    '240108E-T1AE', '240304E-T1BE', '250804E-T3BE', '250916E-T4AE', '251216E-T1AE',
+]
+
+# Class codes as instructors spell them in filenames
+CLASS_CODES = ['EHSS-101', 'EHSS 8', 'GESL-205A', 'GESL 110', 'IEAP-BEG', 'ieap-2', 'IEAP 3', 'ACAD-12B']
+
+FIRST_NAMES = ['Minji', 'Jisoo', 'Hyun', 'Seo-yeon', 'Daniel', 'Ji-ho', 'Yuna', 'Tae', 'Sora', 'Kevin']
+LAST_NAMES = ['Kim', 'Lee', 'Park', 'Choi', 'Jung', 'Kang', 'Cho', 'Yoon', 'Jang', 'Lim']
+GRADES = ['A', 'A', 'B', 'B', 'B', 'C', 'C', 'D', 'F']
+
+
+def _student_id(rng, float_ids, text_ids):
+    number = rng.randint(1000, 99999)
+    roll = rng.random()
+    if roll < float_ids:
+        return float(number)
+    if roll < float_ids + text_ids:
+        return str(number).zfill(5)
+    return number
+
+
+def _grade_sheet(ws, rng, options):
+    """Fill ws with a title block and one row per student."""
+    ws['A1'] = 'Institute of Foreign Languages - Final Grades'
+    ws['A2'] = f"Instructor: {rng.choice(LAST_NAMES)}"
+
+    header = ['No', 'Student ID', 'Name', 'Attendance', 'Midterm', 'Final', 'Total', 'Grade']
+    header += [f'Note {i + 1}' for i in range(options.distractors)]
+    ws.append([])
+    ws.append(header)
+
+    start = datetime(2024, 3, 4)
+    for n in range(1, options.rows + 1):
+        scores = [rng.randint(40, 100) for _ in range(3)]
+        row = [
+            n,
+            _student_id(rng, options.float_ids, options.text_ids),
+            f'{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)}',
+            *scores,
+            round(sum(scores) / 3, 1),
+            rng.choice(GRADES),
+        ]
+        # Distractors: dates, free text, and numbers in the ID range
+        for i in range(options.distractors):
+            kind = i % 3
+            if kind == 0:
+                row.append(start + timedelta(days=rng.randint(0, 120)))
+            elif kind == 1:
+                row.append(rng.choice(['', 'late', 'absent x2', 'makeup exam', 'OK']))
+            else:
+                row.append(rng.randint(1000, 99999))
+        ws.append(row)
+
+
+def _other_sheet(ws, rng, options):
+    """Fill ws with attendance-style data that holds no grades."""
+    ws.append(['Week', 'Date', 'Present', 'Absent'])
+    for week in range(1, options.other_rows + 1):
+        present = rng.randint(0, options.rows)
+        ws.append([week, datetime(2024, 3, 4) + timedelta(weeks=week), present, options.rows - present])
+
+
+def _add_phantom_range(ws, rng, options):
+    """Format empty rows and a far corner cell, as stray formatting does."""
+    bold = Font(bold=True)
+    last_row = ws.max_row
+    for row in range(last_row + 1, last_row + 1 + options.phantom_rows):
+        ws.cell(row=row, column=1).font = bold
+    ws.cell(row=last_row + options.phantom_rows + rng.randint(1000, 50000),
+            column=rng.randint(200, 2000)).font = bold
+
+
+def _filename(rng, index):
+    class_code = rng.choice(CLASS_CODES)
+    term = rng.choice(TERMS)
+    roll = rng.random()
+    if roll < 0.03:
+        return f'grade report {index}.xlsx'  # no class code or term
+    if roll < 0.06:
+        return f'{class_code} final grades {index}.xlsx'  # no term
+    if roll < 0.5:
+        return f'{class_code} final grades {index}_{term}.xlsx'
+    if roll < 0.8:
+        return f'{term} {class_code} grades {index}.xlsx'
+    return f'{class_code.lower()}_{index}_{term.lower()}.xlsx'
+
+
+def _sheet_title(rng, s, grade_sheet):
+    if s == grade_sheet:
+        return rng.choice(['Final', 'Grades', 'Sheet1'])
+    return rng.choice(['Attendance', 'Notes', 'Summary']) + f' {s}'
+
+
+def _layout(rng, options):
+    """Random (sheet titles, grade sheet index) for a shared layout."""
+    n_sheets = rng.randint(1, options.sheets)
+    grade_sheet = rng.randrange(n_sheets)
+    return [_sheet_title(rng, s, grade_sheet) for s in range(n_sheets)], grade_sheet
+
+
+def generate_corpus(output_dir, options):
+    """Write options.files workbooks and terms.csv to output_dir. Returns the workbook paths."""
+    rng = random.Random(options.seed)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    with open(output_dir / 'terms.csv', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['termid', 'startdate'])
+        writer.writerows((term, '2024-01-01 00:00:00.000') for term in TERMS)
+
+    layouts = [_layout(rng, options) for _ in range(options.layouts)]
+
+    paths = []
+    for index in range(options.files):
+        wb = Workbook()
+        if layouts:
+            titles, grade_sheet = rng.choice(layouts)
+            n_sheets = len(titles)
+        else:
+            titles = None
+            n_sheets = rng.randint(1, options.sheets)
+            grade_sheet = rng.randrange(n_sheets)
+        for s in range(n_sheets):
+            ws = wb.active if s == 0 else wb.create_sheet()
+            ws.title = titles[s] if titles else _sheet_title(rng, s, grade_sheet)
+            if s == grade_sheet:
+                _grade_sheet(ws, rng, options)
+            else:
+                _other_sheet(ws, rng, options)
+            if rng.random() < options.phantom:
+                _add_phantom_range(ws, rng, options)
+
+        path = output_dir / _filename(rng, index)
+        wb.save(path)
+        paths.append(path)
+    return paths
+
+
+def add_arguments(parser):
+    parser.add_argument('--files', type=int, default=200, help='Workbooks to write (default: 200)')
+    parser.add_argument('--sheets', type=int, default=3, help='Most sheets per workbook (default: 3)')
+    parser.add_argument('--rows', type=int, default=40, help='Students per grade sheet (default: 40)')
+    parser.add_argument('--other-rows', type=int, default=16,
+                        help='Rows on each attendance/notes sheet (default: 16)')
+    parser.add_argument('--layouts', type=int, default=0,
+                        help='Shared workbook layouts to draw from (default: 0, every workbook its own)')
+    parser.add_argument('--distractors', type=int, default=4,
+                        help='Extra non-grade columns on grade sheets (default: 4)')
+    parser.add_argument('--float-ids', type=float, default=0.2,
+                        help='Fraction of IDs stored as floats, e.g. 12345.0 (default: 0.2)')
+    parser.add_argument('--text-ids', type=float, default=0.1,
+                        help='Fraction of IDs stored as zero-padded text (default: 0.1)')
+    parser.add_argument('--phantom', type=float, default=0.1,
+                        help='Fraction of sheets with a phantom used range (default: 0.1)')
+    parser.add_argument('--phantom-rows', type=int, default=2000,
+                        help='Formatted empty rows on a phantom sheet (default: 2000)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic IFL grade workbooks')
+    parser.add_argument('output', help='Directory to write the corpus to')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    paths = generate_corpus(args.output, args)
+    print(f"Wrote {len(paths)} workbooks and terms.csv to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
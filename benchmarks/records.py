@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Measure the memory taken by extracted grade records.
+
+Builds the same synthetic records (a class's worth per workbook) three
+ways and reports the bytes each takes, as traced by tracemalloc:
+- dicts: one {'filename', 'student_id', 'grade'} dict per record, as the
+  records were once held before being written
+- tuples: one list of (student_id, grade) tuples per workbook, as
+  process_xlsx_file used to return them
+- batches: one GradeBatch per workbook
+The pickled size of each workbook's records, which is what worker
+processes send back, is reported for tuples and batches.
+
+Usage, from the repository root:
+    python -m benchmarks.records [--records 200000] [--per-file 40] [--out records.json]
+"""
+import gc
+import json
+import pickle
+import random
+import argparse
+import tracemalloc
+
+from extraction.records import GradeBatch
+
+DEFAULT_RECORDS = 200_000
+
+GRADES = 'AABBBCCDF'
+
+
+def _synthetic_files(records, per_file, seed):
+    """[(filename, student_ids, grades)] with fresh strings, as the detector produces them."""
+    rng = random.Random(seed)
+    files = []
+    for i in range(0, records, per_file):
+        count = min(per_file, records - i)
+        files.append((f'EHSS-101 final {i // per_file}_2023T2E',
+                      [f'{rng.randrange(100000):05d}' for _ in range(count)],
+                      [rng.choice(GRADES) for _ in range(count)]))
+    return files
+
+
+def _as_dicts(files):
+    return [{'filename': filename, 'student_id': student_id, 'grade': grade}
+            for filename, student_ids, grades in files
+            for student_id, grade in zip(student_ids, grades)]
+
+
+def _as_tuples(files):
+    return [list(zip(student_ids, grades)) for _, student_ids, grades in files]
+
+
+def _as_batches(files):
+    return [GradeBatch.from_columns(filename, student_ids, grades) for filename, student_ids, grades in files]
+
+
+def traced_bytes(build, records):
+    """Bytes still allocated after build(fresh copy of records) returns, and the result."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    # Fresh ID strings, traced, so whatever the build keeps of them counts
+    fresh = [(filename, [''.join(list(s)) for s in student_ids], grades)
+             for filename, student_ids, grades in records]
+    result = build(fresh)
+    del fresh
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the memory taken by extracted grade records')
+    parser.add_argument('--records', type=int, default=DEFAULT_RECORDS,
+                        help=f'Records to build (default: {DEFAULT_RECORDS})')
+    parser.add_argument('--per-file', type=int, default=40, help='Records per workbook (default: 40)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    parser.add_argument('--out', help='Also write the results as JSON to this file')
+    args = parser.parse_args()
+
+    files = _synthetic_files(args.records, max(1, args.per_file), args.seed)
+    results = []
+    for name, build in (('dicts', _as_dicts), ('tuples', _as_tuples), ('batches', _as_batches)):
+        size, built = traced_bytes(build, files)
+        pickled = None
+        if name != 'dicts':
+            pickled = sum(len(pickle.dumps(records, pickle.HIGHEST_PROTOCOL)) for records in built)
+        del built
+        results.append({'name': name, 'bytes': size, 'bytes_per_record': round(size / args.records, 1),
+                        'pickled_bytes': pickled})
+
+    baseline = results[0]['bytes']
+    print(f"{args.records:,} records in {len(files):,} workbooks")
+    print(f"{'layout':<10}{'MB':>10}{'bytes/rec':>12}{'vs dicts':>10}{'pickled MB':>12}")
+    for r in results:
+        pickled = f"{r['pickled_bytes'] / 1e6:>12.2f}" if r['pickled_bytes'] is not None else f"{'-':>12}"
+        print(f"{r['name']:<10}{r['bytes'] / 1e6:>10.2f}{r['bytes_per_record']:>12.1f}"
+              f"{r['bytes'] / baseline:>9.3f}x{pickled}")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'records': args.records, 'per_file': args.per_file, 'results': results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Time the extractor against a synthetic workbook corpus.
+
+Benchmarks, each run in a fresh process so its peak RSS is its own:
+- termid: extract_termid_from_filename over every filename (repeated)
+- detect: find_grade_and_id_columns over pre-loaded grade sheets
+- parse-<engine>: process_xlsx_file over every workbook
+- directory: process_directory_by_term over a copy of the corpus
+- directory-warm: the same, after an untimed run has learned the sheet
+  templates (the manifest is ignored, so every workbook is parsed again)
+
+Each reports seconds, files/sec (filenames for termid, sheets for
+detect), records/sec (matches for termid, detected sheets for detect) and
+peak RSS. Results are
+printed and written as JSON; pass --compare with an earlier results file
+to see the change per benchmark.
+
+Usage, from the repository root:
+    python -m benchmarks.run [--corpus DIR] [--out results.json] [--compare old.json]
+Without --corpus a corpus is generated in a temporary directory (the
+generator options of benchmarks.corpus apply).
+"""
+import io
+import sys
+import json
+import time
+import shutil
+import platform
+import resource
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from pathlib import Path
+from datetime import datetime, timezone
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.corpus import add_arguments, generate_corpus
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _peak_rss_mb():
+    """Peak RSS of this process and its finished children, in MB."""
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and KB elsewhere
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def _bench_termid(corpus, repeat):
+    from extract_grades import TermMatcher, load_terms, extract_termid_from_filename
+
+    with redirect_stdout(io.StringIO()):
+        matcher = TermMatcher(load_terms(corpus / 'terms.csv'))
+    names = [path.name for path in sorted(corpus.glob('*.xlsx'))] * repeat
+
+    start = time.perf_counter()
+    found = sum(1 for name in names if extract_termid_from_filename(name, matcher))
+    return time.perf_counter() - start, len(names), found
+
+
+def _bench_detect(corpus, repeat):
+    import pandas as pd
+    from extract_grades import find_grade_and_id_columns
+
+    # Load every sheet up front so only detection is timed
+    frames = []
+    for path in sorted(corpus.glob('*.xlsx')):
+        frames.extend(pd.read_excel(path, sheet_name=None, header=None).values())
+
+    start = time.perf_counter()
+    found = 0
+    for _ in range(repeat):
+        for df in frames:
+            grade_col, id_col = find_grade_and_id_columns(df)
+            found += grade_col is not None and id_col is not None
+    return time.perf_counter() - start, len(frames) * repeat, found
+
+
+def _bench_parse(corpus, engine):
+    from extract_grades import process_xlsx_file
+
+    paths = sorted(corpus.glob('*.xlsx'))
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        records = sum(len(process_xlsx_file(path, engine=engine)) for path in paths)
+    return time.perf_counter() - start, len(paths), records
+
+
+def _bench_directory(corpus, engine, jobs, warm=False):
+    from extract_grades import process_directory_by_term
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir = Path(tmp) / 'input'
+
+        def copy_input():
+            # Unidentified files are moved out of the input, so work on a fresh copy
+            shutil.rmtree(input_dir, ignore_errors=True)
+            shutil.copytree(corpus, input_dir, ignore=shutil.ignore_patterns('terms.csv'))
+
+        def run():
+            with redirect_stdout(io.StringIO()):
+                return process_directory_by_term(input_dir, Path(tmp) / 'output',
+                                                 terms_file=corpus / 'terms.csv',
+                                                 jobs=jobs, engine=engine, rebuild=True)
+
+        if warm:
+            copy_input()
+            run()
+        copy_input()
+        n_files = sum(1 for _ in input_dir.glob('*.xlsx'))
+        start = time.perf_counter()
+        counts = run()
+        return time.perf_counter() - start, n_files, sum(counts.values())
+
+
+BENCHMARKS = {
+    'termid': _bench_termid,
+    'detect': _bench_detect,
+    'parse': _bench_parse,
+    'directory': _bench_directory,
+}
+
+
+def _run_one(kind, *args):
+    """Run one benchmark (in a worker process) and return its measurements."""
+    seconds, files, records = BENCHMARKS[kind](*args)
+    return {
+        'seconds': round(seconds, 4),
+        'files': files,
+        'records': records,
+        'files_per_sec': round(files / seconds, 1) if seconds else None,
+        'records_per_sec': round(records / seconds, 1) if seconds else None,
+        'peak_rss_mb': round(_peak_rss_mb(), 1),
+    }
+
+
+def run_benchmark(name, kind, *args):
+    # A fresh interpreter per benchmark keeps peak RSS from carrying over
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        result = executor.submit(_run_one, kind, *args).result()
+    result['name'] = name
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, previous=None):
+    """Print a results table, with the time ratio to previous results if given."""
+    baseline = {r['name']: r for r in (previous or {}).get('results', [])}
+
+    print(f"{'benchmark':<24}{'seconds':>10}{'files/s':>12}{'records/s':>12}{'peak MB':>10}")
+    for r in results:
+        line = (f"{r['name']:<24}{r['seconds']:>10.4f}{r['files_per_sec'] or 0:>12,.1f}"
+                f"{r['records_per_sec'] or 0:>12,.1f}{r['peak_rss_mb']:>10.1f}")
+        old = baseline.get(r['name'])
+        if old and old['seconds']:
+            line += f"{r['seconds'] / old['seconds']:>8.2f}x vs {previous.get('commit') or 'previous'}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark grade extraction on a synthetic corpus')
+    parser.add_argument('--corpus', help='Existing corpus directory (default: generate one)')
+    parser.add_argument('--out', default='benchmark_results.json',
+                        help='JSON results file (default: benchmark_results.json)')
+    parser.add_argument('--compare', help='Earlier results file to compare against')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='Passes over the corpus for the termid/detect benchmarks (default: 20)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Worker processes for the directory run (default: 1)')
+    parser.add_argument('--engines', nargs='+', default=['pandas', 'fast'],
+                        help='Engines to benchmark (default: pandas fast)')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.corpus:
+            corpus = Path(args.corpus).resolve()
+        else:
+            corpus = Path(tmp) / 'corpus'
+            generate_corpus(corpus, args)
+            print(f"Generated {args.files} workbooks in {corpus}")
+
+        plan = [('termid', 'termid', corpus, args.repeat), ('detect', 'detect', corpus, args.repeat)]
+        for engine in args.engines:
+            plan.append((f'parse-{engine}', 'parse', corpus, engine))
+        for engine in args.engines:
+            plan.append((f'directory-{engine}', 'directory', corpus, engine, args.jobs))
+        for engine in args.engines:
+            plan.append((f'directory-{engine}-warm', 'directory', corpus, engine, args.jobs, True))
+
+        results = []
+        for name, kind, *bench_args in plan:
+            print(f"Running {name}...", flush=True)
+            results.append(run_benchmark(name, kind, *bench_args))
+
+    commit = _git_commit()
+    for r in results:
+        r['commit'] = commit
+
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpus': args.corpus or {key: getattr(args, key) for key in (
+            'files', 'sheets', 'rows', 'other_rows', 'layouts', 'distractors', 'float_ids',
+            'text_ids', 'phantom', 'phantom_rows', 'seed')},
+        'jobs': args.jobs,
+        'results': results,
+    }
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+    print()
+    print_results(results, previous)
+
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults: {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Check that the command-line tools start quickly.
+
+For each entry point, a fresh interpreter imports the module and then runs
+the script with --help, a few times each. The check fails (exit status 1)
+if the median import time goes over the budget, or if importing the
+module loaded a heavy dependency that should wait until first use (pandas,
+numpy, openpyxl, pymssql, dotenv).
+
+Usage, from the repository root:
+    python -m benchmarks.startup [--budget-ms 150] [--repeat 5] [--out startup.json]
+"""
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+ENTRY_POINTS = ['extract_grades', 'update_grades', 'process_failed_grades', 'database.connection']
+
+HEAVY_MODULES = ['pandas', 'numpy', 'openpyxl', 'pymssql', 'dotenv']
+
+DEFAULT_BUDGET_MS = 150
+
+# Run in the child: time the import and list the heavy modules it pulled in
+_IMPORT_PROBE = """
+import sys, time, json, importlib
+start = time.perf_counter()
+importlib.import_module({module!r})
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def time_import(module):
+    """Import module in a fresh interpreter. Returns (seconds, heavy modules loaded)."""
+    probe = _IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, '-c', probe], cwd=REPO_ROOT,
+                            capture_output=True, text=True, check=True)
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    return data['seconds'], data['loaded']
+
+
+def time_help(module):
+    """Wall time of `python <script> --help`, interpreter startup included."""
+    script = REPO_ROOT / (module.replace('.', '/') + '.py')
+    start = time.perf_counter()
+    subprocess.run([sys.executable, str(script), '--help'], cwd=REPO_ROOT,
+                   capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check command-line startup time')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help=f'Largest allowed median import time (default: {DEFAULT_BUDGET_MS} ms)')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per entry point (default: 5)')
+    parser.add_argument('--out', help='Also write the results as JSON to this file')
+    args = parser.parse_args()
+
+    results = []
+    failures = []
+    for module in ENTRY_POINTS:
+        import_times = []
+        loaded = set()
+        for _ in range(args.repeat):
+            seconds, heavy = time_import(module)
+            import_times.append(seconds)
+            loaded.update(heavy)
+
+        # Library modules have no --help
+        help_times = []
+        if module != 'database.connection':
+            help_times = [time_help(module) for _ in range(args.repeat)]
+
+        import_ms = statistics.median(import_times) * 1000
+        help_ms = statistics.median(help_times) * 1000 if help_times else None
+        results.append({'module': module, 'import_ms': round(import_ms, 1),
+                        'help_ms': round(help_ms, 1) if help_ms else None,
+                        'heavy_modules_loaded': sorted(loaded)})
+
+        line = f"  {module:<24}import {import_ms:7.1f} ms"
+        if help_ms:
+            line += f"   --help {help_ms:7.1f} ms"
+        print(line)
+
+        if import_ms > args.budget_ms:
+            failures.append(f"{module} imports in {import_ms:.1f} ms (budget {args.budget_ms:g} ms)")
+        if loaded:
+            failures.append(f"{module} loads {', '.join(sorted(loaded))} at import")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'budget_ms': args.budget_ms, 'results': results}, f, indent=2)
+
+    if failures:
+        print("\nFAILED:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+
+    print(f"\nOK: all entry points import within {args.budget_ms:g} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Check that the fast xlsx engine extracts exactly what the pandas engine does.
+
+Runs both engines over the sample workbook, a set of generated workbooks
+covering the awkward cases (numeric IDs, IDs stored as text, padded and
+float-formatted IDs, NA strings, booleans, dates, blank rows, extra sheets,
+inline strings) and any xlsx files or directories given on the command line.
+Exits non-zero if any file differs.
+"""
+import sys
+import random
+import argparse
+import tempfile
+from pathlib import Path
+from datetime import datetime, timedelta
+
+from openpyxl import Workbook
+
+from extract_grades import VALID_GRADES, process_xlsx_file
+
+SAMPLE_WORKBOOK = Path(__file__).parent / 'EHSS 8 final grades July 2022_2022T4E.xlsx'
+
+GRADES = sorted(VALID_GRADES) + ['a', 'b+ ', 'X', 'Pass']
+NOISE = ['NA', 'None', 'n/a', '', ' ', 'TOTAL', True, False, 0, 3.5, 100000, 999]
+
+
+def _student_id(rng):
+    number = rng.randint(100, 99999)
+    style = rng.randrange(6)
+    if style == 0:
+        return number
+    if style == 1:
+        return float(number)
+    if style == 2:
+        return str(number).zfill(5)
+    if style == 3:
+        return f' {number} '
+    if style == 4:
+        return f'{number}.0'
+    return str(number)
+
+
+def _write_fixture(path, rng):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Cover' if rng.random() < 0.3 else 'Grades'
+    if ws.title == 'Cover':
+        ws['A1'] = 'Final grades'
+        ws = wb.create_sheet('Grades')
+
+    n_cols = rng.randint(2, 8)
+    id_col, grade_col = rng.sample(range(1, n_cols + 1), 2)
+    start = rng.randint(1, 6)
+    ws.cell(row=start, column=id_col, value='Student ID')
+    ws.cell(row=start, column=grade_col, value='Grade')
+
+    for row in range(start + 1, start + 1 + rng.randint(0, 60)):
+        if rng.random() < 0.1:
+            continue  # blank row
+        for col in range(1, n_cols + 1):
+            if col == id_col:
+                value = _student_id(rng) if rng.random() < 0.9 else rng.choice(NOISE)
+            elif col == grade_col:
+                value = rng.choice(GRADES) if rng.random() < 0.9 else rng.choice(NOISE)
+            elif rng.random() < 0.2:
+                value = datetime(2022, 1, 1) + timedelta(days=rng.randint(0, 400))
+            else:
+                value = rng.choice(NOISE + ['Kim', 'Lee', rng.random() * 100])
+            ws.cell(row=row, column=col, value=value)
+
+    if rng.random() < 0.3:
+        wb.create_sheet('Notes')['B2'] = 'A+'
+    wb.save(path)
+
+
+def generate_fixtures(directory, count, seed):
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        path = Path(directory) / f'fixture_{i:03d}.xlsx'
+        _write_fixture(path, rng)
+        paths.append(path)
+    return paths
+
+
+def compare(paths):
+    """Return the paths whose pandas and fast engine results differ."""
+    mismatches = []
+    for path in paths:
+        expected = process_xlsx_file(path, engine='pandas')
+        actual = process_xlsx_file(path, engine='fast')
+        if expected != actual:
+            print(f"MISMATCH {path}: pandas {len(expected)} records, fast {len(actual)} records")
+            mismatches.append(path)
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the pandas and fast xlsx engines')
+    parser.add_argument('paths', nargs='*', help='Extra xlsx files or directories to compare')
+    parser.add_argument('--fixtures', type=int, default=100, help='Generated workbooks (default: 100)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for generated workbooks')
+    args = parser.parse_args()
+
+    paths = [SAMPLE_WORKBOOK] if SAMPLE_WORKBOOK.exists() else []
+    for arg in args.paths:
+        arg = Path(arg)
+        paths.extend(sorted(arg.rglob('*.xlsx')) if arg.is_dir() else [arg])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths.extend(generate_fixtures(tmp, args.fixtures, args.seed))
+        mismatches = compare(paths)
+
+    print(f"Compared {len(paths)} workbooks: {len(mismatches)} mismatches")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
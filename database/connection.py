@@ -1,32 +1,52 @@
 import logging
-import pymssql
 import os
+import threading
+import time
 from contextlib import contextmanager
-from dotenv import load_dotenv
+from functools import cache
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
+# Connections the shared pool keeps open, and the most it opens at once.
+# Overridden by LEGACY_DB_POOL_MIN / LEGACY_DB_POOL_MAX.
+DEFAULT_POOL_MIN_SIZE = 1
+DEFAULT_POOL_MAX_SIZE = 4
 
-# Configure FreeTDS to use local config (Critical for MSSQL 2008/2012)
-freetds_conf_path = os.path.abspath("freetds.conf")
-if os.path.exists(freetds_conf_path):
-    os.environ["FREETDSCONF"] = freetds_conf_path
-    logger.info(f"Using FREETDSCONF: {freetds_conf_path}")
+# Seconds an idle connection above the minimum is kept, and between
+# keep-alive pings of idle connections (0 = no keep-alive thread)
+DEFAULT_POOL_MAX_IDLE = 300
+DEFAULT_POOL_KEEPALIVE = 60
+
+
+@cache
+def configure():
+    """
+    Load environment variables and FreeTDS config for the legacy server.
+    Runs once, on the first call; importing this module does no setup.
+    """
+    # Load environment variables
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    # Configure FreeTDS to use local config (Critical for MSSQL 2008/2012)
+    freetds_conf_path = os.path.abspath("freetds.conf")
+    if os.path.exists(freetds_conf_path):
+        os.environ["FREETDSCONF"] = freetds_conf_path
+        logger.info(f"Using FREETDSCONF: {freetds_conf_path}")
 
 
 # Settings class to handle configuration
 class Settings:
-    LEGACY_DB_HOST = os.getenv("LEGACY_DB_HOST")
-    LEGACY_DB_PORT = (
-        int(os.getenv("LEGACY_DB_PORT")) if os.getenv("LEGACY_DB_PORT") else None
-    )
-    LEGACY_DB_USER = os.getenv("LEGACY_DB_USER")
-    LEGACY_DB_PASSWORD = os.getenv("LEGACY_DB_PASSWORD")
-    LEGACY_DB_NAME = os.getenv("LEGACY_DB_NAME")
+    def __init__(self):
+        self.LEGACY_DB_HOST = os.getenv("LEGACY_DB_HOST")
+        self.LEGACY_DB_PORT = (
+            int(os.getenv("LEGACY_DB_PORT")) if os.getenv("LEGACY_DB_PORT") else None
+        )
+        self.LEGACY_DB_USER = os.getenv("LEGACY_DB_USER")
+        self.LEGACY_DB_PASSWORD = os.getenv("LEGACY_DB_PASSWORD")
+        self.LEGACY_DB_NAME = os.getenv("LEGACY_DB_NAME")
+        self.LEGACY_DB_POOL_MIN = int(os.getenv("LEGACY_DB_POOL_MIN") or DEFAULT_POOL_MIN_SIZE)
+        self.LEGACY_DB_POOL_MAX = int(os.getenv("LEGACY_DB_POOL_MAX") or DEFAULT_POOL_MAX_SIZE)
 
     def __post_init__(self):
         """Validate that all required environment variables are set."""
@@ -49,7 +69,18 @@ class Settings:
             )
 
 
-settings = Settings()
+@cache
+def get_settings():
+    """Settings from the environment (and .env), read on first use."""
+    configure()
+    return Settings()
+
+
+def __getattr__(name):
+    # `settings` used to be built at import time; build it on first access
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def get_db_connection():
@@ -57,6 +88,10 @@ def get_db_connection():
     Get a database connection to legacy MSSQL 2012 server.
     Uses settings compatible with MSSQL 2012 (TDS 7.3, no encryption).
     """
+    settings = get_settings()
+    # Imported after configure() so FreeTDS sees FREETDSCONF
+    import pymssql
+
     try:
         logger.debug(
             f"Connecting to {settings.LEGACY_DB_HOST}:{settings.LEGACY_DB_PORT}"
@@ -78,16 +113,240 @@ def get_db_connection():
         raise
 
 
+def _is_alive(conn):
+    """Round-trip a trivial query; False if the connection has been dropped."""
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        return True
+    except Exception:
+        return False
+
+
+def _rolled_back(conn):
+    """Roll back any open transaction; False if that failed."""
+    try:
+        conn.rollback()
+        return True
+    except Exception:
+        return False
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """
+    Connections to the legacy server, reused across files instead of
+    logging in again for each one.
+
+    connection() checks a connection out for the length of a with block.
+    An idle connection is pinged before it is handed out, and one that
+    the server has dropped is replaced with a fresh login, so callers never
+    see a stale connection. When the block ends, anything it left
+    uncommitted is rolled back before the connection goes back to the
+    pool; callers commit their own work. If the block raised, the
+    connection is pinged first and discarded if it has died.
+
+    At most max_size connections are open at once; a checkout beyond that
+    waits for one to be returned. Idle connections beyond min_size are
+    closed after max_idle seconds. With keepalive, a background thread
+    pings idle connections every keepalive seconds so the server doesn't
+    time them out between files.
+
+    stats counts connections opened, checkouts and reuses, waits (and
+    seconds spent waiting), connections found dropped, and the most
+    connections in use at once.
+    """
+
+    def __init__(self, connect=None, min_size=DEFAULT_POOL_MIN_SIZE, max_size=DEFAULT_POOL_MAX_SIZE,
+                 max_idle=DEFAULT_POOL_MAX_IDLE, keepalive=0):
+        self._connect = connect or get_db_connection
+        self.max_size = max(1, max_size)
+        self.min_size = max(0, min(min_size, self.max_size))
+        self.max_idle = max_idle
+        self._lock = threading.Condition()
+        self._idle = []  # (connection, when it was returned), most recent last
+        self._in_use = 0  # checked out, or being opened for a checkout
+        self._closed = False
+        self.stats = {'opened': 0, 'checkouts': 0, 'reused': 0, 'waits': 0, 'wait_seconds': 0.0,
+                      'dropped': 0, 'peak_in_use': 0}
+
+        self._stop = threading.Event()
+        if keepalive:
+            threading.Thread(target=self._keep_alive, args=(keepalive,), daemon=True).start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def acquire(self, timeout=None):
+        """
+        Check out a live connection, waiting up to timeout seconds (None =
+        forever) for one to be free. Prefer connection().
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waited_since = None
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise RuntimeError("connection pool is closed")
+                if self._idle:
+                    conn = self._idle.pop()[0]
+                    break
+                if self._in_use < self.max_size:
+                    conn = None
+                    break
+                if waited_since is None:
+                    waited_since = time.monotonic()
+                    self.stats['waits'] += 1
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self.stats['wait_seconds'] += time.monotonic() - waited_since
+                    raise TimeoutError(f"no database connection free after {timeout:g}s")
+                self._lock.wait(remaining)
+            if waited_since is not None:
+                self.stats['wait_seconds'] += time.monotonic() - waited_since
+            # The slot is taken now; logging in or pinging happens outside the lock
+            self._in_use += 1
+            self.stats['checkouts'] += 1
+            self.stats['peak_in_use'] = max(self.stats['peak_in_use'], self._in_use)
+
+        try:
+            if conn is not None and _is_alive(conn):
+                self._count('reused')
+                return conn
+            if conn is not None:
+                logger.info("Database connection was dropped by the server; reconnecting")
+                _close_quietly(conn)
+                self._count('dropped')
+            conn = self._connect()
+            self._count('opened')
+            return conn
+        except BaseException:
+            with self._lock:
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def release(self, conn, discard=False):
+        """Return a checked-out connection, or with discard close it instead."""
+        with self._lock:
+            self._in_use -= 1
+            if discard or self._closed:
+                _close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._trim()
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Check out a connection for a with block (see the class docstring)."""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, discard=not (_is_alive(conn) and _rolled_back(conn)))
+            raise
+        # End any transaction the caller left open before the next one gets it
+        self.release(conn, discard=not _rolled_back(conn))
+
+    def _trim(self):
+        """Close idle connections over min_size that have sat unused past max_idle (lock held)."""
+        now = time.monotonic()
+        while (len(self._idle) + self._in_use > self.min_size and self._idle
+               and now - self._idle[0][1] > self.max_idle):
+            _close_quietly(self._idle.pop(0)[0])
+
+    def _keep_alive(self, interval):
+        while not self._stop.wait(interval):
+            self.ping_idle()
+
+    def ping_idle(self):
+        """
+        Ping every idle connection, dropping dead ones, then open new ones
+        until min_size are open. Run by the keep-alive thread.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._in_use += len(idle)
+        # Ping outside the lock; live connections keep their idle time
+        for conn, since in idle:
+            alive = _is_alive(conn)
+            with self._lock:
+                self._in_use -= 1
+                if alive and not self._closed:
+                    self._idle.append((conn, since))
+                else:
+                    _close_quietly(conn)
+                    self.stats['dropped'] += not alive
+                self._lock.notify()
+
+        with self._lock:
+            self._idle.sort(key=lambda item: item[1])
+            self._trim()
+            missing = 0 if self._closed else max(0, self.min_size - len(self._idle) - self._in_use)
+            self._in_use += missing
+        for opened in range(missing):
+            try:
+                conn = self._connect()
+            except Exception as e:
+                logger.warning(f"Could not open a pooled database connection: {e}")
+                with self._lock:
+                    self._in_use -= missing - opened
+                    self._lock.notify()
+                return
+            self._count('opened')
+            self.release(conn)
+
+    def close(self):
+        """Close every idle connection; connections still checked out are closed when returned."""
+        self._stop.set()
+        with self._lock:
+            self._closed = True
+            for conn, _ in self._idle:
+                _close_quietly(conn)
+            self._idle = []
+            self._lock.notify_all()
+
+    def describe(self):
+        """One-line summary of stats for logs."""
+        s = self.stats
+        return (f"{s['opened']} connections opened for {s['checkouts']} checkouts "
+                f"({s['reused']} reused, {s['dropped']} found dropped by the server); "
+                f"{s['waits']} waits totalling {s['wait_seconds']:.1f}s; "
+                f"at most {s['peak_in_use']} in use")
+
+
+@cache
+def get_pool():
+    """
+    The shared ConnectionPool for this process, sized from
+    LEGACY_DB_POOL_MIN / LEGACY_DB_POOL_MAX and created on first use.
+    """
+    settings = get_settings()
+    return ConnectionPool(min_size=settings.LEGACY_DB_POOL_MIN, max_size=settings.LEGACY_DB_POOL_MAX,
+                          keepalive=DEFAULT_POOL_KEEPALIVE)
+
+
 @contextmanager
 def db_cursor():
-    """Context manager for database cursor."""
-    conn = None
+    """Context manager for a database cursor on a connection from the shared pool."""
     try:
-        conn = get_db_connection()
-        yield conn.cursor(as_dict=True)
+        with get_pool().connection() as conn:
+            yield conn.cursor(as_dict=True)
     except Exception as e:
         logger.error(f"Database error: {e}")
         raise
-    finally:
-        if conn:
-            conn.close()
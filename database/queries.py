@@ -0,0 +1,252 @@
+import threading
+from collections import namedtuple
+from functools import cache
+
+# IN-lists are padded (by repeating their last value) to the next power of
+# two, so a statement has only a handful of shapes; and multi-row VALUES
+# lists are split into power-of-two chunks for the same reason. A statement
+# takes at most 2100 parameters.
+MAX_LIST_SIZE = 1024
+MAX_VALUES_ROWS = 512
+
+# A named statement: its text, with @name placeholders; its parameters as
+# (name, SQL type) pairs; and, for an IN-list or VALUES list, the per-row
+# template ({i} is the row number), its parameters, again as pairs, and
+# whether the list may be padded (true for IN-lists only). Statements
+# without parameters are sent as they are.
+Statement = namedtuple('Statement', ['sql', 'params', 'row', 'row_params', 'pad'],
+                       defaults=((), None, (), False))
+
+# update_grades' per-student UPDATE; {output} is where an OUTPUT clause goes
+_UPDATE_CLASS_GRADE = """UPDATE AcademicCourseTakers
+SET Grade = @grade
+{output}WHERE ID = @id
+  AND classid LIKE @class_pattern
+  AND section NOT IN ('87', '147')
+  AND Attendance = 'Normal'
+  AND (
+    SELECT COUNT(*)
+    FROM AcademicCourseTakers AS t
+    WHERE t.ID = @id
+      AND t.classid LIKE @class_pattern
+      AND t.section NOT IN ('87', '147')
+      AND t.Attendance = 'Normal'
+  ) BETWEEN 2 AND 3"""
+
+STATEMENTS = {
+    # update_grades: enrollment counts and the dry-run sample
+    'count_class_records': Statement(
+        """SELECT ID, COUNT(*)
+FROM AcademicCourseTakers
+WHERE classid LIKE @class_pattern
+  AND ID IN ({rows})
+  AND section NOT IN ('87', '147')
+  AND Attendance = 'Normal'
+GROUP BY ID""",
+        (('class_pattern', 'VARCHAR(50)'),), '@id{i}', (('id{i}', 'VARCHAR(20)'),), True),
+    'sample_class_records': Statement(
+        """SELECT TOP 5 ID, classid, Grade, section
+FROM AcademicCourseTakers
+WHERE classid LIKE @class_pattern
+  AND ID IN ({rows})
+  AND section NOT IN ('87', '147')
+  AND Attendance = 'Normal'
+ORDER BY ID""",
+        (('class_pattern', 'VARCHAR(50)'),), '@id{i}', (('id{i}', 'VARCHAR(20)'),), True),
+
+    # update_grades real mode: one UPDATE per student (as written out by
+    # generate_all_updates, and as run, noting updated rows in #updated_ids)...
+    'update_class_grade': Statement(
+        _UPDATE_CLASS_GRADE.replace('{output}', ''),
+        (('grade', 'VARCHAR(10)'), ('id', 'VARCHAR(20)'), ('class_pattern', 'VARCHAR(50)'))),
+    'apply_class_grade': Statement(
+        _UPDATE_CLASS_GRADE.replace('{output}', 'OUTPUT inserted.ID INTO #updated_ids (ID)\n'),
+        (('grade', 'VARCHAR(10)'), ('id', 'VARCHAR(20)'), ('class_pattern', 'VARCHAR(50)'))),
+
+    # ...or one staged UPDATE per file. The temp tables are created and
+    # dropped outside sp_executesql, which would drop them on return.
+    # Rows updated are counted from #updated_ids: pymssql's rowcount after
+    # sp_executesql can be -1.
+    'drop_staging': Statement(
+        """IF OBJECT_ID('tempdb..#staged_grades') IS NOT NULL DROP TABLE #staged_grades;
+IF OBJECT_ID('tempdb..#updated_ids') IS NOT NULL DROP TABLE #updated_ids"""),
+    'create_staging': Statement(
+        """CREATE TABLE #staged_grades (
+    ID VARCHAR(20) COLLATE DATABASE_DEFAULT PRIMARY KEY,
+    Grade VARCHAR(10) COLLATE DATABASE_DEFAULT NOT NULL
+);
+CREATE TABLE #updated_ids (ID VARCHAR(20) COLLATE DATABASE_DEFAULT NOT NULL)"""),
+    'stage_grades': Statement(
+        "INSERT INTO #staged_grades (ID, Grade) VALUES {rows}",
+        (), '(@id{i}, @grade{i})', (('id{i}', 'VARCHAR(20)'), ('grade{i}', 'VARCHAR(10)'))),
+    'apply_staged_grades': Statement(
+        """UPDATE t
+SET Grade = s.Grade
+OUTPUT inserted.ID INTO #updated_ids (ID)
+FROM AcademicCourseTakers AS t
+JOIN #staged_grades AS s ON s.ID = t.ID
+JOIN (
+    SELECT c.ID
+    FROM AcademicCourseTakers AS c
+    JOIN #staged_grades AS e ON e.ID = c.ID
+    WHERE c.classid LIKE @class_pattern
+      AND c.section NOT IN ('87', '147')
+      AND c.Attendance = 'Normal'
+    GROUP BY c.ID
+    HAVING COUNT(*) BETWEEN 2 AND 3
+) AS eligible ON eligible.ID = t.ID
+WHERE t.classid LIKE @class_pattern
+  AND t.section NOT IN ('87', '147')
+  AND t.Attendance = 'Normal'""",
+        (('class_pattern', 'VARCHAR(50)'),)),
+    'count_updated_ids': Statement("SELECT ID, COUNT(*) FROM #updated_ids GROUP BY ID"),
+
+    # process_failed_grades: IP records for a term, and why a student has none
+    'count_student_records': Statement(
+        "SELECT COUNT(*) FROM AcademicCourseTakers WHERE ID = @id",
+        (('id', 'VARCHAR(20)'),)),
+    'count_term_records': Statement(
+        "SELECT COUNT(*) FROM AcademicCourseTakers WHERE ID = @id AND classid LIKE @term_pattern",
+        (('id', 'VARCHAR(20)'), ('term_pattern', 'VARCHAR(50)'))),
+    'count_ip_records': Statement(
+        """SELECT COUNT(*)
+FROM AcademicCourseTakers
+WHERE classid LIKE @term_pattern
+  AND grade = 'IP'
+  AND ID = @id""",
+        (('term_pattern', 'VARCHAR(50)'), ('id', 'VARCHAR(20)'))),
+    # Returns its own row count, for the same reason
+    'update_ip_grade': Statement(
+        """UPDATE academiccoursetakers
+SET grade = @grade
+WHERE classid LIKE @term_pattern
+  AND grade = 'IP'
+  AND ID = @id;
+SELECT @@ROWCOUNT""",
+        (('grade', 'VARCHAR(10)'), ('term_pattern', 'VARCHAR(50)'), ('id', 'VARCHAR(20)'))),
+}
+
+
+def _n(text):
+    """text as an N'...' literal."""
+    return "N'" + text.replace("'", "''") + "'"
+
+
+def _padded_size(count):
+    """The smallest power of two >= count."""
+    size = 1
+    while size < count:
+        size *= 2
+    return size
+
+
+def values_batches(rows, limit=MAX_VALUES_ROWS):
+    """
+    Split rows into chunks of at most limit rows whose sizes are powers of
+    two, so a VALUES statement only ever takes a few shapes.
+    """
+    rows = list(rows)
+    start = 0
+    while start < len(rows):
+        size = 1
+        while size * 2 <= min(limit, len(rows) - start):
+            size *= 2
+        yield rows[start:start + size]
+        start += size
+
+
+def _build(name, statement, params, rows):
+    """(inner statement text, declarations, values) for one execution."""
+    values = list(params)
+    declarations = list(statement.params)
+    sql = statement.sql
+    if statement.row is not None:
+        rows = list(rows)
+        if not rows:
+            raise ValueError(f"{name}: no rows for {{rows}}")
+        size = _padded_size(len(rows)) if statement.pad else len(rows)
+        rows += [rows[-1]] * (size - len(rows))
+        if size > MAX_LIST_SIZE:
+            raise ValueError(f"{name}: {size} rows, more than {MAX_LIST_SIZE}")
+        sql = sql.replace('{rows}', ', '.join(statement.row.format(i=i) for i in range(size)))
+        for i, row in enumerate(rows):
+            row = row if isinstance(row, (tuple, list)) else (row,)
+            for (param, sql_type), value in zip(statement.row_params, row):
+                declarations.append((param.format(i=i), sql_type))
+                values.append(value)
+    if len(values) != len(declarations):
+        raise ValueError(f"{name}: expected {len(declarations)} parameters, got {len(values)}")
+    return sql, declarations, values
+
+
+class QueryLayer:
+    """
+    Runs the named STATEMENTS with bound parameters.
+
+    Each parameterized statement is sent through sp_executesql, so its text
+    is the same for every student, class and grade and the server reuses
+    one cached plan for it (pymssql's own %s substitution would inline the
+    values, leaving a distinct ad-hoc plan per call).
+
+    stats counts, per statement, executions and misses: the executions
+    whose statement text hadn't been sent before in this process, which
+    the server compiles rather than reusing a plan. A statement with an
+    IN-list or VALUES list has one text per list size.
+    """
+
+    def __init__(self, statements=STATEMENTS):
+        self.statements = statements
+        self._lock = threading.Lock()
+        self._seen = set()
+        self.stats = {name: {'executions': 0, 'misses': 0} for name in statements}
+
+    def _record(self, name, sql):
+        with self._lock:
+            self.stats[name]['executions'] += 1
+            if sql not in self._seen:
+                self._seen.add(sql)
+                self.stats[name]['misses'] += 1
+
+    def execute(self, cursor, name, *params, rows=()):
+        """
+        Run statement name on cursor with params (in the order the
+        statement declares them) and, for a list statement, rows (values,
+        or tuples of values for a VALUES list). Returns the cursor.
+        """
+        statement = self.statements[name]
+        sql, declarations, values = _build(name, statement, params, rows)
+        self._record(name, sql)
+        if not declarations:
+            cursor.execute(sql)
+            return cursor
+        # pymssql substitutes %s itself, so a literal % must be doubled
+        batch = (f"EXEC sp_executesql {_n(sql).replace('%', '%%')}, "
+                 f"{_n(', '.join(f'@{param} {sql_type}' for param, sql_type in declarations))}, "
+                 + ', '.join(f'@{param} = %s' for param, _ in declarations))
+        cursor.execute(batch, tuple(values))
+        return cursor
+
+    def render(self, name, *params, rows=()):
+        """
+        The batch execute() would send, with the values written in as
+        literals, for SQL scripts that are run by hand.
+        """
+        statement = self.statements[name]
+        sql, declarations, values = _build(name, statement, params, rows)
+        if not declarations:
+            return sql
+        return (f"EXEC sp_executesql {_n(sql)},\n    "
+                f"{_n(', '.join(f'@{param} {sql_type}' for param, sql_type in declarations))},\n    "
+                + ', '.join(f'@{param} = {_n(str(value))}' for (param, _), value in zip(declarations, values)))
+
+    def describe(self):
+        """One-line summary of stats for logs, for the statements that ran."""
+        ran = [f"{name} {s['executions']}x/{s['misses']} compiled"
+               for name, s in self.stats.items() if s['executions']]
+        return '; '.join(ran) if ran else 'no statements run'
+
+
+@cache
+def get_queries():
+    """The shared QueryLayer for this process, created on first use."""
+    return QueryLayer()
@@ -6,22 +6,68 @@ Searches each sheet for:
 - A column containing letter grades (A-F)
 - A column containing 5-digit student IDs
 
-Processes files from ~/Documents/IFL_CONSOLIDATED/ and outputs
-separate CSV files for each term ID to extracted/ folder.
+Processes files from ~/Documents/IFL_CONSOLIDATED/ (including workbooks
+inside .zip bundles) and outputs separate CSV files for each term ID to
+extracted/ folder.
 """
 
 import os
 import re
 import csv
+import time
 import argparse
 import shutil
 from pathlib import Path
 from collections import defaultdict
-import pandas as pd
+from functools import partial
+from bisect import bisect_right
+from extraction.lazy import LazyModule
+from extraction.archive import ArchiveMember, is_archive_name, iter_archive_xlsx, input_stem
+from extraction.records import GradeBatch
+from extraction.manifest import ExtractionManifest, MANIFEST_NAME, file_sha256
+from extraction.sheet_cache import SheetCache, DEFAULT_CACHE_MB
+from extraction.dispositions import (DISPOSITIONS_NAME, DEFAULT_APPLY_THREADS, SetAside,
+                                     write_dispositions, read_dispositions, apply_dispositions)
+from extraction.sink import CsvSink, LiveCsvSink
+from extraction.pipeline import background_iter, ordered_map, BackgroundWorker
+from extraction.xlsx_stream import XlsxStreamReader
+from extraction.workers import ParseFailure, WorkerPool
+from extraction.templates import (TEMPLATES_NAME, SheetTemplate, SheetTemplateIndex,
+                                  workbook_fingerprint)
+from extraction.profile import STAGES, FileProfile, no_stage, write_profiles, stage_stats, slowest
+
+# pandas and numpy take most of the startup time; load them on first use
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
 
 # Valid letter grades
 VALID_GRADES = {'A', 'B', 'C', 'D', 'F'}
 
+# Rows classified up front before deciding which columns need a full scan
+DEFAULT_SAMPLE_ROWS = 100
+
+# Workbook readers: pandas/openpyxl DataFrames, or the streaming xlsx reader
+ENGINES = ('pandas', 'fast')
+
+# Most rows/columns read from a sheet. Stray formatting can make a sheet
+# declare a used range of the whole grid; real grade sheets are far smaller.
+DEFAULT_MAX_ROWS = 10000
+DEFAULT_MAX_COLS = 256
+
+# Limits on parsing one workbook (0 = none). A workbook that breaks one is
+# given up on, and its worker process replaced, without stopping the run.
+DEFAULT_PARSE_TIMEOUT = 300
+DEFAULT_MAX_RSS_MB = 2048
+
+# Watch mode: seconds between polls, and how long a new or changed file's
+# size and mtime must hold still before it is read
+DEFAULT_POLL_INTERVAL = 5.0
+DEFAULT_SETTLE_SECONDS = 10.0
+
+# Discovered files and pending not-found moves buffered between pipeline stages
+DISCOVERY_QUEUE_SIZE = 256
+MOVE_QUEUE_SIZE = 64
+
 
 def load_terms(terms_file='terms.csv'):
     """
@@ -76,43 +122,149 @@ def extract_class_code_from_filename(filename):
     return None
 
 
+def _trie_regex(words):
+    """
+    Build a regex matching any of words, factored as a prefix trie so the
+    engine follows at most one branch per character. Optional tails are
+    greedy, so the longest word at a position is tried first.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            return '(?:' + body + ')?'
+        return body
+
+    return build(trie)
+
+
+class TermMatcher:
+    """
+    Matches filenames against the valid term IDs loaded from terms.csv.
+
+    The terms are compiled once into a trie-shaped regex inside a lookahead,
+    so one scan of the upper-cased filename finds the longest term starting
+    at every position. The longest term in the filename wins (ties go to the
+    leftmost), which makes overlapping terms such as 2022T4E and 2022T4ET4E
+    resolve deterministically.
+    """
+
+    # Separates filenames in match_many(); cannot occur in a filename
+    _SEPARATOR = '\0'
+
+    def __init__(self, terms):
+        # Uppercase term -> term as spelled in terms.csv
+        self.terms = {}
+        for term in sorted(terms):
+            self.terms.setdefault(term.upper(), term)
+
+        if self.terms:
+            self._pattern = re.compile(f'(?=({_trie_regex(self.terms)}))')
+        else:
+            self._pattern = None
+
+    def __len__(self):
+        return len(self.terms)
+
+    def match(self, filename):
+        """Return the term ID found in filename, or None."""
+        if self._pattern is None:
+            return None
+
+        best = ''
+        for match in self._pattern.finditer(filename.upper()):
+            if len(match.group(1)) > len(best):
+                best = match.group(1)
+
+        return self.terms[best] if best else None
+
+    def match_many(self, filenames):
+        """
+        Return the term ID (or None) for each of filenames, in order.
+        All filenames are scanned in a single regex pass.
+        """
+        # Upper-case each name on its own: that can change its length
+        # ('ß' -> 'SS'), so offsets are taken from the upper-cased names
+        names = [filename.upper() for filename in filenames]
+        if self._pattern is None:
+            return [None] * len(names)
+
+        # Start offset of each name in the joined text
+        starts = []
+        offset = 0
+        for name in names:
+            starts.append(offset)
+            offset += len(name) + 1
+
+        best = [''] * len(names)
+        for match in self._pattern.finditer(self._SEPARATOR.join(names)):
+            idx = bisect_right(starts, match.start()) - 1
+            if len(match.group(1)) > len(best[idx]):
+                best[idx] = match.group(1)
+
+        return [self.terms[term] if term else None for term in best]
+
+
 def extract_termid_from_filename(filename, valid_terms):
     """
     Extract term ID from filename by matching against valid term IDs.
     Returns term ID if found, None otherwise.
 
-    Tries multiple matching strategies:
-    1. Exact substring match
-    2. Pattern-based extraction with validation
+    valid_terms is a TermMatcher or a collection of term IDs. Build the
+    TermMatcher once when matching many filenames.
+
+    Only term IDs listed in terms.csv are returned; when several appear in
+    the filename the longest wins. Term IDs come in several shapes, e.g.
+    251216E-T1AE, 2023T2E, 2022AT3E, 2019-2020T3E, 2022T4ET4E.
     """
-    filename_upper = filename.upper()
+    if not isinstance(valid_terms, TermMatcher):
+        valid_terms = TermMatcher(valid_terms)
 
-    # Strategy 1: Check if any valid term ID appears in the filename
-    for term in valid_terms:
-        if term.upper() in filename_upper:
-            return term
-
-    # Strategy 2: Extract patterns that look like term IDs
-    # Pattern examples: 251216E-T1AE, 2023T2E, 2022T4ET4E, 2019-2020T3E
-    patterns = [
-        r'\d{6}E?-T\d[A-Z]{2}',  # 251216E-T1AE
-        r'\d{4}T\d[A-Z]?E?',      # 2023T2E, 2022T4E
-        r'\d{4}[A-Z]?T\d[A-Z]?E', # 2022AT3E
-        r'\d{4}-\d{4}T\d[A-Z]?E', # 2019-2020T3E
-        r'\d{4}T\dT\dE',          # 2022T4ET4E
-        r'\d{4}T\d[A-Z]T\dE',     # 2023T2BT2E
-    ]
-
-    for pattern in patterns:
-        match = re.search(pattern, filename_upper)
-        if match:
-            candidate = match.group(0)
-            # Validate against known terms
-            for term in valid_terms:
-                if term.upper() == candidate:
-                    return term
+    return valid_terms.match(filename)
+
+
+def _cell_text(values):
+    """
+    Convert cell values to stripped strings, i.e. str(v).strip() per cell.
+    The result is kept as object dtype so the .str methods below have plain
+    Python str semantics regardless of the pandas string backend.
+    """
+    return pd.Series(values, dtype=object).astype(str).astype(object).str.strip()
+
+
+def _grade_mask(text):
+    """Boolean mask of cells (already stripped) that are valid letter grades."""
+    return text.str.upper().isin(VALID_GRADES)
 
-    return None
+
+def _id_text(text):
+    """Drop float suffixes from stripped ID cells, e.g. 14354.0 -> 14354."""
+    return text.str.split('.', n=1, regex=False).str[0]
+
+
+def _id_mask(id_text):
+    """
+    Boolean mask of ID cells that are 4-5 digit numbers.
+    Same as re.match(r'^\d{4,5}$', s): \d is any Unicode decimal digit and
+    $ also matches just before a trailing newline.
+    """
+    core = id_text.str.removesuffix('\n')
+    return core.str.len().between(4, 5) & core.str.isdecimal()
+
+
+def _qualifies(hit_count, cell_count):
+    """A column qualifies if >50% of its non-empty cells match and at least 3 do."""
+    ratio = hit_count / cell_count if cell_count > 0 else 0
+    return ratio > 0.5 and hit_count >= 3
 
 
 def is_grade_column(series):
@@ -120,19 +272,16 @@ def is_grade_column(series):
     Check if a pandas Series looks like a grade column.
     Returns (is_grade_column, grade_values_count)
     """
-    # Drop NaN and convert to string
-    values = series.dropna().astype(str).str.strip().str.upper()
+    values = series.dropna()
     
     if len(values) == 0:
         return False, 0
     
     # Count how many values are valid grades
-    grade_count = sum(1 for v in values if v in VALID_GRADES)
+    grade_count = int(_grade_mask(_cell_text(values)).sum())
     
     # Consider it a grade column if >50% are valid grades and at least 3 grades
-    ratio = grade_count / len(values) if len(values) > 0 else 0
-    
-    return ratio > 0.5 and grade_count >= 3, grade_count
+    return _qualifies(grade_count, len(values)), grade_count
 
 
 def is_id_column(series):
@@ -145,125 +294,680 @@ def is_id_column(series):
     if len(values) == 0:
         return False, 0
     
-    id_count = 0
-    for v in values:
-        # Convert to string and check if it's a 4-5 digit number
-        s = str(v).strip()
-        # Handle floats like 14354.0
-        if '.' in s:
-            s = s.split('.')[0]
-        if re.match(r'^\d{4,5}$', s):
-            id_count += 1
+    # Count 4-5 digit numbers, handling floats like 14354.0
+    id_count = int(_id_mask(_id_text(_cell_text(values))).sum())
     
-    ratio = id_count / len(values) if len(values) > 0 else 0
-    return ratio > 0.5 and id_count >= 3, id_count
+    return _qualifies(id_count, len(values)), id_count
+
+
+def _numeric_id_mask(values):
+    """
+    Boolean mask of numeric cells that pass the ID check.
+    str() of a non-negative number below 1e16 has its integer part before
+    any '.', so the string test reduces to 1000 <= v < 100000.
+    """
+    return (values >= 1000) & (values < 100000)
+
+
+def classify_columns(df):
+    """
+    Score every column of a dataframe for grade-ness and ID-ness in one pass.
+
+    All non-null cells of the sheet are flattened and split by type.
+    Numbers (which can never be letter grades) get the ID check as a range
+    test; everything else is converted to one string Series and both checks
+    run over it once. Hits are counted per column with bincount.
+
+    Returns (cell_counts, grade_counts, id_counts) as numpy arrays indexed
+    by column position.
+    """
+    n_cols = df.shape[1]
+    cell_counts = np.zeros(n_cols, dtype=np.int64)
+    grade_counts = np.zeros(n_cols, dtype=np.int64)
+    id_counts = np.zeros(n_cols, dtype=np.int64)
+
+    numeric = np.array([
+        pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+        for dtype in df.dtypes
+    ], dtype=bool)
+
+    # Numeric columns never need boxing into Python objects
+    for col_idx in np.flatnonzero(numeric):
+        values = df.iloc[:, col_idx].to_numpy(dtype=np.float64, na_value=np.nan)
+        filled = ~np.isnan(values)
+        cell_counts[col_idx] = filled.sum()
+        id_counts[col_idx] = _numeric_id_mask(values[filled]).sum()
+
+    other = np.flatnonzero(~numeric)
+    if len(other) == 0:
+        return cell_counts, grade_counts, id_counts
+
+    values = df.iloc[:, other].to_numpy(dtype=object)
+    filled = pd.notna(values)
+    _, cols = np.nonzero(filled)
+    cell_stats = classify_cells(other[cols], values[filled], n_cols)
+
+    return cell_counts + cell_stats[0], grade_counts + cell_stats[1], id_counts + cell_stats[2]
+
+
+def classify_cells(cols, cells, n_cols):
+    """
+    Score columns for grade-ness and ID-ness from a flat list of non-null
+    cells, given as parallel arrays of column positions and values.
+    Returns (cell_counts, grade_counts, id_counts) like classify_columns.
+    """
+    cols = np.asarray(cols, dtype=np.int64)
+    cells = np.asarray(cells, dtype=object)
+    cell_counts = np.bincount(cols, minlength=n_cols)
+    id_counts = np.zeros(n_cols, dtype=np.int64)
+
+    # Cell types that are checked arithmetically rather than via str()
+    number_types = (int, float, np.int64, np.float64)
+    is_number = pd.Series(cells, dtype=object).map(type).isin(number_types).to_numpy()
+    if is_number.any():
+        numbers = cells[is_number].astype(np.float64)
+        id_counts += np.bincount(cols[is_number][_numeric_id_mask(numbers)], minlength=n_cols)
+
+    text_cols = cols[~is_number]
+    text = _cell_text(cells[~is_number])
+    grade_counts = np.bincount(text_cols[_grade_mask(text).to_numpy()], minlength=n_cols)
+    id_counts += np.bincount(text_cols[_id_mask(_id_text(text)).to_numpy()], minlength=n_cols)
+
+    return cell_counts, grade_counts, id_counts
+
+
+def _best_column(hit_counts, cell_counts):
+    """
+    Return the qualifying column with the most hits (first one on ties),
+    or None if no column qualifies.
+    """
+    best_col = None
+    best_count = 0
+    for col_idx, (hits, cells) in enumerate(zip(hit_counts, cell_counts)):
+        if _qualifies(hits, cells) and hits > best_count:
+            best_col = col_idx
+            best_count = hits
+    return best_col
+
+
+def _confirm_best_column(bounds, cell_counts, full_count):
+    """
+    Same choice as _best_column, given an upper bound on each column's hit
+    count and a callback that returns a column's exact count.
+
+    Columns are confirmed in order of decreasing bound. Columns whose bound
+    cannot qualify are skipped, and the search stops once no remaining
+    column could beat the best confirmed one.
+    """
+    best_col = None
+    best_count = 0
+    for col_idx in sorted(range(len(bounds)), key=lambda c: (-bounds[c], c)):
+        bound = bounds[col_idx]
+        if bound < best_count:
+            break
+        if best_col is not None and bound == best_count and col_idx > best_col:
+            # Could at best tie, and ties go to the earlier column
+            continue
+        if not _qualifies(bound, cell_counts[col_idx]):
+            continue
+
+        hits = full_count(col_idx)
+        if not _qualifies(hits, cell_counts[col_idx]):
+            continue
+        if hits > best_count or (hits == best_count and col_idx < best_col):
+            best_col = col_idx
+            best_count = hits
+    return best_col
 
 
-def find_grade_and_id_columns(df):
+def find_grade_and_id_columns(df, sample_rows=DEFAULT_SAMPLE_ROWS):
     """
     Find the grade column and ID column in a dataframe.
     Returns (grade_col_idx, id_col_idx) or (None, None) if not found.
+
+    Sheets longer than sample_rows are detected in two stages: every column
+    is classified from the first sample_rows rows, then only the columns
+    that could still qualify (assuming every remaining cell is a hit) and
+    beat the best confirmed column are scanned in full. The answer is the
+    same as a full scan. sample_rows=0 always scans everything.
     """
-    grade_col = None
-    grade_col_count = 0
-    id_col = None
-    id_col_count = 0
+    if not sample_rows or len(df) <= sample_rows:
+        cell_counts, grade_counts, id_counts = classify_columns(df)
+        return _best_column(grade_counts, cell_counts), _best_column(id_counts, cell_counts)
     
-    for col_idx in range(len(df.columns)):
-        col_data = df.iloc[:, col_idx]
-        
-        # Check for grade column
-        is_grade, g_count = is_grade_column(col_data)
-        if is_grade and g_count > grade_col_count:
-            grade_col = col_idx
-            grade_col_count = g_count
-        
-        # Check for ID column
-        is_id, i_count = is_id_column(col_data)
-        if is_id and i_count > id_col_count:
-            id_col = col_idx
-            id_col_count = i_count
+    head = df.iloc[:sample_rows]
+    tail = df.iloc[sample_rows:]
+    
+    head_cells, head_grades, head_ids = classify_columns(head)
+    tail_cells = tail.notna().sum().to_numpy()
+    cell_counts = head_cells + tail_cells
+    
+    # Exact (grade_count, id_count) of each column scanned in full
+    confirmed = {}
+    
+    def full_counts(col_idx):
+        if col_idx not in confirmed:
+            _, tail_grades, tail_ids = classify_columns(tail.iloc[:, [col_idx]])
+            confirmed[col_idx] = (
+                head_grades[col_idx] + tail_grades[0],
+                head_ids[col_idx] + tail_ids[0],
+            )
+        return confirmed[col_idx]
+    
+    grade_col = _confirm_best_column(
+        head_grades + tail_cells, cell_counts, lambda c: full_counts(c)[0]
+    )
+    id_col = _confirm_best_column(
+        head_ids + tail_cells, cell_counts, lambda c: full_counts(c)[1]
+    )
     
     return grade_col, id_col
 
 
-def extract_grades_from_sheet(df, sheet_name):
+def extract_grades_from_sheet(df, sheet_name, sample_rows=DEFAULT_SAMPLE_ROWS):
     """
     Extract (student_id, grade) pairs from a dataframe.
-    Returns list of tuples or empty list if not a grades sheet.
+    Returns them as a GradeBatch, empty if not a grades sheet.
     """
-    grade_col, id_col = find_grade_and_id_columns(df)
+    return _sheet_grades(df, sample_rows)[0]
+
+
+def _sheet_grades(df, sample_rows):
+    """extract_grades_from_sheet, also returning the (grade_col, id_col) it used."""
+    grade_col, id_col = find_grade_and_id_columns(df, sample_rows=sample_rows)
     
     if grade_col is None or id_col is None:
-        return []
+        return GradeBatch(), (grade_col, id_col)
     
-    results = []
+    # Keep rows where both cells are filled, in sheet order
+    pairs = df.iloc[:, [grade_col, id_col]].dropna()
     
-    for idx in range(len(df)):
-        grade_val = df.iloc[idx, grade_col]
-        id_val = df.iloc[idx, id_col]
-        
-        # Skip if either is NaN
-        if pd.isna(grade_val) or pd.isna(id_val):
-            continue
-        
-        # Clean grade
-        grade = str(grade_val).strip().upper()
-        if grade not in VALID_GRADES:
-            continue
-        
-        # Clean ID - convert to 5-digit zero-padded string
-        id_str = str(id_val).strip()
-        if '.' in id_str:
-            id_str = id_str.split('.')[0]
-        
-        if not re.match(r'^\d{4,5}$', id_str):
-            continue
-        
-        # Zero-pad to 5 digits
-        student_id = id_str.zfill(5)
-        
-        results.append((student_id, grade))
+    return _emit_grades(pairs.iloc[:, 0], pairs.iloc[:, 1]), (grade_col, id_col)
+
+
+def _emit_grades(grade_values, id_values):
+    """
+    Turn aligned grade and ID cell values (both non-null) into a
+    GradeBatch, skipping rows that fail either check.
+    """
+    # Clean grades and IDs (IDs lose any float suffix)
+    grades = _cell_text(grade_values).str.upper()
+    ids = _id_text(_cell_text(id_values))
     
-    return results
+    valid = (grades.isin(VALID_GRADES) & _id_mask(ids)).to_numpy()
+    
+    # Zero-pad IDs to 5 digits
+    student_ids = ids[valid].str.zfill(5)
+    
+    return GradeBatch.from_columns('', student_ids.tolist(), grades[valid].tolist())
 
 
-def process_xlsx_file(filepath):
+def extract_grades_from_cells(rows, cols, values):
     """
-    Process a single xlsx file and return list of (student_id, grade) tuples.
+    Extract (student_id, grade) pairs from a sheet given as its non-empty
+    cells (parallel sequences of row positions, column positions and values
+    in row-major order), as read by the fast engine, as a GradeBatch.
+    Same result as extract_grades_from_sheet on the equivalent dataframe.
     """
+    return _cell_grades(rows, cols, values)[0]
+
+
+def _cell_grades(rows, cols, values):
+    """extract_grades_from_cells, also returning the (grade_col, id_col) it used."""
+    if len(cols) == 0:
+        return GradeBatch(), (None, None)
+    
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    values = np.asarray(values, dtype=object)
+    
+    cell_counts, grade_counts, id_counts = classify_cells(cols, values, int(cols.max()) + 1)
+    grade_col = _best_column(grade_counts, cell_counts)
+    id_col = _best_column(id_counts, cell_counts)
+    
+    if grade_col is None or id_col is None:
+        return GradeBatch(), (grade_col, id_col)
+    
+    # Rows where both columns have a cell, in sheet order
+    in_grade, in_id = cols == grade_col, cols == id_col
+    _, grade_idx, id_idx = np.intersect1d(rows[in_grade], rows[in_id], assume_unique=True,
+                                          return_indices=True)
+    
+    return _emit_grades(values[in_grade][grade_idx], values[in_id][id_idx]), (grade_col, id_col)
+
+
+def _read_cells(book, sheet_name, max_rows, max_cols, stage=no_stage):
+    """
+    Read one sheet of an open workbook, cropped to max_rows x max_cols
+    (0 = no limit), as its non-empty cells.
+    Returns (rows, cols, values, declared): parallel lists of row
+    positions, column positions and values in row-major order, and the
+    (rows, columns) the sheet declares as its used range (None if none).
+    """
+    if isinstance(book, XlsxStreamReader):
+        with stage('parse'):
+            rows, cols, values = book.read_sheet(sheet_name, max_rows=max_rows, max_cols=max_cols)
+        return rows, cols, values, book.dimensions.get(sheet_name)
+    
+    with stage('parse'):
+        sheet = book.book[sheet_name]
+        declared = (sheet.max_row, sheet.max_column) if sheet.max_row and sheet.max_column else None
+        df = book.parse(sheet_name, header=None, nrows=max_rows or None)
+        if max_cols:
+            df = df.iloc[:, :max_cols]
+        filled = df.notna().to_numpy()
+        rows, cols = np.nonzero(filled)
+        values = df.to_numpy(dtype=object)[filled]
+    return rows.tolist(), cols.tolist(), values.tolist(), declared
+
+
+def _extract_sheet(book, sheet_name, sample_rows, max_rows, max_cols, stage=no_stage):
+    """
+    Read one sheet of an open workbook, cropped to max_rows x max_cols
+    (0 = no limit), and extract its grades.
+    Returns (results, columns, declared, extent): the (grade_col, id_col)
+    detected, the (rows, columns) the sheet declares as its used range
+    (None if it declares none) and the (rows, columns) that actually hold
+    data within the crop.
+    stage is FileProfile.stage when profiling.
+    """
+    if isinstance(book, XlsxStreamReader):
+        with stage('parse'):
+            rows, cols, values = book.read_sheet(sheet_name, max_rows=max_rows, max_cols=max_cols)
+        extent = (max(rows) + 1, max(cols) + 1) if rows else (0, 0)
+        with stage('detect'):
+            results, columns = _cell_grades(rows, cols, values)
+        return results, columns, book.dimensions.get(sheet_name), extent
+    
+    # openpyxl reads the declared range when it opens the sheet; pandas
+    # discards it and reads every row present, so stop it at max_rows
+    with stage('parse'):
+        sheet = book.book[sheet_name]
+        declared = (sheet.max_row, sheet.max_column) if sheet.max_row and sheet.max_column else None
+        df = book.parse(sheet_name, header=None, nrows=max_rows or None)
+        if max_cols:
+            df = df.iloc[:, :max_cols]
+    with stage('detect'):
+        results, columns = _sheet_grades(df, sample_rows)
+    return results, columns, declared, df.shape
+
+
+def _report_crop(filepath, sheet_name, declared, extent, max_rows, max_cols, verbose):
+    """Report sheets whose declared range, or data, runs past the crop."""
+    if (max_rows and extent[0] >= max_rows) or (max_cols and extent[1] >= max_cols):
+        print(f"WARNING: Sheet '{sheet_name}' in {filepath} has data up to the "
+              f"{max_rows or 'unlimited'} x {max_cols or 'unlimited'} row/column limit; "
+              f"anything past it was not read")
+    elif verbose and declared and ((max_rows and declared[0] > max_rows) or
+                                   (max_cols and declared[1] > max_cols)):
+        print(f"  Cropped sheet '{sheet_name}' in {os.path.basename(str(filepath))}: declares "
+              f"{declared[0]:,} x {declared[1]:,} cells, data fills {extent[0]:,} x {extent[1]:,}")
+
+
+def _sheet_widths(book):
+    """Column count each sheet of an open workbook declares (None if it declares none)."""
+    if isinstance(book, XlsxStreamReader):
+        dimensions = [book.read_dimension(name) for name in book.sheet_names]
+        return [dimension[1] if dimension else None for dimension in dimensions]
+    # openpyxl reads a sheet's declared range when the sheet is opened
+    return [book.book[name].max_column for name in book.sheet_names]
+
+
+def process_xlsx_file(filepath, sample_rows=DEFAULT_SAMPLE_ROWS, engine='pandas',
+                      max_rows=DEFAULT_MAX_ROWS, max_cols=DEFAULT_MAX_COLS, verbose=False, profile=None,
+                      templates=None, cache=None, digest=None):
+    """
+    Process a single xlsx file and return its (student_id, grade) records
+    as a GradeBatch named after the file.
+
+    The workbook is opened once and every sheet is parsed from that handle.
+    Sheets are parsed one at a time, so sheets after the first one with
+    grades are never read.
+
+    engine='fast' streams cells straight from the xlsx XML instead of
+    building DataFrames; the results are the same.
+
+    filepath may be an ArchiveMember, in which case the workbook is read
+    from the archive's bytes in memory.
+
+    Only the first max_rows rows and max_cols columns of a sheet are read
+    (0 = no limit), whatever used range the sheet declares. With verbose,
+    sheets declaring a larger range than that are reported.
+
+    With templates (a SheetTemplateIndex), a workbook whose sheet names and
+    widths match one seen before has the sheet its grades were on read
+    first. If the same grade and ID columns are detected there, the sheets
+    before it are taken to hold no grades, as they did last time, and are
+    not read (so if one of them now has grades too, the template's sheet
+    is still the one used); otherwise every sheet is tried in order as
+    usual. What was found is noted in templates.
+
+    With cache (a SheetCache), each sheet's cells are looked up by the
+    workbook's content hash before it is parsed, and stored after; a
+    workbook whose sheets are all cached is never opened. Detection then
+    runs on the cells, with the same results as on a DataFrame. digest is
+    the workbook's SHA-256, if the caller has already computed it.
+
+    If profile (a FileProfile) is given, the time and bytes read spent
+    opening the workbook, parsing sheets and detecting columns are
+    recorded in it.
+    """
+    stage = profile.stage if profile else no_stage
+    book = None
+    
+    def open_book():
+        if profile:
+            source = profile.open()
+        elif isinstance(filepath, ArchiveMember):
+            source = filepath.open()
+        else:
+            source = filepath
+        with stage('open'):
+            return XlsxStreamReader(source) if engine == 'fast' else pd.ExcelFile(source)
+    
     try:
-        xl = pd.ExcelFile(filepath)
+        layout = None
+        if cache is not None:
+            with stage('cache'):
+                digest = digest or file_sha256(filepath)
+                layout = cache.get_layout(digest)
+        if layout is not None:
+            sheet_names, widths = layout
+        else:
+            book = open_book()
+            sheet_names = book.sheet_names
+            widths = None
+            if templates is not None or cache is not None:
+                with stage('open'):
+                    widths = _sheet_widths(book)
+            if cache is not None:
+                with stage('cache'):
+                    cache.put_layout(digest, sheet_names, widths)
+        if templates is not None:
+            fingerprint = workbook_fingerprint(sheet_names, widths)
     except Exception as e:
         print(f"ERROR: Could not open {filepath}: {e}")
-        return []
+        if book is not None:
+            book.close()
+        if profile:
+            profile.close()
+        return GradeBatch(input_stem(filepath))
     
-    all_results = []
+    def read_cached(sheet_name):
+        """_extract_sheet through the cache, opening the workbook only on a miss."""
+        nonlocal book
+        with stage('cache'):
+            cells = cache.get(digest, sheet_name, max_rows, max_cols)
+        if cells is None:
+            if book is None:
+                book = open_book()
+            cells = _read_cells(book, sheet_name, max_rows, max_cols, stage)
+            with stage('cache'):
+                cache.put(digest, sheet_name, max_rows, max_cols, *cells)
+        rows, cols, values, declared = cells
+        with stage('detect'):
+            results, columns = _cell_grades(rows, cols, values)
+        extent = (max(rows) + 1, max(cols) + 1) if rows else (0, 0)
+        return results, columns, declared, extent
     
-    for sheet_name in xl.sheet_names:
+    def read(sheet_index):
+        """Grades and (grade_col, id_col) of one sheet; no grades if it can't be read."""
+        sheet_name = sheet_names[sheet_index]
         try:
-            df = pd.read_excel(filepath, sheet_name=sheet_name, header=None)
-            results = extract_grades_from_sheet(df, sheet_name)
-            
-            if results:
-                # Found grades in this sheet
-                all_results.extend(results)
-                # Usually we only want one sheet's grades, but some files might have multiple
-                # For safety, break after finding the first sheet with grades
-                break
-                
+            if cache is not None:
+                results, columns, declared, extent = read_cached(sheet_name)
+            else:
+                results, columns, declared, extent = _extract_sheet(book, sheet_name, sample_rows,
+                                                                    max_rows, max_cols, stage)
+            _report_crop(filepath, sheet_name, declared, extent, max_rows, max_cols, verbose)
+            return results, columns
         except Exception as e:
             print(f"WARNING: Error reading sheet '{sheet_name}' in {filepath}: {e}")
-            continue
+            return GradeBatch(), (None, None)
+    
+    all_results = GradeBatch(input_stem(filepath))
+    
+    try:
+        template = templates.lookup(fingerprint) if templates is not None else None
+        read_first = {}
+        if template is not None and template.sheet < len(sheet_names):
+            results, columns = read_first[template.sheet] = read(template.sheet)
+            if results and columns == (template.grade_col, template.id_col):
+                templates.note(fingerprint, template, 'hit')
+                all_results.extend(results)
+        
+        if not all_results:
+            found = None
+            for sheet_index in range(len(sheet_names)):
+                if sheet_index in read_first:
+                    results, columns = read_first[sheet_index]
+                else:
+                    results, columns = read(sheet_index)
+                
+                if results:
+                    # Found grades in this sheet
+                    all_results.extend(results)
+                    found = SheetTemplate(sheet_index, *columns)
+                    # Usually we only want one sheet's grades, but some files might have multiple
+                    # For safety, break after finding the first sheet with grades
+                    break
+            
+            if templates is not None:
+                templates.note(fingerprint, found, 'stale' if template is not None else 'miss')
+    finally:
+        if book is not None:
+            book.close()
+        if profile:
+            profile.close()
     
     return all_results
 
 
-def process_directory_by_term(input_dir, output_dir, terms_file='terms.csv', verbose=False):
+def profile_xlsx_file(filepath, **options):
+    """
+    process_xlsx_file with its stages profiled.
+    Returns (results, FileProfile).
+    """
+    profile = FileProfile(filepath)
+    return process_xlsx_file(filepath, profile=profile, **options), profile
+
+
+def resolve_jobs(jobs):
+    """
+    Normalize a --jobs value to a worker count.
+    0 or a negative value means one worker per CPU.
+    """
+    if jobs is None:
+        return 1
+    if jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def discover_xlsx_files(input_path, exclude=()):
+    """
+    Yield xlsx files under input_path as the tree is walked.
+
+    Temp files (~$...), hidden files and __MACOSX folders are skipped as
+    they are seen, so __MACOSX trees are never descended into. Each
+    directory's files are yielded (sorted by name) before its
+    subdirectories are walked. Symlinked directories are not followed.
+
+    Zip archives in the tree, or input_path itself if it is one, are read
+    in place: the workbooks in them (and in zips inside them) are yielded
+    as ArchiveMembers, with the same files skipped.
+
+    Directories in exclude (the run's own output directories, which may be
+    inside the input tree and filled while it is walked) are not descended
+    into.
+    """
+    if is_archive_name(str(input_path)) and os.path.isfile(input_path):
+        yield from iter_archive_xlsx(input_path)
+        return
+    excluded = {os.path.realpath(path) for path in exclude}
+
+    try:
+        with os.scandir(input_path) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+    except OSError as e:
+        print(f"WARNING: Could not list {input_path}: {e}")
+        return
+
+    subdirs = []
+    for entry in entries:
+        if '__MACOSX' in entry.name:
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            if os.path.realpath(entry.path) not in excluded:
+                subdirs.append(entry.path)
+        elif entry.name.startswith('~$') or entry.name.startswith('.'):
+            continue
+        elif entry.name.endswith('.xlsx'):
+            yield Path(entry.path)
+        elif is_archive_name(entry.name) and entry.is_file():
+            yield from iter_archive_xlsx(entry.path)
+
+    for subdir in subdirs:
+        yield from discover_xlsx_files(subdir, excluded)
+
+
+def _parse_noting_templates(parse, templates, filepath):
+    """Run parse on filepath with templates; return (its result, the notes it made)."""
+    results = parse(filepath, templates=templates)
+    return results, templates.take_notes()
+
+
+def _parse_noting_digest(parse, filepath, **kwargs):
+    """
+    Hash filepath, then run parse on it with that digest; return (its
+    result, the digest, seconds spent hashing).
+    """
+    start = time.perf_counter()
+    digest = file_sha256(filepath)
+    seconds = time.perf_counter() - start
+    return parse(filepath, digest=digest, **kwargs), digest, seconds
+
+
+def iter_xlsx_results(pairs, jobs=1, profile=False, timeout=None, max_rss_mb=None, templates=None,
+                      digests=None, **options):
+    """
+    Parse xlsx files and yield (xlsx_file, results, cached, file_profile)
+    in input order.
+
+    pairs is an iterable of (xlsx_file, cached_results), possibly still
+    being produced. Files with cached_results (not None) are not parsed
+    again and are yielded with cached=True.
+
+    With jobs > 1 the parsing and column detection run in a process pool
+    that works ahead of the consumer; results are still yielded in the
+    order of pairs so the output is the same as a serial run.
+
+    With a timeout (seconds) or max_rss_mb, every file is parsed in a
+    worker process under those limits, even with jobs=1. A file that goes
+    over one is killed and yielded with a ParseFailure as its results.
+
+    With templates (a SheetTemplateIndex), workers parse with a copy of it
+    and what they learn is merged back into it as results arrive.
+
+    With digests (a dict), each parsed workbook is hashed once, before it
+    is parsed; the digest is used for the sheet cache and stored in
+    digests[xlsx_file] so the manifest needn't hash the file again.
+
+    options are passed on to process_xlsx_file. With profile, each file
+    comes with a FileProfile (holding the parsing stages if it was parsed),
+    otherwise file_profile is None.
+    """
+    parse = partial(profile_xlsx_file if profile else process_xlsx_file, **options)
+    if digests is not None:
+        parse = partial(_parse_noting_digest, parse)
+    if templates is not None:
+        parse = partial(_parse_noting_templates, parse, templates)
+
+    for xlsx_file, results, parsed in ordered_map(parse, pairs, jobs=jobs, timeout=timeout,
+                                                  max_rss_mb=max_rss_mb):
+        parsed_ok = parsed and not isinstance(results, ParseFailure)
+        if templates is not None and parsed_ok:
+            results, notes = results
+            templates.merge(notes)
+        hash_seconds = 0.0
+        if digests is not None and parsed_ok:
+            results, digests[xlsx_file], hash_seconds = results
+        file_profile = None
+        if profile:
+            if parsed_ok:
+                results, file_profile = results
+                file_profile.add('cache', hash_seconds)
+            else:
+                file_profile = FileProfile(xlsx_file)
+        yield xlsx_file, results, not parsed, file_profile
+
+
+def file_disposition(results, termid, class_code):
+    """
+    What happens to a workbook: extracted, no_grades, no_termid or
+    no_classcode, or parse_timeout / parse_oom / parse_error if results is
+    a ParseFailure.
+    """
+    if isinstance(results, ParseFailure):
+        return results.disposition
+    if not results:
+        return 'no_grades'
+    if not termid:
+        return 'no_termid'
+    if not class_code:
+        return 'no_classcode'
+    return 'extracted'
+
+
+def process_directory_by_term(input_dir, output_dir, terms_file='terms.csv', verbose=False, jobs=1,
+                              sample_rows=DEFAULT_SAMPLE_ROWS, rebuild=False, prune=False, engine='pandas',
+                              max_rows=DEFAULT_MAX_ROWS, max_cols=DEFAULT_MAX_COLS, profile_out=None,
+                              timeout=DEFAULT_PARSE_TIMEOUT, max_rss_mb=DEFAULT_MAX_RSS_MB,
+                              use_templates=True, cache=None, move=True):
     """
     Process all xlsx files in input_dir, group by term ID and class code, and write separate CSV files.
     Outputs to output_dir/extracted/grades_extract_{termid}_{classcode}.csv
     Moves unidentified files to output_dir/not-found/
+    Returns a dict of (termid, class_code) -> number of records written.
+
+    input_dir may also be a zip archive, and zips found in it are read in
+    place (see discover_xlsx_files). Unidentified workbooks inside an
+    archive are left there; their disposition is in the manifest under
+    their archive member path and they are listed in the summary.
+
+    The run is a pipeline of stages joined by bounded queues:
+    - discovery walks input_dir (and checks the manifest) on a thread,
+      so parsing starts before the walk finishes
+    - workbooks are parsed in order, in jobs worker processes, with the
+      given engine and row/column limits (see process_xlsx_file); a
+      workbook still parsing after timeout seconds, or whose worker goes
+      over max_rss_mb, is killed and recorded as parse_timeout/parse_oom
+    - records are streamed to the CSV files as each workbook finishes
+      rather than held in memory; each CSV is moved into place at the end
+    - moves to not-found/ run on their own thread so slow moves don't
+      hold up parsing
+
+    Results are recorded in output_dir/extract_manifest.json, and files that
+    are unchanged since they were recorded are not parsed again (unless they
+    were given up on, or read with other max_rows/max_cols). rebuild
+    ignores the existing manifest; prune drops entries for files that are
+    no longer in input_dir.
+
+    With use_templates, the sheet each workbook layout keeps its grades on
+    is remembered in output_dir/sheet_templates.json and read first next
+    time (see process_xlsx_file).
+
+    With cache (a SheetCache), parsed sheets are kept in it and reused by
+    later runs; it is trimmed to its size limit at the end of the run.
+
+    With move=False the input tree is left untouched: unidentified files
+    stay where they are and are listed instead (path, reason, size,
+    records, term ID and class code) in output_dir/not_found.csv, which
+    apply_dispositions_file can act on later.
+
+    With profile_out, the time (and bytes read) each workbook spends in
+    each stage is written there as JSON lines, and the summary adds
+    per-stage percentiles and the slowest files.
     """
     input_path = Path(input_dir)
     output_path = Path(output_dir) / 'extracted'
@@ -271,45 +975,125 @@ def process_directory_by_term(input_dir, output_dir, terms_file='terms.csv', ver
 
     # Create output directories if needed
     output_path.mkdir(parents=True, exist_ok=True)
-    notfound_path.mkdir(parents=True, exist_ok=True)
+    if move:
+        notfound_path.mkdir(parents=True, exist_ok=True)
 
     # Load valid term IDs
-    valid_terms = load_terms(terms_file)
-
-    # Find all xlsx files
-    xlsx_files = list(input_path.rglob('*.xlsx'))
-
-    # Filter out temp files and __MACOSX
-    xlsx_files = [f for f in xlsx_files
-                  if not f.name.startswith('~$')
-                  and not f.name.startswith('.')
-                  and '__MACOSX' not in str(f)]
+    term_matcher = TermMatcher(load_terms(terms_file))
+
+    manifest = ExtractionManifest(Path(output_dir) / MANIFEST_NAME, rebuild=rebuild, crop=(max_rows, max_cols))
+    templates = SheetTemplateIndex(Path(output_dir) / TEMPLATES_NAME) if use_templates else None
+
+    jobs = resolve_jobs(jobs)
+    if jobs > 1:
+        print(f"Parsing with {jobs} worker processes")
+
+    # Stage 1: walk the tree and check each file against the manifest of
+    # earlier runs so unchanged files are not parsed again
+    xlsx_files = []
+    profiling = profile_out is not None
+    profiles = []
+    lookup_seconds = {}
+
+    def discover():
+        for xlsx_file in discover_xlsx_files(input_path, exclude=(output_path, notfound_path)):
+            xlsx_files.append(xlsx_file)
+            if profiling:
+                start = time.perf_counter()
+                cached_results = manifest.lookup(xlsx_file)
+                lookup_seconds[xlsx_file] = time.perf_counter() - start
+            else:
+                cached_results = manifest.lookup(xlsx_file)
+            yield xlsx_file, cached_results
 
-    print(f"Found {len(xlsx_files)} xlsx files to process")
+    discovered = background_iter(discover(), maxsize=DISCOVERY_QUEUE_SIZE)
 
-    # Group records by (term_id, class_code) tuple
-    records_by_key = defaultdict(list)
+    # Stream records into one CSV per (term_id, class_code) tuple
+    sink = CsvSink(lambda key: output_path / f'grades_extract_{key[0]}_{key[1]}.csv')
 
     total_records = 0
     files_with_grades = 0
+    files_reused = 0
     files_without_grades = []
     files_without_termid = []
     files_without_classcode = []
+    files_failed = []
     files_moved_to_notfound = []
+    members_left_in_archives = []
+    files_set_aside = []
 
-    # Process each file
-    for xlsx_file in xlsx_files:
-        file_stem = xlsx_file.stem
+    # Last stage: moves to not-found/, on their own thread
+    def move_to_notfound(xlsx_file, reason, file_profile):
+        dest = notfound_path / xlsx_file.name
+        stage = file_profile.stage if file_profile else no_stage
+        try:
+            with stage('move'):
+                shutil.move(str(xlsx_file), str(dest))
+            files_moved_to_notfound.append((xlsx_file.name, reason))
+            if verbose:
+                print(f"  -> Moved {xlsx_file.name} to not-found/")
+        except Exception as e:
+            print(f"  -> ERROR moving {xlsx_file.name}: {e}")
+
+    mover = BackgroundWorker(move_to_notfound, maxsize=MOVE_QUEUE_SIZE)
+
+    def set_aside(xlsx_file, reason, file_profile, termid, class_code, records):
+        if isinstance(xlsx_file, ArchiveMember):
+            # Stays in its archive; the manifest has its disposition
+            members_left_in_archives.append((str(xlsx_file), reason))
+            if verbose:
+                print(f"  -> Left {xlsx_file.name} in its archive")
+        elif move:
+            mover.submit(xlsx_file, reason, file_profile)
+        else:
+            try:
+                size = xlsx_file.stat().st_size
+            except OSError as e:
+                print(f"  -> ERROR listing {xlsx_file.name}: {e}")
+                return
+            files_set_aside.append(SetAside(str(xlsx_file.resolve()), reason, size, records,
+                                            termid or '', class_code or ''))
+            if verbose:
+                print(f"  -> Listed {xlsx_file.name} in {DISPOSITIONS_NAME}")
+
+    # Process each file (parsing may run ahead in worker processes). With
+    # a cache, workbooks are hashed once for both it and the manifest
+    parse_options = dict(sample_rows=sample_rows, engine=engine, max_rows=max_rows,
+                         max_cols=max_cols, verbose=verbose, cache=cache)
+    digests = {} if cache is not None else None
+    for xlsx_file, results, cached, file_profile in iter_xlsx_results(
+            discovered, jobs=jobs, profile=profiling, timeout=timeout, max_rss_mb=max_rss_mb,
+            templates=templates, digests=digests, **parse_options):
+        stage = file_profile.stage if file_profile else no_stage
+        if file_profile:
+            file_profile.add('manifest', lookup_seconds.pop(xlsx_file, 0.0))
+            file_profile.cached = cached
+            profiles.append(file_profile)
 
         # Extract term ID and class code from filename
-        termid = extract_termid_from_filename(xlsx_file.name, valid_terms)
-        class_code = extract_class_code_from_filename(xlsx_file.name)
+        with stage('match'):
+            termid = term_matcher.match(xlsx_file.name)
+            class_code = extract_class_code_from_filename(xlsx_file.name)
 
         if verbose:
             print(f"Processing: {xlsx_file.name}")
             print(f"  -> Term: {termid}, Class: {class_code}")
-
-        results = process_xlsx_file(xlsx_file)
+            if cached:
+                print("  -> Unchanged, using manifest")
+        if cached:
+            files_reused += 1
+
+        # Record the outcome before the file can be moved to not-found
+        disposition = file_disposition(results, termid, class_code)
+        if isinstance(results, ParseFailure):
+            print(f"WARNING: Gave up on {xlsx_file.name}: {results.message}")
+            results = GradeBatch(xlsx_file.stem)
+        with stage('manifest'):
+            sha256 = digests.pop(xlsx_file, None) if digests else None
+            manifest.record(xlsx_file, results, disposition, sha256=sha256)
+        if file_profile:
+            file_profile.disposition = disposition
+            file_profile.records = len(results)
 
         if results:
             files_with_grades += 1
@@ -317,13 +1101,7 @@ def process_directory_by_term(input_dir, output_dir, terms_file='terms.csv', ver
 
             if termid and class_code:
                 # Both term ID and class code found - good!
-                key = (termid, class_code)
-                for student_id, grade in results:
-                    records_by_key[key].append({
-                        'filename': file_stem,
-                        'student_id': student_id,
-                        'grade': grade
-                    })
+                sink.write((termid, class_code), results)
 
                 if verbose:
                     print(f"  -> Found {len(results)} grades")
@@ -341,69 +1119,104 @@ def process_directory_by_term(input_dir, output_dir, terms_file='terms.csv', ver
                         print(f"  -> Found {len(results)} grades but no class code")
 
                 # Move to not-found directory
-                dest = notfound_path / xlsx_file.name
-                try:
-                    shutil.move(str(xlsx_file), str(dest))
-                    files_moved_to_notfound.append((xlsx_file.name, reason))
-                    if verbose:
-                        print(f"  -> Moved to not-found/")
-                except Exception as e:
-                    print(f"  -> ERROR moving file: {e}")
+                set_aside(xlsx_file, reason, file_profile, termid, class_code, len(results))
+        elif disposition != 'no_grades':
+            # Parse killed for breaking a limit - move to not-found
+            files_failed.append(xlsx_file.name)
+            set_aside(xlsx_file, disposition, file_profile, termid, class_code, 0)
         else:
             files_without_grades.append(xlsx_file.name)
             if verbose:
                 print(f"  -> No grades found")
 
             # Move to not-found directory
-            dest = notfound_path / xlsx_file.name
-            try:
-                shutil.move(str(xlsx_file), str(dest))
-                files_moved_to_notfound.append((xlsx_file.name, "no_grades"))
-                if verbose:
-                    print(f"  -> Moved to not-found/")
-            except Exception as e:
-                print(f"  -> ERROR moving file: {e}")
+            set_aside(xlsx_file, "no_grades", file_profile, termid, class_code, 0)
 
-    # Write separate CSV file for each (term_id, class_code) combination
-    csv_files_written = []
-    for (termid, class_code), records in sorted(records_by_key.items()):
-        output_csv = output_path / f'grades_extract_{termid}_{class_code}.csv'
+    # Let the pending moves finish
+    mover.close()
 
-        with open(output_csv, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=['filename', 'student_id', 'grade'])
-            writer.writeheader()
-            writer.writerows(records)
+    if profiling:
+        write_profiles(profile_out, profiles)
+        print(f"Wrote stage timings for {len(profiles)} files to {profile_out}")
 
-        csv_files_written.append((termid, class_code, len(records), output_csv))
-        print(f"Wrote {len(records)} records for {termid} {class_code} to {output_csv.name}")
+    # Move the finished CSV file for each (term_id, class_code) combination into place
+    csv_files_written = []
+    for (termid, class_code), count, output_csv in sink.finalize():
+        csv_files_written.append((termid, class_code, count, output_csv))
+        print(f"Wrote {count} records for {termid} {class_code} to {output_csv.name}")
+
+    if prune:
+        pruned = manifest.prune(xlsx_files)
+        print(f"Pruned {pruned} manifest entries for files no longer present")
+    manifest.save()
+    if not move:
+        write_dispositions(Path(output_dir) / DISPOSITIONS_NAME, files_set_aside)
+    if templates is not None:
+        templates.save()
+    if cache is not None:
+        evicted, cache_bytes = cache.evict()
+        print(f"Sheet cache: {cache_bytes / (1024 * 1024):.1f} MB in {cache.directory}"
+              + (f", evicted {evicted} files" if evicted else ""))
 
     # Summary
     print(f"\n{'='*60}")
     print(f"SUMMARY")
     print(f"{'='*60}")
     print(f"  Files processed: {len(xlsx_files)}")
+    print(f"  Files reused from manifest: {files_reused}")
     print(f"  Files with grades: {files_with_grades}")
     print(f"  Files without grades: {len(files_without_grades)}")
     print(f"  Files without term ID: {len(files_without_termid)}")
     print(f"  Files without class code: {len(files_without_classcode)}")
-    print(f"  Files moved to not-found/: {len(files_moved_to_notfound)}")
+    print(f"  Files that failed to parse: {len(files_failed)}")
+    if move:
+        print(f"  Files moved to not-found/: {len(files_moved_to_notfound)}")
+    else:
+        print(f"  Files listed in {DISPOSITIONS_NAME} (not moved): {len(files_set_aside)}")
+    if members_left_in_archives:
+        print(f"  Unidentified files left in archives: {len(members_left_in_archives)}")
     print(f"  Total grade records: {total_records}")
     print(f"  CSV files written: {len(csv_files_written)}")
+    if templates is not None:
+        print(f"  Sheet templates: {templates.stats['hit']} used, {templates.stats['stale']} outdated, "
+              f"{templates.stats['miss']} not known")
     print(f"  Output directory: {output_path}")
-    print(f"  Not-found directory: {notfound_path}")
-
-    if files_moved_to_notfound:
-        print(f"\nMoved to not-found/ directory:")
+    if move:
+        print(f"  Not-found directory: {notfound_path}")
+
+    if profiling and profiles:
+        print("\nStage timings (seconds per file):")
+        print(f"  {'stage':<10}{'files':>7}{'p50':>10}{'p95':>10}{'max':>10}")
+        for name, count, p50, p95, worst in stage_stats(profiles):
+            print(f"  {name:<10}{count:>7}{p50:>10.4f}{p95:>10.4f}{worst:>10.4f}")
+
+        print("\nSlowest files:")
+        for file_profile in slowest(profiles, 10):
+            stages = ', '.join(f"{name} {file_profile.seconds[name]:.3f}s"
+                               for name in STAGES if name in file_profile.seconds)
+            print(f"  {file_profile.total_seconds:8.3f}s  {Path(file_profile.file).name} ({stages})")
+
+    for heading, set_aside_files in (("Moved to not-found/ directory", files_moved_to_notfound),
+                                     (f"Listed in {DISPOSITIONS_NAME} (left in place)",
+                                      [(Path(entry.path).name, entry.reason) for entry in files_set_aside]),
+                                     ("Left in archives (dispositions recorded in the manifest)",
+                                      members_left_in_archives)):
+        if not set_aside_files:
+            continue
+        print(f"\n{heading}:")
         # Group by reason
         by_reason = defaultdict(list)
-        for filename, reason in files_moved_to_notfound:
+        for filename, reason in set_aside_files:
             by_reason[reason].append(filename)
 
         for reason, filenames in by_reason.items():
             reason_label = {
                 'no_termid': 'No term ID match',
                 'no_classcode': 'No class code',
-                'no_grades': 'No grades found'
+                'no_grades': 'No grades found',
+                'parse_timeout': 'Parse timed out',
+                'parse_oom': 'Parse went over the memory limit',
+                'parse_error': 'Parse worker crashed'
             }.get(reason, reason)
             print(f"\n  {reason_label} ({len(filenames)} files):")
             for f in filenames[:5]:
@@ -411,46 +1224,224 @@ def process_directory_by_term(input_dir, output_dir, terms_file='terms.csv', ver
             if len(filenames) > 5:
                 print(f"    ... and {len(filenames) - 5} more")
 
-    return records_by_key
+    return sink.counts
 
 
-def process_single_file(filepath, output_dir):
-    """Process a single file and write CSV."""
+def watch_directory(input_dir, output_dir, terms_file='terms.csv', verbose=False,
+                    interval=DEFAULT_POLL_INTERVAL, settle=DEFAULT_SETTLE_SECONDS, polls=None,
+                    timeout=DEFAULT_PARSE_TIMEOUT, max_rss_mb=DEFAULT_MAX_RSS_MB, move=True, **options):
+    """
+    Watch input_dir and extract workbooks as they arrive or change, appending
+    their grades to the CSV files of an earlier directory run in output_dir.
+
+    input_dir is polled every interval seconds. A new or changed workbook is
+    only read once its size and mtime have held still for settle seconds, so
+    files that are still being copied in are left alone. Files recorded in the
+    manifest with their current size and mtime are skipped. When a workbook
+    that was already extracted changes, its old rows are removed from its CSV
+    before the new ones are appended. Unidentified files are moved to
+    not-found/ (or left in their archive) as in a directory run; with
+    move=False they are added to output_dir/not_found.csv instead.
+
+    The term matcher, manifest and CSV file handles stay open between polls.
+    With a timeout or max_rss_mb, workbooks are parsed in one worker process
+    that is also kept between polls, so a workbook that hangs is given up on
+    (and moved to not-found/) instead of stalling the watch. A workbook given
+    up on is tried again once it changes, or by the next watch or run.
+    Runs until interrupted (or for polls polls); options are passed on to
+    process_xlsx_file.
+    """
+    input_path = Path(input_dir)
+    output_path = Path(output_dir) / 'extracted'
+    notfound_path = Path(output_dir) / 'not-found'
+
+    output_path.mkdir(parents=True, exist_ok=True)
+    if move:
+        notfound_path.mkdir(parents=True, exist_ok=True)
+
+    term_matcher = TermMatcher(load_terms(terms_file))
+    manifest = ExtractionManifest(Path(output_dir) / MANIFEST_NAME,
+                                  crop=(options.get('max_rows', DEFAULT_MAX_ROWS),
+                                        options.get('max_cols', DEFAULT_MAX_COLS)))
+    dispositions_path = Path(output_dir) / DISPOSITIONS_NAME
+    # Files left in place so far, by absolute path
+    set_aside = None if move else {entry.path: entry for entry in read_dispositions(dispositions_path)}
+    sink = LiveCsvSink(lambda key: output_path / f'grades_extract_{key[0]}_{key[1]}.csv')
+    parse = partial(process_xlsx_file, verbose=verbose, **options)
+    hashing = options.get('cache') is not None
+    if hashing:
+        # Hash each workbook once, for both the sheet cache and the manifest
+        parse = partial(_parse_noting_digest, parse)
+    pool = WorkerPool(parse, timeout=timeout, max_rss_mb=max_rss_mb) if timeout or max_rss_mb else None
+
+    # Workbooks given up on this session: path -> signature when tried
+    given_up = {}
+
+    def extract_arrival(xlsx_file, signature):
+        if manifest.lookup(xlsx_file) is not None:
+            # Touched but not modified; lookup() has noted the new mtime
+            return
+
+        previous = manifest.previous(xlsx_file)
+        if pool:
+            _, results, _ = next(pool.map([(xlsx_file, None)]))
+        else:
+            results = parse(xlsx_file)
+        digest = None
+        if hashing and not isinstance(results, ParseFailure):
+            results, digest, _ = results
+        termid = term_matcher.match(xlsx_file.name)
+        class_code = extract_class_code_from_filename(xlsx_file.name)
+        disposition = file_disposition(results, termid, class_code)
+        key = (termid, class_code)
+        if isinstance(results, ParseFailure):
+            print(f"WARNING: Gave up on {xlsx_file.name}: {results.message}")
+            results = GradeBatch(xlsx_file.stem)
+            given_up[xlsx_file] = signature
+
+        if previous and previous[1] == 'extracted' and termid and class_code:
+            removed = sink.remove(key, previous[0])
+            print(f"Removed {removed} earlier records of {xlsx_file.name}")
+        manifest.record(xlsx_file, results, disposition, sha256=digest)
+
+        if disposition == 'extracted':
+            sink.write(key, results)
+            print(f"Appended {len(results)} records for {termid} {class_code} from {xlsx_file.name}")
+            if set_aside is not None:
+                set_aside.pop(str(xlsx_file.resolve()), None)
+            return
+        if isinstance(xlsx_file, ArchiveMember):
+            print(f"Left {xlsx_file} in its archive ({disposition})")
+            return
+        if set_aside is not None:
+            path = str(xlsx_file.resolve())
+            try:
+                size = xlsx_file.stat().st_size
+            except OSError as e:
+                print(f"  -> ERROR listing {xlsx_file.name}: {e}")
+                return
+            set_aside[path] = SetAside(path, disposition, size, len(results), termid or '', class_code or '')
+            print(f"Listed {xlsx_file.name} in {DISPOSITIONS_NAME} ({disposition})")
+            return
+
+        try:
+            shutil.move(str(xlsx_file), str(notfound_path / xlsx_file.name))
+            print(f"Moved {xlsx_file.name} to not-found/ ({disposition})")
+        except Exception as e:
+            print(f"  -> ERROR moving {xlsx_file.name}: {e}")
+
+    # Changed files waiting to settle: path -> ((size, mtime_ns), when first seen so)
+    pending = {}
+    poll_count = 0
+
+    print(f"Watching {input_path} every {interval:g}s (Ctrl-C to stop)")
+    try:
+        while polls is None or poll_count < polls:
+            if poll_count:
+                time.sleep(interval)
+            poll_count += 1
+
+            now = time.monotonic()
+            ready = []
+            present = set()
+            for xlsx_file in discover_xlsx_files(input_path, exclude=(output_path, notfound_path)):
+                try:
+                    stat = xlsx_file.stat()
+                except OSError:
+                    continue  # gone since it was listed
+                present.add(xlsx_file)
+
+                if manifest.is_recorded(xlsx_file, stat):
+                    pending.pop(xlsx_file, None)
+                    continue
+
+                signature = (stat.st_size, stat.st_mtime_ns, getattr(stat, 'st_crc', None))
+                if given_up.get(xlsx_file) == signature:
+                    continue
+                if xlsx_file not in pending or pending[xlsx_file][0] != signature:
+                    # New, or still being written
+                    pending[xlsx_file] = (signature, now)
+                elif now - pending[xlsx_file][1] >= settle:
+                    del pending[xlsx_file]
+                    ready.append((xlsx_file, signature))
+
+            for xlsx_file in [f for f in pending if f not in present]:
+                del pending[xlsx_file]
+
+            if verbose and pending:
+                print(f"  {len(pending)} files waiting to settle")
+
+            for xlsx_file, signature in ready:
+                extract_arrival(xlsx_file, signature)
+            if ready:
+                sink.flush()
+                manifest.save()
+                if set_aside is not None:
+                    write_dispositions(dispositions_path, set_aside.values())
+    except KeyboardInterrupt:
+        print("\nStopped watching")
+    finally:
+        if pool:
+            pool.close()
+        sink.close()
+        manifest.save()
+
+
+def apply_dispositions_file(output_dir, link=False, threads=DEFAULT_APPLY_THREADS):
+    """
+    Carry out the moves a move=False directory run listed in
+    output_dir/not_found.csv: move (or with link, hardlink) each file into
+    output_dir/not-found/, threads at a time.
+
+    After moving, the list keeps only the files that could not be moved,
+    so the step can be re-run. Hardlinking leaves the originals in place,
+    so the list is kept as it is. Returns the number of files applied.
+    """
+    dispositions_path = Path(output_dir) / DISPOSITIONS_NAME
+    entries = read_dispositions(dispositions_path)
+    if not entries:
+        print(f"Nothing to apply: no files listed in {dispositions_path}")
+        return 0
+
+    action = 'Linked' if link else 'Moved'
+    outcomes = apply_dispositions(entries, Path(output_dir) / 'not-found', link=link, threads=threads)
+    failed = [(entry, error) for entry, error in outcomes if error is not None]
+    for entry, error in failed:
+        print(f"  -> Skipped {entry.path}: {error}")
+    if not link:
+        write_dispositions(dispositions_path, [entry for entry, _ in failed])
+
+    applied = len(entries) - len(failed)
+    print(f"{action} {applied} of {len(entries)} files listed in {DISPOSITIONS_NAME} into not-found/")
+    return applied
+
+
+def process_single_file(filepath, output_dir, sample_rows=DEFAULT_SAMPLE_ROWS, engine='pandas',
+                        max_rows=DEFAULT_MAX_ROWS, max_cols=DEFAULT_MAX_COLS, verbose=False, cache=None):
+    """Process a single file and append its records to grades_extract.csv; returns them as a GradeBatch."""
     filepath = Path(filepath)
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
     
-    file_stem = filepath.stem
-    results = process_xlsx_file(filepath)
+    results = process_xlsx_file(filepath, sample_rows=sample_rows, engine=engine,
+                                max_rows=max_rows, max_cols=max_cols, verbose=verbose, cache=cache)
     
     if not results:
         print(f"No grades found in {filepath}")
-        return []
-    
-    records = []
-    for student_id, grade in results:
-        records.append({
-            'filename': file_stem,
-            'student_id': student_id,
-            'grade': grade
-        })
+        return results
     
     # Write CSV
     output_csv = output_path / 'grades_extract.csv'
     
     # Append if file exists, otherwise create with header
-    file_exists = output_csv.exists()
-    
-    with open(output_csv, 'a', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=['filename', 'student_id', 'grade'])
-        if not file_exists:
-            writer.writeheader()
-        writer.writerows(records)
+    sink = LiveCsvSink(lambda key: output_csv)
+    sink.write(None, results)
+    sink.close()
     
-    print(f"Extracted {len(records)} grades from {filepath.name}")
+    print(f"Extracted {len(results)} grades from {filepath.name}")
     print(f"Output: {output_csv}")
     
-    return records
+    return results
 
 
 def main():
@@ -461,7 +1452,8 @@ def main():
         'input',
         nargs='?',
         default=os.path.expanduser('~/Documents/CONSOLIDATE-IFL-GRADES'),
-        help='Input xlsx file or directory (default: ~/Documents/IFL_CONSOLIDATED)'
+        help='Input xlsx file, directory, or zip archive; zips in a directory are read in place '
+             '(default: ~/Documents/IFL_CONSOLIDATED)'
     )
     parser.add_argument(
         '-o', '--output',
@@ -478,28 +1470,198 @@ def main():
         action='store_true',
         help='Verbose output'
     )
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=1,
+        help='Number of worker processes for parsing workbooks in directory mode '
+             '(default: 1, 0 = one per CPU)'
+    )
+    parser.add_argument(
+        '--rebuild',
+        action='store_true',
+        help=f'Ignore {MANIFEST_NAME} and re-parse every workbook'
+    )
+    parser.add_argument(
+        '--prune',
+        action='store_true',
+        help=f'Drop {MANIFEST_NAME} entries for files no longer in the input directory'
+    )
+    parser.add_argument(
+        '--sample-rows',
+        type=int,
+        default=DEFAULT_SAMPLE_ROWS,
+        help='Rows used to shortlist grade/ID columns before confirming them against '
+             f'the full sheet (default: {DEFAULT_SAMPLE_ROWS}, 0 = always scan every row)'
+    )
+    parser.add_argument(
+        '--engine',
+        choices=ENGINES,
+        default='pandas',
+        help='Workbook reader: pandas (DataFrames via openpyxl) or fast (streams cells '
+             'straight from the xlsx XML, same results) (default: pandas)'
+    )
+    parser.add_argument(
+        '--profile-out',
+        metavar='PATH',
+        help='Write per-file, per-stage timings as JSON lines to PATH and add '
+             'stage percentiles and the slowest files to the summary (directory mode)'
+    )
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='After processing the input directory, keep polling it and append grades from '
+             'new or changed workbooks to the CSV files'
+    )
+    parser.add_argument(
+        '--poll-interval',
+        type=float,
+        default=DEFAULT_POLL_INTERVAL,
+        help=f'Seconds between polls in --watch mode (default: {DEFAULT_POLL_INTERVAL:g})'
+    )
+    parser.add_argument(
+        '--settle',
+        type=float,
+        default=DEFAULT_SETTLE_SECONDS,
+        help='Seconds a new or changed file must stay unchanged before --watch reads it '
+             f'(default: {DEFAULT_SETTLE_SECONDS:g})'
+    )
+    parser.add_argument(
+        '--max-rows',
+        type=int,
+        default=DEFAULT_MAX_ROWS,
+        help='Most rows read from a sheet, whatever used range it declares '
+             f'(default: {DEFAULT_MAX_ROWS}, 0 = no limit)'
+    )
+    parser.add_argument(
+        '--max-cols',
+        type=int,
+        default=DEFAULT_MAX_COLS,
+        help='Most columns read from a sheet, whatever used range it declares '
+             f'(default: {DEFAULT_MAX_COLS}, 0 = no limit)'
+    )
+    parser.add_argument(
+        '--parse-timeout',
+        type=float,
+        default=DEFAULT_PARSE_TIMEOUT,
+        metavar='SECONDS',
+        help='Give up on a workbook still parsing after this long and move it to not-found/ '
+             f'(default: {DEFAULT_PARSE_TIMEOUT}, 0 = no limit)'
+    )
+    parser.add_argument(
+        '--max-rss',
+        type=int,
+        default=DEFAULT_MAX_RSS_MB,
+        metavar='MB',
+        help='Give up on a workbook whose parser process uses more memory than this '
+             f'(default: {DEFAULT_MAX_RSS_MB}, 0 = no limit)'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        help='Keep parsed sheets in this directory, so later runs (e.g. with --rebuild after a '
+             'detection change) skip decoding unchanged workbooks (default: no cache)'
+    )
+    parser.add_argument(
+        '--cache-mb',
+        type=int,
+        default=DEFAULT_CACHE_MB,
+        help=f'Size the sheet cache is trimmed to after a run (default: {DEFAULT_CACHE_MB})'
+    )
+    parser.add_argument(
+        '--no-move',
+        action='store_true',
+        help=f'Leave unidentified files in place and list them in {DISPOSITIONS_NAME} in the '
+             'output directory instead of moving them to not-found/'
+    )
+    parser.add_argument(
+        '--apply-dispositions',
+        choices=('move', 'link'),
+        metavar='{move,link}',
+        help=f'Only move (or hardlink) the files listed in {DISPOSITIONS_NAME} by an earlier '
+             '--no-move run into not-found/, then exit'
+    )
+    parser.add_argument(
+        '--apply-threads',
+        type=int,
+        default=DEFAULT_APPLY_THREADS,
+        help=f'Moves or links run at once by --apply-dispositions (default: {DEFAULT_APPLY_THREADS})'
+    )
+    parser.add_argument(
+        '--no-templates',
+        action='store_true',
+        help='Try every sheet in workbook order instead of first reading the sheet '
+             'that held the grades in workbooks with the same layout. With templates, a '
+             'workbook with grades in its template sheet\'s remembered columns takes them '
+             'from that sheet even if an earlier sheet also has grades; without, the '
+             'first sheet with grades is used'
+    )
 
     args = parser.parse_args()
 
+    if args.apply_dispositions:
+        apply_dispositions_file(args.output, link=args.apply_dispositions == 'link',
+                                threads=args.apply_threads)
+        return 0
+
     input_path = Path(args.input).expanduser()
+    cache = None
+    if args.cache_dir:
+        cache = SheetCache(Path(args.cache_dir).expanduser(), args.cache_mb * 1024 * 1024)
 
     if not input_path.exists():
         print(f"Error: {args.input} does not exist")
         return 1
 
-    if input_path.is_file():
+    if args.watch and not input_path.is_dir():
+        print("Error: --watch needs an input directory")
+        return 1
+
+    from_archive = input_path.is_file() and is_archive_name(input_path.name)
+    if input_path.is_file() and not from_archive:
         # Single file mode - process and output to extracted/ folder
         print("Single file mode - processing one xlsx file")
-        process_single_file(input_path, args.output)
-    elif input_path.is_dir():
+        process_single_file(input_path, args.output, sample_rows=args.sample_rows, engine=args.engine,
+                            max_rows=args.max_rows, max_cols=args.max_cols, verbose=args.verbose,
+                            cache=cache)
+    elif input_path.is_dir() or from_archive:
         # Directory mode - group by term ID
         print(f"Directory mode - processing all xlsx files in {input_path}")
         process_directory_by_term(
             input_path,
             args.output,
             terms_file=args.terms,
-            verbose=args.verbose
+            verbose=args.verbose,
+            jobs=args.jobs,
+            sample_rows=args.sample_rows,
+            rebuild=args.rebuild,
+            prune=args.prune,
+            engine=args.engine,
+            max_rows=args.max_rows,
+            max_cols=args.max_cols,
+            profile_out=args.profile_out,
+            timeout=args.parse_timeout,
+            max_rss_mb=args.max_rss,
+            use_templates=not args.no_templates,
+            cache=cache,
+            move=not args.no_move
         )
+        if args.watch:
+            watch_directory(
+                input_path,
+                args.output,
+                terms_file=args.terms,
+                verbose=args.verbose,
+                interval=args.poll_interval,
+                settle=args.settle,
+                sample_rows=args.sample_rows,
+                engine=args.engine,
+                max_rows=args.max_rows,
+                max_cols=args.max_cols,
+                timeout=args.parse_timeout,
+                max_rss_mb=args.max_rss,
+                move=not args.no_move,
+                cache=cache
+            )
     else:
         print(f"Error: {args.input} is not a valid file or directory")
         return 1
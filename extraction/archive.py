@@ -0,0 +1,170 @@
+import io
+import zipfile
+import posixpath
+from pathlib import Path
+from datetime import datetime
+from functools import lru_cache
+from collections import namedtuple
+
+# What ArchiveMember.stat() returns: the fields the manifest and watch
+# mode compare. mtime_ns is the member's own zip timestamp, which has
+# 2-second resolution and is often fixed by the exporting tool, so the
+# member's CRC-32 from the central directory is compared too.
+MemberStat = namedtuple('MemberStat', ['st_size', 'st_mtime_ns', 'st_crc'])
+
+# Archives (and nested archives) kept open per process, so listing and
+# reading a bundle's members doesn't re-read its central directory each time
+_OPEN_ARCHIVES = 8
+
+
+def is_archive_name(name):
+    """True for names of zip archives (matched case-insensitively)."""
+    return name.lower().endswith('.zip')
+
+
+def _skipped_name(name):
+    """Temp files (~$...) and hidden files, which are never read."""
+    return name.startswith('~$') or name.startswith('.')
+
+
+@lru_cache(maxsize=_OPEN_ARCHIVES)
+def _open_archive(archive, members, signature):
+    """
+    ZipFile for archive, or for the zip reached by following members (each
+    a zip inside the one before). Nested zips are read into memory, since
+    a zip reader needs to seek. signature is the archive's (size, mtime_ns),
+    so a replaced archive is opened afresh.
+    """
+    if not members:
+        return zipfile.ZipFile(archive)
+    outer = _open_archive(archive, members[:-1], signature)
+    return zipfile.ZipFile(io.BytesIO(outer.read(members[-1])))
+
+
+class ArchiveMember:
+    """
+    An xlsx file inside a zip archive, possibly nested in other zips, used
+    in place of the Path of a workbook on disk.
+
+    str() is the archive member path (the archive's path, then each member
+    name, joined by '/'), which is what the manifest keys it by. name and
+    stem are those of the workbook itself. open() returns the member's
+    bytes in memory; nothing is unpacked to disk. Members are picklable,
+    so they can be sent to worker processes, which open the archive
+    themselves.
+    """
+
+    __slots__ = ('archive', 'members')
+
+    def __init__(self, archive, members):
+        self.archive = Path(archive)
+        self.members = tuple(members)
+
+    def __str__(self):
+        return '/'.join([str(self.archive), *self.members])
+
+    def __repr__(self):
+        return f'ArchiveMember({str(self)!r})'
+
+    def __eq__(self, other):
+        return (isinstance(other, ArchiveMember)
+                and (self.archive, self.members) == (other.archive, other.members))
+
+    def __hash__(self):
+        return hash((self.archive, self.members))
+
+    def __getstate__(self):
+        return self.archive, self.members
+
+    def __setstate__(self, state):
+        self.archive, self.members = state
+
+    @property
+    def name(self):
+        return posixpath.basename(self.members[-1])
+
+    @property
+    def stem(self):
+        return posixpath.splitext(self.name)[0]
+
+    def resolve(self):
+        return ArchiveMember(self.archive.resolve(), self.members)
+
+    def _container(self):
+        """The open ZipFile holding this member."""
+        stat = self.archive.stat()
+        return _open_archive(self.archive, self.members[:-1], (stat.st_size, stat.st_mtime_ns))
+
+    def stat(self):
+        try:
+            info = self._container().getinfo(self.members[-1])
+        except (KeyError, zipfile.BadZipFile) as e:
+            raise FileNotFoundError(f"{self}: {e}") from e
+        mtime = datetime(*info.date_time).timestamp()
+        return MemberStat(info.file_size, int(mtime) * 1_000_000_000, info.CRC)
+
+    def read_bytes(self):
+        try:
+            return self._container().read(self.members[-1])
+        except (KeyError, zipfile.BadZipFile) as e:
+            raise FileNotFoundError(f"{self}: {e}") from e
+
+    def open(self, mode='rb'):
+        if mode != 'rb':
+            raise ValueError(f"archive members can only be opened with mode 'rb', not {mode!r}")
+        return io.BytesIO(self.read_bytes())
+
+
+def open_input(path):
+    """Open a workbook for binary reading, whether it is a file or an ArchiveMember."""
+    if isinstance(path, ArchiveMember):
+        return path.open()
+    return open(path, 'rb')
+
+
+def stat_input(path):
+    """os.stat() of a workbook file, or the MemberStat of an ArchiveMember."""
+    if isinstance(path, ArchiveMember):
+        return path.stat()
+    return Path(path).stat()
+
+
+def input_stem(path):
+    """Filename without extension of a workbook file or ArchiveMember."""
+    if isinstance(path, ArchiveMember):
+        return path.stem
+    return Path(path).stem
+
+
+def iter_archive_xlsx(archive, members=()):
+    """
+    Yield an ArchiveMember for each xlsx file in a zip archive, descending
+    into zips inside it (members is the chain of zips already descended).
+
+    __MACOSX entries, temp files and hidden files are skipped, as when
+    walking a directory. Each archive's workbooks are yielded (sorted by
+    member name) before its nested archives are read.
+    """
+    archive = Path(archive)
+    location = '/'.join([str(archive), *members])
+    try:
+        stat = archive.stat()
+        infos = _open_archive(archive, tuple(members), (stat.st_size, stat.st_mtime_ns)).infolist()
+    except (OSError, KeyError, zipfile.BadZipFile) as e:
+        print(f"WARNING: Could not read archive {location}: {e}")
+        return
+
+    nested = []
+    for info in sorted(infos, key=lambda info: info.filename):
+        if info.is_dir():
+            continue
+        parts = info.filename.split('/')
+        if any('__MACOSX' in part for part in parts) or _skipped_name(parts[-1]):
+            continue
+        if parts[-1].endswith('.xlsx'):
+            yield ArchiveMember(archive, (*members, info.filename))
+        elif is_archive_name(parts[-1]):
+            nested.append(info.filename)
+
+    for name in nested:
+        yield from iter_archive_xlsx(archive, (*members, name))
@@ -0,0 +1,109 @@
+import os
+import csv
+import errno
+import shutil
+import tempfile
+from pathlib import Path
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+DISPOSITIONS_NAME = 'not_found.csv'
+
+# A workbook a --no-move run left in place instead of moving to not-found/:
+# its absolute path, why it was set aside, its size in bytes, the grade
+# records found in it, and the term ID and class code matched from its name
+# ('' if none)
+SetAside = namedtuple('SetAside', ['path', 'reason', 'size', 'records', 'termid', 'class_code'])
+
+# Moves or links made at once by apply_dispositions
+DEFAULT_APPLY_THREADS = 8
+
+
+def write_dispositions(path, entries):
+    """Write SetAside entries as CSV, atomically (temp file, then rename)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(SetAside._fields)
+            writer.writerows(entries)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def read_dispositions(path):
+    """Return the SetAside entries in a file written by write_dispositions (none if it is missing)."""
+    try:
+        with open(path, 'r', newline='') as f:
+            rows = list(csv.DictReader(f))
+    except FileNotFoundError:
+        return []
+    return [SetAside(row['path'], row['reason'], int(row['size']), int(row['records']),
+                     row['termid'], row['class_code'])
+            for row in rows]
+
+
+def _move_no_clobber(source, dest):
+    """Move source to dest, failing with EEXIST rather than replacing an existing dest."""
+    try:
+        os.link(source, dest)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # Across filesystems: copy into a file only this call can create
+        with open(source, 'rb') as src, open(dest, 'xb') as dst:
+            shutil.copyfileobj(src, dst)
+        shutil.copystat(source, dest)
+    os.unlink(source)
+
+
+def _apply(entry, notfound_dir, link):
+    """Move or hardlink one set-aside workbook into notfound_dir. Returns None or an error message."""
+    source = Path(entry.path)
+    dest = Path(notfound_dir) / source.name
+    try:
+        size = source.stat().st_size
+    except OSError as e:
+        return f"no longer readable: {e.strerror or e}"
+    if size != entry.size:
+        # Edited since the run that set it aside; that run's reason may not hold
+        return f"changed since it was set aside ({entry.size:,} -> {size:,} bytes)"
+
+    try:
+        if dest.exists() and os.path.samefile(source, dest):
+            # Linked by an earlier apply (or a move cut short after linking)
+            if not link:
+                os.unlink(source)
+        elif link:
+            os.link(source, dest)
+        else:
+            _move_no_clobber(source, dest)
+    except OSError as e:
+        if e.errno == errno.EXDEV:
+            return "can't hardlink across filesystems"
+        if e.errno == errno.EEXIST:
+            # Another listed file (or an earlier one) with the same name got there first
+            return f"{dest} already exists"
+        return str(e)
+    return None
+
+
+def apply_dispositions(entries, notfound_dir, link=False, threads=DEFAULT_APPLY_THREADS):
+    """
+    Move (or with link, hardlink) each set-aside workbook into notfound_dir,
+    threads at a time. Returns [(entry, error)] in the order of entries,
+    error being None for those that were applied.
+
+    A workbook that is gone, or whose size no longer matches the entry, is
+    left alone and reported as an error, as is one whose name is already
+    taken in notfound_dir: nothing there is ever replaced.
+    """
+    notfound_dir = Path(notfound_dir)
+    notfound_dir.mkdir(parents=True, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as pool:
+        errors = pool.map(lambda entry: _apply(entry, notfound_dir, link), entries)
+        return list(zip(entries, errors))
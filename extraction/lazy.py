@@ -0,0 +1,26 @@
+import importlib
+
+
+class LazyModule:
+    """
+    Stands in for a module that is imported on first attribute access.
+
+    `pd = LazyModule('pandas')` reads like `import pandas as pd`, but pandas
+    is only imported when something first uses `pd.<name>`, so runs that
+    never touch it (--help, an idle watch loop) don't pay for the import.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        # Only called for names not set in __init__, i.e. the module's own
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<LazyModule {self._name!r} ({state})>"
@@ -0,0 +1,192 @@
+import os
+import json
+import hashlib
+import tempfile
+import logging
+from pathlib import Path
+
+from extraction.archive import ArchiveMember, open_input, stat_input, input_stem
+from extraction.records import GradeBatch
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'extract_manifest.json'
+MANIFEST_VERSION = 1
+
+# Dispositions of workbooks that were given up on rather than read; their
+# entries are kept for the record but never served, so the file is tried
+# again (perhaps with a longer timeout or a higher memory cap)
+PARSE_FAILURES = ('parse_timeout', 'parse_oom', 'parse_error')
+
+
+def _crc(stat):
+    """CRC-32 of an archive member (see MemberStat); None for a file on disk."""
+    return getattr(stat, 'st_crc', None)
+
+
+def _records_json(batch):
+    """JSON form of an entry's records (json.dump's default hook)."""
+    if isinstance(batch, GradeBatch):
+        return [list(record) for record in batch]
+    raise TypeError(f"Object of type {type(batch).__name__} is not JSON serializable")
+
+
+def file_sha256(path):
+    """Return the hex SHA-256 of a file's (or an ArchiveMember's) contents."""
+    with open_input(path) as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+class ExtractionManifest:
+    """
+    On-disk record of every workbook seen by a directory run.
+
+    Entries are keyed by absolute path (the archive member path for a
+    workbook read from a zip, see ArchiveMember) and hold the file's size, mtime,
+    content hash, extracted (student_id, grade) records and disposition
+    (extracted, no_grades, no_termid, no_classcode); archive members also
+    hold their zip CRC. Records are held as GradeBatch objects and only
+    written out as JSON by save(), so the manifest stays compact however
+    many files a run records. A file whose size, mtime (and CRC) are unchanged is
+    served from the manifest; a member whose CRC changed is parsed again;
+    otherwise, if only the mtime changed, the content hash decides. Files
+    recorded with one of the PARSE_FAILURES, or read with a different crop
+    (the (max_rows, max_cols) budget, 0 = no limit), are always parsed again.
+    """
+
+    def __init__(self, path, rebuild=False, crop=(0, 0)):
+        self.path = Path(path)
+        self.entries = {}
+        # As stored in the entries (a JSON list)
+        self.crop = [limit or 0 for limit in crop]
+
+        if rebuild or not self.path.exists():
+            return
+
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self.entries = data.get('files', {})
+                for entry in self.entries.values():
+                    entry['records'] = GradeBatch.from_records('', entry['records'])
+            else:
+                logger.warning(f"Ignoring manifest {self.path} with unknown version")
+        except Exception as e:
+            logger.warning(f"Could not read manifest {self.path}: {e}")
+
+    @staticmethod
+    def _key(filepath):
+        if isinstance(filepath, ArchiveMember):
+            return str(filepath.resolve())
+        return str(Path(filepath).resolve())
+
+    def lookup(self, filepath):
+        """
+        Return the cached records for filepath (a GradeBatch) if it is
+        unchanged since it was recorded, otherwise None.
+        """
+        entry = self.entries.get(self._key(filepath))
+        if entry is None or not self._reusable(entry):
+            return None
+
+        try:
+            stat = stat_input(filepath)
+        except OSError:
+            return None
+
+        if stat.st_size != entry['size']:
+            return None
+        crc = _crc(stat)
+        if crc is not None and entry.get('crc') not in (None, crc):
+            return None
+
+        if stat.st_mtime_ns != entry['mtime_ns'] or crc != entry.get('crc'):
+            # Touched but possibly not modified (or recorded without a
+            # CRC) - compare contents
+            if file_sha256(filepath) != entry['sha256']:
+                return None
+            entry['mtime_ns'] = stat.st_mtime_ns
+            entry['crc'] = crc
+
+        return self._batch(filepath, entry)
+
+    @staticmethod
+    def _batch(filepath, entry):
+        """A copy of entry's records, named for filepath."""
+        records = entry['records']
+        return GradeBatch.from_columns(input_stem(filepath), records.student_ids(), records.grades.decode('ascii'))
+
+    def _reusable(self, entry):
+        """False if entry was given up on, or read with a different crop."""
+        return entry['disposition'] not in PARSE_FAILURES and entry.get('crop') == self.crop
+
+    @staticmethod
+    def _unchanged(entry, stat):
+        return (entry['size'], entry['mtime_ns'], entry.get('crc')) == (stat.st_size, stat.st_mtime_ns, _crc(stat))
+
+    def is_recorded(self, filepath, stat):
+        """
+        True if filepath is recorded with the size, mtime (and CRC) in stat,
+        and can be reused (see the class docstring).
+        """
+        entry = self.entries.get(self._key(filepath))
+        return entry is not None and self._reusable(entry) and self._unchanged(entry, stat)
+
+    def previous(self, filepath):
+        """Return (records as a GradeBatch, disposition) last recorded for filepath, or None."""
+        entry = self.entries.get(self._key(filepath))
+        if entry is None:
+            return None
+        return self._batch(filepath, entry), entry['disposition']
+
+    def record(self, filepath, records, disposition, sha256=None):
+        """
+        Store the extraction result (a GradeBatch, or any (student_id, grade)
+        pairs) and disposition for filepath. sha256 is the file's content
+        hash, if the caller has already computed it.
+        """
+        key = self._key(filepath)
+        entry = self.entries.get(key)
+        try:
+            stat = stat_input(filepath)
+            if sha256 is None:
+                if entry and self._unchanged(entry, stat):
+                    # Served from the manifest this run, contents already verified
+                    sha256 = entry['sha256']
+                else:
+                    sha256 = file_sha256(filepath)
+        except OSError as e:
+            logger.warning(f"Not recording {filepath} in manifest: {e}")
+            self.entries.pop(key, None)
+            return
+
+        self.entries[key] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'crc': _crc(stat),
+            'sha256': sha256,
+            'crop': self.crop,
+            'disposition': disposition,
+            'records': records if isinstance(records, GradeBatch) else GradeBatch.from_records('', records),
+        }
+
+    def prune(self, filepaths):
+        """Drop entries for files not in filepaths. Returns the number removed."""
+        keep = {self._key(filepath) for filepath in filepaths}
+        stale = [key for key in self.entries if key not in keep]
+        for key in stale:
+            del self.entries[key]
+        return len(stale)
+
+    def save(self):
+        """Write the manifest atomically (temp file, then rename)."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'version': MANIFEST_VERSION, 'files': self.entries}, f, default=_records_json)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
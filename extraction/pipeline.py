@@ -0,0 +1,90 @@
+import queue
+import threading
+
+from extraction.workers import WorkerPool
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+def background_iter(iterable, maxsize):
+    """
+    Consume iterable on a background thread and yield its items here.
+
+    At most maxsize items are buffered, so the producer runs ahead of the
+    consumer without growing without bound. An exception raised by the
+    producer is re-raised in the consumer after the items before it.
+    """
+    items = queue.Queue(maxsize=maxsize)
+
+    def produce():
+        try:
+            for item in iterable:
+                items.put((item, None))
+        except BaseException as e:
+            items.put((_DONE, e))
+        else:
+            items.put((_DONE, None))
+
+    threading.Thread(target=produce, daemon=True).start()
+
+    while True:
+        item, error = items.get()
+        if item is _DONE:
+            if error is not None:
+                raise error
+            return
+        yield item
+
+
+def ordered_map(func, pairs, jobs=1, window=None, timeout=None, max_rss_mb=None):
+    """
+    For each (item, result) of pairs, yield (item, result, computed) in
+    input order. func(item) is called for items whose result is None, and
+    computed says whether it was.
+
+    With jobs > 1, or a timeout or max_rss_mb limit, func runs in a
+    WorkerPool of jobs processes and up to window items (default jobs * 4)
+    are in flight at once, so results start arriving before pairs is
+    exhausted. An item whose call breaks a limit gets a ParseFailure as its
+    result. func and items must be picklable.
+    """
+    if jobs <= 1 and not timeout and not max_rss_mb:
+        for item, result in pairs:
+            if result is None:
+                yield item, func(item), True
+            else:
+                yield item, result, False
+        return
+
+    with WorkerPool(func, jobs, timeout=timeout, max_rss_mb=max_rss_mb) as pool:
+        yield from pool.map(pairs, window)
+
+
+class BackgroundWorker:
+    """
+    Runs submitted calls one at a time, in order, on a background thread.
+
+    submit() blocks once maxsize calls are waiting. Calls are expected to
+    handle their own errors; close() waits for the backlog to drain.
+    """
+
+    def __init__(self, func, maxsize):
+        self.func = func
+        self._calls = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            args = self._calls.get()
+            if args is _DONE:
+                return
+            self.func(*args)
+
+    def submit(self, *args):
+        self._calls.put(args)
+
+    def close(self):
+        self._calls.put(_DONE)
+        self._thread.join()
@@ -0,0 +1,153 @@
+import io
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+from extraction.archive import ArchiveMember
+
+# Stages in the order they happen to a workbook
+STAGES = ('manifest', 'cache', 'open', 'parse', 'detect', 'match', 'move')
+
+_NO_STAGE = nullcontext()
+
+
+def no_stage(name):
+    """Stand-in for FileProfile.stage when profiling is off."""
+    return _NO_STAGE
+
+
+class CountingFile(io.FileIO):
+    """Unbuffered binary file that counts the bytes read through it."""
+
+    def __init__(self, path):
+        super().__init__(path, 'rb')
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def readinto(self, buffer):
+        n = super().readinto(buffer)
+        self.bytes_read += n or 0
+        return n
+
+    def readall(self):
+        data = super().readall()
+        self.bytes_read += len(data)
+        return data
+
+
+class CountingBuffer(io.BytesIO):
+    """In-memory binary file (an archive member's bytes) that counts the bytes read through it."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def readinto(self, buffer):
+        n = super().readinto(buffer)
+        self.bytes_read += n
+        return n
+
+
+class FileProfile:
+    """
+    Wall time and bytes read per stage for one workbook.
+
+    Stages are timed with `with profile.stage(name):`; time spent in the same
+    stage more than once (e.g. parsing several sheets) adds up. Bytes are
+    counted while the file is read through open(), so they are the bytes the
+    zip reader actually pulled from disk, not the uncompressed sheet sizes.
+    For a workbook inside an archive they are pulled from its bytes in
+    memory, which are read out of the archive when it is opened.
+    """
+
+    def __init__(self, filepath):
+        self.file = str(filepath)
+        self._path = filepath
+        self.seconds = {}
+        self.bytes = {}
+        self.cached = False
+        self.disposition = None
+        self.records = 0
+        self._source = None
+
+    def open(self):
+        """Open the workbook for reading with byte counting."""
+        if isinstance(self._path, ArchiveMember):
+            self._source = CountingBuffer(self._path.read_bytes())
+        else:
+            self._source = CountingFile(self.file)
+        return self._source
+
+    def close(self):
+        if self._source is not None:
+            self._source.close()
+            self._source = None
+
+    @contextmanager
+    def stage(self, name):
+        source = self._source
+        before = source.bytes_read if source is not None else 0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start,
+                     source.bytes_read - before if source is not None else 0)
+
+    def add(self, name, seconds, bytes_read=0):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        self.bytes[name] = self.bytes.get(name, 0) + bytes_read
+
+    @property
+    def total_seconds(self):
+        return sum(self.seconds.values())
+
+    def to_dict(self):
+        return {
+            'file': self.file,
+            'cached': self.cached,
+            'disposition': self.disposition,
+            'records': self.records,
+            'seconds': round(self.total_seconds, 6),
+            'stages': {
+                name: {'seconds': round(self.seconds[name], 6), 'bytes': self.bytes[name]}
+                for name in STAGES if name in self.seconds
+            },
+        }
+
+
+def write_profiles(path, profiles):
+    """Write one JSON object per profiled workbook."""
+    with open(path, 'w') as f:
+        for profile in profiles:
+            f.write(json.dumps(profile.to_dict()) + '\n')
+
+
+def stage_stats(profiles):
+    """
+    Return [(stage, files, p50, p95, max)] in seconds for each stage that
+    any profiled workbook went through.
+    """
+    import numpy as np
+
+    stats = []
+    for name in STAGES:
+        times = [p.seconds[name] for p in profiles if name in p.seconds]
+        if times:
+            p50, p95 = np.percentile(times, [50, 95])
+            stats.append((name, len(times), p50, p95, max(times)))
+    return stats
+
+
+def slowest(profiles, n=10):
+    """The n profiles with the most total time, slowest first."""
+    return sorted(profiles, key=lambda p: p.total_seconds, reverse=True)[:n]
@@ -0,0 +1,107 @@
+from array import array
+from itertools import repeat
+
+
+class GradeBatch:
+    """
+    The (student_id, grade) records extracted from one workbook, stored
+    compactly: the workbook's filename (stem) once, student IDs as
+    unsigned ints in an array, and grades as one ASCII byte each.
+
+    IDs are the zero-padded five-digit strings the detector produces. An
+    ID that is anything else (the ID check also lets through, e.g.,
+    non-ASCII digits) is kept as its string in odd_ids, by position, so a
+    batch always gives back exactly the strings that went in.
+
+    Iterating a batch yields (student_id, grade) tuples of strings, so it
+    can stand in for a list of records; rows() yields the CSV rows.
+    """
+
+    __slots__ = ('filename', 'ids', 'grades', 'odd_ids')
+
+    def __init__(self, filename=''):
+        self.filename = filename
+        self.ids = array('I')
+        self.grades = b''
+        # position -> ID string, for IDs that aren't five ASCII digits
+        self.odd_ids = None
+
+    @classmethod
+    def from_columns(cls, filename, student_ids, grades):
+        """Build a batch from parallel sequences of student ID and grade strings."""
+        batch = cls(filename)
+        batch._append(list(student_ids), ''.join(grades).encode('ascii'))
+        return batch
+
+    @classmethod
+    def from_records(cls, filename, records):
+        """Build a batch from (student_id, grade) pairs."""
+        records = list(records)
+        return cls.from_columns(filename, [str(record[0]) for record in records],
+                                [str(record[1]) for record in records])
+
+    def _append(self, student_ids, grades):
+        if len(grades) != len(student_ids):
+            raise ValueError(f"{len(student_ids)} student IDs but {len(grades)} grade letters")
+        offset = len(self.ids)
+        joined = ''.join(student_ids)
+        if (joined.isascii() and joined.isdigit()
+                and all(len(student_id) == 5 for student_id in student_ids)):
+            self.ids.extend(map(int, student_ids))
+        else:
+            for i, student_id in enumerate(student_ids):
+                if len(student_id) == 5 and student_id.isascii() and student_id.isdigit():
+                    self.ids.append(int(student_id))
+                else:
+                    self.ids.append(0)
+                    if self.odd_ids is None:
+                        self.odd_ids = {}
+                    self.odd_ids[offset + i] = student_id
+        self.grades += grades
+
+    def extend(self, records):
+        """Append another batch's records (or (student_id, grade) pairs)."""
+        if not isinstance(records, GradeBatch):
+            records = GradeBatch.from_records(self.filename, records)
+        self._append(records.student_ids(), records.grades)
+
+    def student_ids(self):
+        """The student IDs as strings, in order."""
+        student_ids = ['%05d' % student_id for student_id in self.ids]
+        if self.odd_ids:
+            for i, student_id in self.odd_ids.items():
+                student_ids[i] = student_id
+        return student_ids
+
+    def rows(self):
+        """(filename, student_id, grade) rows, as written to the CSV files."""
+        return zip(repeat(self.filename), self.student_ids(), self.grades.decode('ascii'))
+
+    def __len__(self):
+        return len(self.grades)
+
+    def __iter__(self):
+        return zip(self.student_ids(), self.grades.decode('ascii'))
+
+    def __eq__(self, other):
+        if not isinstance(other, GradeBatch):
+            return NotImplemented
+        return (self.filename == other.filename and self.grades == other.grades
+                and self.student_ids() == other.student_ids())
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # IDs as raw bytes: much smaller pickles than the array itself
+        return _rebuild_batch, (self.filename, self.ids.tobytes(), self.grades, self.odd_ids)
+
+    def __repr__(self):
+        return f'GradeBatch({self.filename!r}, {len(self)} records)'
+
+
+def _rebuild_batch(filename, id_bytes, grades, odd_ids):
+    batch = GradeBatch(filename)
+    batch.ids.frombytes(id_bytes)
+    batch.grades = grades
+    batch.odd_ids = odd_ids
+    return batch
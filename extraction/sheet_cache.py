@@ -0,0 +1,246 @@
+import os
+import json
+import hashlib
+import logging
+import struct
+import zlib
+import tempfile
+from pathlib import Path
+from datetime import datetime, time, timedelta
+
+from extraction.lazy import LazyModule
+
+np = LazyModule('numpy')
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+# Default size the cache is trimmed back to after a run
+DEFAULT_CACHE_MB = 512
+
+# How each cell value is stored: ints, bools and timedeltas (in
+# microseconds) in the int column, floats in the float column, and text,
+# datetimes and times (ISO format) and anything else (its str()) in the
+# text column
+_INT, _FLOAT, _TEXT, _BOOL, _DATETIME, _OTHER, _TIME, _TIMEDELTA = range(8)
+
+# First bytes of a cached sheet file
+_MAGIC = b'IFLSHEET1'
+
+
+def encode_cells(rows, cols, values, declared):
+    """
+    Pack a sheet's non-empty cells, and its declared (rows, columns) or
+    None, into bytes: a JSON header with the array lengths, then the row,
+    column and kind arrays and one array per kind of value, deflated.
+    Returns None if a value can't be stored (an int too large for int64).
+    """
+    kind_of = {int: _INT, float: _FLOAT, str: _TEXT, bool: _BOOL, time: _TIME, timedelta: _TIMEDELTA,
+               np.int64: _INT, np.float64: _FLOAT, np.bool_: _BOOL}
+    kinds = [kind_of.get(type(value)) for value in values]
+    for i, kind in enumerate(kinds):
+        if kind is None:
+            value = values[i]
+            if isinstance(value, (bool, np.bool_)):
+                kinds[i] = _BOOL
+            elif isinstance(value, (int, np.integer)):
+                kinds[i] = _INT
+            elif isinstance(value, (float, np.floating)):
+                kinds[i] = _FLOAT
+            elif isinstance(value, datetime):
+                kinds[i] = _DATETIME
+            else:
+                kinds[i] = _OTHER
+    kinds = np.array(kinds, dtype=np.uint8)
+    cells = np.empty(len(values), dtype=object)
+    cells[:] = values
+
+    # Timedeltas share the int column, dates and times the text column
+    for kind, convert in ((_TIMEDELTA, lambda value: value // timedelta(microseconds=1)),
+                          (_DATETIME, datetime.isoformat), (_TIME, time.isoformat), (_OTHER, str)):
+        selected = kinds == kind
+        if selected.any():
+            cells[selected] = [convert(value) for value in cells[selected]]
+
+    try:
+        ints = cells[np.isin(kinds, (_INT, _BOOL, _TIMEDELTA))].astype(np.int64)
+    except OverflowError:
+        return None
+    floats = cells[kinds == _FLOAT].astype(np.float64)
+    texts = [text.encode('utf-8', 'surrogatepass')
+             for text in cells[np.isin(kinds, (_TEXT, _DATETIME, _OTHER, _TIME))].tolist()]
+
+    header = json.dumps({'cells': len(values), 'ints': len(ints), 'floats': len(floats),
+                         'texts': len(texts), 'declared': declared}).encode('utf-8')
+    body = b''.join([
+        np.asarray(rows, dtype=np.int32).tobytes(),
+        np.asarray(cols, dtype=np.int32).tobytes(),
+        kinds.tobytes(),
+        ints.tobytes(),
+        floats.tobytes(),
+        np.cumsum([len(text) for text in texts], dtype=np.int64).tobytes(),
+        b''.join(texts),
+    ])
+    return _MAGIC + struct.pack('<I', len(header)) + header + zlib.compress(body, 1)
+
+
+def decode_cells(data):
+    """Inverse of encode_cells: (rows, cols, values, declared) with plain Python values."""
+    if not data.startswith(_MAGIC):
+        raise ValueError("not a sheet cache file")
+    offset = len(_MAGIC) + 4
+    (header_size,) = struct.unpack_from('<I', data, len(_MAGIC))
+    header = json.loads(data[offset:offset + header_size])
+    body = zlib.decompress(data[offset + header_size:])
+
+    n = header['cells']
+    arrays = {}
+    position = 0
+    for name, dtype, count in (('rows', np.int32, n), ('cols', np.int32, n), ('kinds', np.uint8, n),
+                               ('ints', np.int64, header['ints']),
+                               ('floats', np.float64, header['floats']),
+                               ('text_ends', np.int64, header['texts'])):
+        arrays[name] = np.frombuffer(body, dtype=dtype, count=count, offset=position)
+        position += count * np.dtype(dtype).itemsize
+    text = body[position:]
+
+    starts = [0] + arrays['text_ends'].tolist()
+    texts = [text[start:end].decode('utf-8', 'surrogatepass') for start, end in zip(starts, starts[1:])]
+
+    # Place each kind's values at its cells' positions
+    kinds = arrays['kinds']
+    values = np.empty(n, dtype=object)
+    values[np.isin(kinds, (_INT, _BOOL, _TIMEDELTA))] = arrays['ints'].tolist()
+    values[kinds == _FLOAT] = arrays['floats'].tolist()
+    values[np.isin(kinds, (_TEXT, _DATETIME, _OTHER, _TIME))] = texts
+    for kind, convert in ((_BOOL, bool), (_TIMEDELTA, lambda us: timedelta(microseconds=us)),
+                          (_DATETIME, datetime.fromisoformat), (_TIME, time.fromisoformat)):
+        cells = kinds == kind
+        if cells.any():
+            values[cells] = [convert(value) for value in values[cells]]
+
+    declared = tuple(header['declared']) if header['declared'] else None
+    return arrays['rows'].tolist(), arrays['cols'].tolist(), values.tolist(), declared
+
+
+class SheetCache:
+    """
+    Parsed sheets kept on disk, so column detection can be re-run without
+    decoding the xlsx again.
+
+    Entries are keyed by the workbook's content hash. Each workbook has a
+    layout file (its sheet names and declared widths) and one file per
+    sheet read, holding the sheet's non-empty cells (within a given
+    max_rows x max_cols crop) in the columnar format of encode_cells.
+    Files are written atomically, so several worker processes can share
+    a cache directory.
+
+    Reading an entry marks it as used; evict() trims the cache back to
+    max_bytes by deleting the least recently used files.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_MB * 1024 * 1024):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def _entry_dir(self, digest):
+        return self.directory / f'v{CACHE_VERSION}' / digest[:2] / digest
+
+    def _sheet_path(self, digest, sheet_name, max_rows, max_cols):
+        key = json.dumps([sheet_name, max_rows or 0, max_cols or 0])
+        return self._entry_dir(digest) / (hashlib.sha1(key.encode('utf-8')).hexdigest() + '.cells')
+
+    @staticmethod
+    def _touch(path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _write(self, path, write):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def get_layout(self, digest):
+        """Return (sheet_names, widths) of a cached workbook, or None."""
+        path = self._entry_dir(digest) / 'layout.json'
+        try:
+            with open(path, 'r') as f:
+                layout = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._touch(path)
+        return layout['sheets'], layout['widths']
+
+    def put_layout(self, digest, sheet_names, widths):
+        data = json.dumps({'sheets': list(sheet_names), 'widths': list(widths)}).encode('utf-8')
+        try:
+            self._write(self._entry_dir(digest) / 'layout.json', lambda f: f.write(data))
+        except OSError as e:
+            logger.warning(f"Could not write sheet cache entry for {digest}: {e}")
+
+    def get(self, digest, sheet_name, max_rows, max_cols):
+        """
+        Return the cached (rows, cols, values, declared) of a sheet read with
+        the same crop, or None.
+        """
+        path = self._sheet_path(digest, sheet_name, max_rows, max_cols)
+        try:
+            with open(path, 'rb') as f:
+                cells = decode_cells(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable sheet cache file {path}: {e}")
+            return None
+        self._touch(path)
+        return cells
+
+    def put(self, digest, sheet_name, max_rows, max_cols, rows, cols, values, declared):
+        """Store a sheet's cells. Sheets whose values can't be stored are skipped."""
+        data = encode_cells(rows, cols, values, declared)
+        if data is None:
+            return
+        try:
+            self._write(self._sheet_path(digest, sheet_name, max_rows, max_cols), lambda f: f.write(data))
+        except OSError as e:
+            logger.warning(f"Could not write sheet cache entry for {digest}: {e}")
+
+    def evict(self):
+        """
+        Delete the least recently used files until the cache is no larger
+        than max_bytes. Returns (files removed, bytes left).
+        """
+        files = []
+        for path in self.directory.rglob('*'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if path.is_file():
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+            try:
+                path.parent.rmdir()  # only once the workbook's last file is gone
+            except OSError:
+                pass
+        return removed, total
@@ -0,0 +1,163 @@
+import os
+import csv
+import logging
+from pathlib import Path
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+FIELDNAMES = ['filename', 'student_id', 'grade']
+
+# Open output files kept at once; well under typical fd limits
+DEFAULT_MAX_OPEN = 64
+
+
+class CsvSink:
+    """
+    Streams extracted grades into one CSV per key as each workbook finishes.
+
+    Records for a key are appended to a temporary .part file next to its
+    final path. At most max_open files are open at a time; the least
+    recently used one is closed when another is needed and reopened in
+    append mode later. finalize() closes everything and renames each .part
+    file over its final path, so a finished CSV never appears half-written.
+    """
+
+    def __init__(self, path_for_key, max_open=DEFAULT_MAX_OPEN):
+        """path_for_key maps a key to the final Path of its CSV file."""
+        self.path_for_key = path_for_key
+        self.max_open = max(1, max_open)
+        self.counts = {}
+        self._paths = {}
+        self._handles = OrderedDict()
+
+    @staticmethod
+    def _part_path(path):
+        return path.with_name(path.name + '.part')
+
+    def _file_path(self, path):
+        """The file records for final path are written to."""
+        return self._part_path(path)
+
+    def _start(self, path):
+        """Open a fresh file with a header for the first records of a key."""
+        f = open(self._file_path(path), 'w', newline='')
+        writer = csv.writer(f)
+        writer.writerow(FIELDNAMES)
+        return f, writer
+
+    def _writer(self, key):
+        """Return a csv writer for key, opening (or reopening) its file."""
+        if key in self._handles:
+            self._handles.move_to_end(key)
+            return self._handles[key][1]
+
+        while len(self._handles) >= self.max_open:
+            _, (f, _) = self._handles.popitem(last=False)
+            f.close()
+
+        if key not in self._paths:
+            # First records for this key
+            path = Path(self.path_for_key(key))
+            self._paths[key] = path
+            self.counts[key] = 0
+            f, writer = self._start(path)
+        else:
+            f = open(self._file_path(self._paths[key]), 'a', newline='')
+            writer = csv.writer(f)
+
+        self._handles[key] = (f, writer)
+        return writer
+
+    def write(self, key, batch):
+        """Append the records of one source file (a GradeBatch) under key."""
+        writer = self._writer(key)
+        writer.writerows(batch.rows())
+        self.counts[key] += len(batch)
+
+    def close(self):
+        """Close all open files without publishing them."""
+        while self._handles:
+            _, (f, _) = self._handles.popitem()
+            f.close()
+
+    def finalize(self):
+        """
+        Close all files and move them into place.
+        Returns [(key, record_count, path)] sorted by key.
+        """
+        self.close()
+
+        written = []
+        for key in sorted(self._paths):
+            path = self._paths[key]
+            os.replace(self._part_path(path), path)
+            written.append((key, self.counts[key], path))
+        return written
+
+
+class LiveCsvSink(CsvSink):
+    """
+    A CsvSink that appends straight to the final CSV files, for long-running
+    processes that add records a workbook at a time.
+
+    Existing files are appended to (a header is written only to new ones),
+    and the same LRU pool of open handles is kept between writes. flush()
+    makes everything written so far visible to readers.
+    """
+
+    def _file_path(self, path):
+        return path
+
+    def _start(self, path):
+        new_file = not path.exists() or path.stat().st_size == 0
+        f = open(path, 'a', newline='')
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(FIELDNAMES)
+        return f, writer
+
+    def flush(self):
+        for f, _ in self._handles.values():
+            f.flush()
+
+    def remove(self, key, batch):
+        """
+        Remove the previously written records of one source file (a
+        GradeBatch) from key's CSV, e.g. before writing a changed file's new
+        ones. Each record removes one matching row. Returns the number removed.
+        """
+        path = Path(self.path_for_key(key))
+        if key in self._handles:
+            self._handles.pop(key)[0].close()
+        if not path.exists():
+            return 0
+
+        remaining = {}
+        for row in batch.rows():
+            remaining[row] = remaining.get(row, 0) + 1
+
+        kept = []
+        removed = 0
+        with open(path, 'r', newline='') as f:
+            for row in csv.reader(f):
+                row_key = tuple(row)
+                if remaining.get(row_key):
+                    remaining[row_key] -= 1
+                    removed += 1
+                else:
+                    kept.append(row)
+
+        if removed:
+            tmp_path = path.with_name(path.name + '.tmp')
+            with open(tmp_path, 'w', newline='') as f:
+                csv.writer(f).writerows(kept)
+            os.replace(tmp_path, path)
+            if key in self.counts:
+                self.counts[key] = max(0, self.counts[key] - removed)
+        return removed
+
+    def finalize(self):
+        """Close all files. Returns [(key, record_count, path)] sorted by key."""
+        self.close()
+        return [(key, self.counts[key], self._paths[key]) for key in sorted(self._paths)]
@@ -0,0 +1,116 @@
+import os
+import json
+import hashlib
+import tempfile
+import logging
+from pathlib import Path
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_NAME = 'sheet_templates.json'
+TEMPLATES_VERSION = 1
+
+# Where a workbook layout keeps its grades: the sheet's position in the
+# workbook and the grade and ID column positions on it
+SheetTemplate = namedtuple('SheetTemplate', ['sheet', 'grade_col', 'id_col'])
+
+
+def workbook_fingerprint(sheet_names, widths):
+    """
+    Fingerprint of a workbook layout from its sheet names and the column
+    count each sheet declares (None if it declares none).
+
+    Row counts are left out: they change with the size of the class, while
+    the tabs and their widths are what a template fixes.
+    """
+    layout = json.dumps([[name, width] for name, width in zip(sheet_names, widths)])
+    return hashlib.sha1(layout.encode('utf-8')).hexdigest()
+
+
+class SheetTemplateIndex:
+    """
+    On-disk map from workbook fingerprint to the SheetTemplate its grades
+    were last found with, so process_xlsx_file can read that sheet first.
+
+    Workbooks record what they found with note(); the index only changes
+    when those notes are passed to merge(). In a worker process, take_notes()
+    collects them to send back to the parent, which merges them into its
+    index and counts how often a template was used (hit), disproved
+    (stale) or unknown (miss).
+    """
+
+    def __init__(self, path, rebuild=False):
+        self.path = Path(path)
+        self.entries = {}
+        self.stats = {'hit': 0, 'stale': 0, 'miss': 0}
+        self._notes = []
+
+        if rebuild or not self.path.exists():
+            return
+
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == TEMPLATES_VERSION:
+                self.entries = {fingerprint: SheetTemplate(*template)
+                                for fingerprint, template in data.get('templates', {}).items()}
+            else:
+                logger.warning(f"Ignoring sheet templates {self.path} with unknown version")
+        except Exception as e:
+            logger.warning(f"Could not read sheet templates {self.path}: {e}")
+
+    def __getstate__(self):
+        # Workers get the entries; their notes and stats start empty
+        return {'path': self.path, 'entries': self.entries}
+
+    def __setstate__(self, state):
+        self.path = state['path']
+        self.entries = state['entries']
+        self.stats = {'hit': 0, 'stale': 0, 'miss': 0}
+        self._notes = []
+
+    def lookup(self, fingerprint):
+        """Return the SheetTemplate remembered for fingerprint, or None."""
+        return self.entries.get(fingerprint)
+
+    def note(self, fingerprint, template, status):
+        """
+        Note the outcome of reading a workbook: the SheetTemplate its grades
+        were found with (None if none were) and the status of the lookup.
+        The entry is updated at once so later workbooks in this process see
+        it; stats wait for merge().
+        """
+        self._apply(fingerprint, template)
+        self._notes.append((fingerprint, template, status))
+
+    def take_notes(self):
+        """Return the notes made since the last call, and forget them."""
+        notes, self._notes = self._notes, []
+        return notes
+
+    def merge(self, notes):
+        """Apply notes taken from a worker (or from this index) and count them."""
+        for fingerprint, template, status in notes:
+            self._apply(fingerprint, template)
+            self.stats[status] += 1
+
+    def _apply(self, fingerprint, template):
+        if template is None:
+            self.entries.pop(fingerprint, None)
+        else:
+            self.entries[fingerprint] = SheetTemplate(*template)
+
+    def save(self):
+        """Write the index atomically (temp file, then rename)."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'version': TEMPLATES_VERSION,
+                           'templates': {fingerprint: list(template)
+                                         for fingerprint, template in self.entries.items()}}, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,219 @@
+import os
+import sys
+import time
+import signal
+import resource
+import threading
+from collections import deque, namedtuple
+
+# What a worker reports instead of a result when its task had to be stopped.
+# disposition is parse_timeout, parse_oom or parse_error.
+ParseFailure = namedtuple('ParseFailure', ['disposition', 'message'])
+
+# Exit status of a worker that went over its memory cap
+_OOM_EXIT = 86
+
+# How often a worker samples its own peak RSS
+_RSS_CHECK_SECONDS = 0.05
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KB elsewhere
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def _watch_memory(max_rss_mb):
+    while True:
+        if _peak_rss_mb() > max_rss_mb:
+            os._exit(_OOM_EXIT)
+        time.sleep(_RSS_CHECK_SECONDS)
+
+
+def _worker_main(conn, func, max_rss_mb):
+    """Run func on items received over conn until told to stop."""
+    # The parent handles Ctrl-C and shuts workers down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if max_rss_mb:
+        threading.Thread(target=_watch_memory, args=(max_rss_mb,), daemon=True).start()
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+
+        task_id, item = task
+        try:
+            conn.send((task_id, True, func(item)))
+        except Exception as e:
+            conn.send((task_id, False, e))
+
+
+class _Worker:
+    def __init__(self, context, func, max_rss_mb):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, func, max_rss_mb),
+                                       daemon=True)
+        self.process.start()
+        child_conn.close()
+        # (task_id, item) being worked on, and when it was sent
+        self.task = None
+        self.started = None
+
+    def send(self, task_id, item):
+        self.conn.send((task_id, item))
+        self.task = (task_id, item)
+        self.started = time.monotonic()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class WorkerPool:
+    """
+    A fixed set of worker processes that run func on one item at a time,
+    each under a wall-clock timeout and a peak-RSS ceiling.
+
+    A worker that runs past timeout seconds is killed; one whose peak RSS
+    goes over max_rss_mb exits itself (it samples its own usage on a
+    thread). Either way the item's result is a ParseFailure, the worker is
+    replaced, and the other workers carry on. None or 0 disables a limit.
+
+    Unlike a ProcessPoolExecutor, losing a worker never breaks the pool,
+    so one pathological input can't stop the batch. func must be
+    picklable; it is sent to each worker once, at start-up.
+    """
+
+    def __init__(self, func, workers=1, timeout=None, max_rss_mb=None):
+        import multiprocessing
+
+        self.func = func
+        self.timeout = timeout or None
+        self.max_rss_mb = max_rss_mb or None
+        self._context = multiprocessing.get_context()
+        self._workers = [self._spawn() for _ in range(max(1, workers))]
+        # Task ids run on across map() calls, so a late reply to a map that
+        # was abandoned can't be taken for a reply to the current one
+        self._next_id = 0
+
+    def _spawn(self):
+        return _Worker(self._context, self.func, self.max_rss_mb)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+
+    def map(self, pairs, window=None):
+        """
+        For each (item, result) of pairs, yield (item, result, computed) in
+        input order, running func(item) in the workers for items whose
+        result is None. Up to window items (default 4 per worker) are in
+        flight at once. An exception raised by func is re-raised here.
+        """
+        window = window or len(self._workers) * 4
+        pairs = iter(pairs)
+        exhausted = False
+        order = deque()    # (task_id, item, given result) in input order
+        waiting = deque()  # (task_id, item) not yet sent to a worker
+        done = {}          # task_id -> (ok, result or exception)
+
+        while True:
+            while not exhausted and len(order) < window:
+                try:
+                    item, result = next(pairs)
+                except StopIteration:
+                    exhausted = True
+                    break
+                task_id = self._next_id
+                self._next_id += 1
+                order.append((task_id, item, result))
+                if result is None:
+                    waiting.append((task_id, item))
+
+            while order and (order[0][2] is not None or order[0][0] in done):
+                task_id, item, result = order.popleft()
+                if result is not None:
+                    yield item, result, False
+                    continue
+                ok, value = done.pop(task_id)
+                if not ok:
+                    raise value
+                yield item, value, True
+
+            if not order:
+                if exhausted:
+                    return
+                continue
+
+            for worker in self._workers:
+                if worker.task is None and waiting:
+                    worker.send(*waiting.popleft())
+            self._collect(done)
+
+    def _collect(self, done):
+        """Wait for a worker to finish, die or time out, and record the outcome in done."""
+        from multiprocessing.connection import wait
+
+        busy = [worker for worker in self._workers if worker.task is not None]
+        if not busy:
+            return
+
+        timeout = None
+        if self.timeout:
+            deadline = min(worker.started for worker in busy) + self.timeout
+            timeout = max(0.0, deadline - time.monotonic())
+        wait([worker.conn for worker in busy] + [worker.process.sentinel for worker in busy], timeout)
+
+        now = time.monotonic()
+        for worker in busy:
+            task_id = worker.task[0]
+            failure = None
+
+            if worker.conn.poll():
+                try:
+                    reply_id, ok, value = worker.conn.recv()
+                except Exception:
+                    pass  # cut off mid-reply; handled as a dead worker below
+                else:
+                    done[reply_id] = (ok, value)
+                    worker.task = None
+                    continue
+
+            if not worker.process.is_alive():
+                worker.process.join()
+                code = worker.process.exitcode
+                if code == _OOM_EXIT or code == -signal.SIGKILL:
+                    failure = ParseFailure('parse_oom', f"worker went over {self.max_rss_mb} MB RSS")
+                else:
+                    failure = ParseFailure('parse_error', f"worker exited with status {code}")
+                worker.conn.close()
+            elif self.timeout and now - worker.started >= self.timeout:
+                worker.kill()
+                failure = ParseFailure('parse_timeout', f"still parsing after {self.timeout:g}s")
+
+            if failure is not None:
+                done[task_id] = (True, failure)
+                self._workers[self._workers.index(worker)] = self._spawn()
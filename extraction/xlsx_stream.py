@@ -0,0 +1,369 @@
+import re
+import zipfile
+import posixpath
+from xml.etree.ElementTree import iterparse
+
+from extraction.lazy import LazyModule
+
+# openpyxl's number-format and date helpers, imported when a workbook is read
+xl_numbers = LazyModule('openpyxl.styles.numbers')
+xl_datetime = LazyModule('openpyxl.utils.datetime')
+
+REL_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+# Strings pandas.read_excel reads as missing values by default
+NA_STRINGS = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+    '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+}
+
+# Text that pandas converts to a number when a whole column is numeric
+NUMERIC_STRING = re.compile(
+    r'\s*[+-]?(?:[0-9]+\.?[0-9]*(?:[eE][+-]?[0-9]+)?|\.[0-9]+(?:[eE][+-]?[0-9]+)?|inf(?:inity)?)\s*',
+    re.IGNORECASE,
+)
+
+CELL_REF = re.compile(r'([A-Z]+)(\d+)')
+
+# A sheet's <dimension> element, with or without a namespace prefix, and
+# how far into the sheet XML to look for it
+DIMENSION_TAG = re.compile(rb'<(?:\w+:)?dimension\s[^>]*?ref="([^"]*)"')
+DIMENSION_SEARCH_BYTES = 64 * 1024
+
+RANGE_REF = re.compile(r'\$?([A-Z]+)\$?(\d+)(?::\$?([A-Z]+)\$?(\d+))?')
+
+
+def _local(tag):
+    """Tag name without its XML namespace."""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _column_index(letters):
+    """0-based column index for column letters (A -> 0, AA -> 26)."""
+    index = 0
+    for ch in letters:
+        index = index * 26 + ord(ch) - 64
+    return index - 1
+
+
+def parse_dimension(ref):
+    """
+    (rows, columns) spanned from A1 to the bottom-right corner of a range
+    reference such as 'A1:F40', or None if ref isn't one.
+    """
+    match = RANGE_REF.fullmatch(ref or '')
+    if match is None:
+        return None
+    last_col, last_row = match.group(3) or match.group(1), match.group(4) or match.group(2)
+    return int(last_row), _column_index(last_col) + 1
+
+
+def _text_content(element):
+    """Plain text of a shared or inline string: <t> plus rich-text runs, no phonetic runs."""
+    snippets = []
+    for child in element:
+        name = _local(child.tag)
+        if name == 't':
+            snippets.append(child.text or '')
+        elif name == 'r':
+            for run_child in child:
+                if _local(run_child.tag) == 't':
+                    snippets.append(run_child.text or '')
+    return ''.join(snippets)
+
+
+def _cast_number(text):
+    """Number from cell text, the way openpyxl casts it."""
+    if '.' in text or 'E' in text or 'e' in text:
+        return float(text)
+    return int(text)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _parse_numeric_string(text):
+    number = float(text)
+    return int(number) if number.is_integer() else number
+
+
+class XlsxStreamReader:
+    """
+    Reads cell values straight out of an xlsx zip without building a
+    workbook object or a DataFrame.
+
+    Sheets are streamed one at a time with an incremental XML parser, and
+    only non-empty cells are kept. Values are converted the way
+    pd.read_excel(..., header=None) with openpyxl would read them: numbers
+    with integral values become ints, date-formatted numbers become
+    datetimes, errors and pandas' default NA strings are missing, and
+    text-only-numeric columns are converted to numbers.
+    """
+
+    def __init__(self, filepath):
+        self._zip = zipfile.ZipFile(filepath)
+        try:
+            self._members = set(self._zip.namelist())
+            self._read_workbook()
+        except BaseException:
+            self._zip.close()
+            raise
+        self._shared_strings = None
+        self._date_styles = None
+        # Sheet name -> (rows, columns) from its <dimension>, once read
+        self.dimensions = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._zip.close()
+
+    @property
+    def sheet_names(self):
+        return [name for name, _ in self._sheets]
+
+    def _read_rels(self, part):
+        """Map relationship Id -> (type, absolute member path) for a part."""
+        folder, name = posixpath.split(part)
+        rels_path = posixpath.join(folder, '_rels', name + '.rels')
+        rels = {}
+        if rels_path not in self._members:
+            return rels
+
+        with self._zip.open(rels_path) as f:
+            for _, element in iterparse(f):
+                if _local(element.tag) != 'Relationship':
+                    continue
+                target = element.get('Target', '')
+                if target.startswith('/'):
+                    target = target.lstrip('/')
+                else:
+                    target = posixpath.normpath(posixpath.join(folder, target))
+                rel_type = element.get('Type', '').rsplit('/', 1)[-1]
+                rels[element.get('Id')] = (rel_type, target)
+        return rels
+
+    def _read_workbook(self):
+        # Locate the workbook part from the package relationships
+        workbook_part = 'xl/workbook.xml'
+        for rel_type, target in self._read_rels('').values():
+            if rel_type == 'officeDocument':
+                workbook_part = target
+
+        self._rels = self._read_rels(workbook_part)
+        self._epoch = xl_datetime.CALENDAR_WINDOWS_1900
+        self._sheets = []
+
+        with self._zip.open(workbook_part) as f:
+            for _, element in iterparse(f):
+                name = _local(element.tag)
+                if name == 'workbookPr':
+                    if element.get('date1904', '').lower() in ('1', 'true'):
+                        self._epoch = xl_datetime.CALENDAR_MAC_1904
+                elif name == 'sheet':
+                    rel_type, target = self._rels.get(element.get(REL_ID), (None, None))
+                    # Chart sheets have no cells; openpyxl (and so pandas) skips them
+                    if rel_type == 'chartsheet' or target not in self._members:
+                        continue
+                    self._sheets.append((element.get('name'), target))
+
+    def _part(self, rel_type, default):
+        for found_type, target in self._rels.values():
+            if found_type == rel_type and target in self._members:
+                return target
+        return default if default in self._members else None
+
+    def _load_shared_strings(self):
+        strings = []
+        part = self._part('sharedStrings', 'xl/sharedStrings.xml')
+        if part is not None:
+            with self._zip.open(part) as f:
+                for _, element in iterparse(f):
+                    if _local(element.tag) == 'si':
+                        strings.append(_text_content(element).replace('x005F_', ''))
+                        element.clear()
+        self._shared_strings = strings
+
+    def _load_styles(self):
+        """Find which cell style indices are date or time formats."""
+        self._date_styles = set()
+        self._timedelta_styles = set()
+        part = self._part('styles', 'xl/styles.xml')
+        if part is None:
+            return
+
+        custom_formats = {}
+        style_formats = []
+        in_cell_xfs = False
+        with self._zip.open(part) as f:
+            for event, element in iterparse(f, events=('start', 'end')):
+                name = _local(element.tag)
+                if name == 'cellXfs':
+                    # Only <xf> inside <cellXfs> are cell styles (not cellStyleXfs)
+                    in_cell_xfs = event == 'start'
+                elif event == 'end' and name == 'numFmt':
+                    custom_formats[int(element.get('numFmtId'))] = element.get('formatCode')
+                elif event == 'end' and name == 'xf' and in_cell_xfs:
+                    style_formats.append(int(element.get('numFmtId', 0)))
+
+        for style_id, format_id in enumerate(style_formats):
+            fmt = custom_formats.get(format_id, xl_numbers.BUILTIN_FORMATS.get(format_id))
+            if fmt is None:
+                continue
+            if xl_numbers.is_date_format(fmt):
+                self._date_styles.add(style_id)
+            if xl_numbers.is_timedelta_format(fmt):
+                self._timedelta_styles.add(style_id)
+
+    def _convert(self, element, ns):
+        """Value of a <c> element as pandas would read it, or None if missing."""
+        data_type = element.get('t', 'n')
+
+        if data_type == 'inlineStr':
+            child = element.find(ns + 'is')
+            value = _text_content(child) if child is not None else None
+        else:
+            value = element.findtext(ns + 'v') or None
+            if value is None:
+                return None
+
+            if data_type == 'n':
+                value = _cast_number(value)
+                style_id = int(element.get('s') or 0)
+                if style_id in self._date_styles:
+                    try:
+                        return xl_datetime.from_excel(value, self._epoch,
+                                                      timedelta=style_id in self._timedelta_styles)
+                    except (OverflowError, ValueError):
+                        # openpyxl reads these as #VALUE! errors
+                        return None
+                # pandas turns integral numbers into ints
+                as_int = int(value)
+                return as_int if as_int == value else float(value)
+            elif data_type == 's':
+                value = self._shared_strings[int(value)]
+            elif data_type == 'b':
+                return bool(int(value))
+            elif data_type == 'd':
+                return xl_datetime.from_ISO8601(value)
+            elif data_type == 'e':
+                return None
+
+        if value is None or value in NA_STRINGS:
+            return None
+        return value
+
+    def read_dimension(self, sheet_name):
+        """
+        (rows, columns) a sheet declares as its used range, or None if it
+        declares none. Only the start of the sheet, up to its cells, is read.
+        """
+        if sheet_name not in self.dimensions:
+            dimension = None
+            head = b''
+            with self._zip.open(dict(self._sheets)[sheet_name]) as f:
+                # <dimension> comes before <sheetData>, near the top
+                while len(head) < DIMENSION_SEARCH_BYTES:
+                    chunk = f.read(4096)
+                    head += chunk
+                    match = DIMENSION_TAG.search(head)
+                    if match:
+                        dimension = parse_dimension(match.group(1).decode('ascii', 'replace'))
+                        break
+                    if not chunk or b'sheetData' in head:
+                        break
+            self.dimensions[sheet_name] = dimension
+        return self.dimensions[sheet_name]
+
+    def read_sheet(self, sheet_name, max_rows=None, max_cols=None):
+        """
+        Stream one sheet and return its non-empty cells as three parallel
+        lists (rows, cols, values), in row-major order with 0-based indices.
+
+        Empty cells are dropped as they are parsed, so formatting-only rows
+        and columns cost nothing beyond the parse. Cells past max_rows rows
+        or max_cols columns are ignored, and parsing stops at the first row
+        past max_rows. The sheet's declared dimension is left in
+        self.dimensions.
+        """
+        if self._shared_strings is None:
+            self._load_shared_strings()
+            self._load_styles()
+
+        member = dict(self._sheets)[sheet_name]
+        rows, cols, values = [], [], []
+        ns = ''
+        row_idx = -1
+        col_idx = -1
+
+        with self._zip.open(member) as f:
+            for event, element in iterparse(f, events=('start', 'end')):
+                if event == 'start':
+                    if not ns and element.tag.startswith('{'):
+                        ns = element.tag[:element.tag.index('}') + 1]
+                    if element.tag == ns + 'row':
+                        row_ref = element.get('r')
+                        row_idx = int(row_ref) - 1 if row_ref else row_idx + 1
+                        col_idx = -1
+                        if max_rows and row_idx >= max_rows:
+                            break
+                    elif element.tag == ns + 'dimension':
+                        self.dimensions[sheet_name] = parse_dimension(element.get('ref'))
+                    continue
+
+                if element.tag == ns + 'c':
+                    ref = element.get('r')
+                    if ref:
+                        match = CELL_REF.match(ref)
+                        col_idx = _column_index(match.group(1))
+                        row_idx = int(match.group(2)) - 1
+                    else:
+                        col_idx += 1
+
+                    if max_cols and col_idx >= max_cols:
+                        continue
+                    value = self._convert(element, ns)
+                    if value is not None:
+                        rows.append(row_idx)
+                        cols.append(col_idx)
+                        values.append(value)
+                elif element.tag == ns + 'row':
+                    # Cells are consumed; keep memory flat on long sheets
+                    element.clear()
+
+        self._infer_numeric_columns(cols, values)
+        return rows, cols, values
+
+    @staticmethod
+    def _infer_numeric_columns(cols, values):
+        """
+        Convert numeric-looking text in columns whose every value is a
+        number or numeric text, as pandas' type inference does.
+        """
+        by_column = {}
+        for i, col in enumerate(cols):
+            by_column.setdefault(col, []).append(i)
+
+        for indices in by_column.values():
+            # Booleans count as 0/1 here, as they do for pandas
+            if not any(isinstance(values[i], (str, bool)) for i in indices):
+                continue
+            if not all(_is_number(values[i]) or isinstance(values[i], bool)
+                       or (isinstance(values[i], str) and NUMERIC_STRING.fullmatch(values[i]))
+                       for i in indices):
+                continue
+
+            for i in indices:
+                if isinstance(values[i], str):
+                    values[i] = _parse_numeric_string(values[i])
+                elif isinstance(values[i], bool):
+                    values[i] = int(values[i])
+            # The column comes back as float64 if any value is fractional
+            if any(isinstance(values[i], float) for i in indices):
+                for i in indices:
+                    values[i] = float(values[i])
@@ -5,6 +5,7 @@ Generate all UPDATE statements from CSV files for manual execution.
 import csv
 import re
 from pathlib import Path
+from database.queries import get_queries
 
 def parse_filename_column(filename_value):
     """Parse filename to extract class and termid."""
@@ -35,6 +36,7 @@ def main():
     csv_files = sorted(extracted_dir.glob('grades_extract_*.csv'))
 
     output_file = 'update_statements_all_files.sql'
+    queries = get_queries()
 
     print(f"Processing {len(csv_files)} CSV files...")
 
@@ -77,24 +79,11 @@ def main():
                         student_id = row['student_id'].zfill(5)
                         grade = row['grade'].strip().upper()
 
-                        # Generate UPDATE statement with subquery validation
-                        update_sql = f"""-- Student: {student_id}, Grade: {grade}
-UPDATE AcademicCourseTakers
-SET Grade = '{grade}'
-WHERE ID = '{student_id}'
-  AND classid LIKE '{class_pattern}'
-  AND section NOT IN ('87', '147')
-  AND Attendance = 'Normal'
-  AND (
-    SELECT COUNT(*)
-    FROM AcademicCourseTakers AS t
-    WHERE t.ID = '{student_id}'
-      AND t.classid LIKE '{class_pattern}'
-      AND t.section NOT IN ('87', '147')
-      AND t.Attendance = 'Normal'
-  ) BETWEEN 2 AND 3;
-
-"""
+                        # Generate UPDATE statement with subquery validation, as the
+                        # named statement update_grades runs, so every student's
+                        # update shares one plan
+                        update_sql = (f"-- Student: {student_id}, Grade: {grade}\n"
+                                      f"{queries.render('update_class_grade', grade, student_id, class_pattern)};\n\n")
                         out.write(update_sql)
                         total_statements += 1
 
@@ -16,10 +16,10 @@ import argparse
 import shutil
 from pathlib import Path
 from datetime import datetime
-from database.connection import get_db_connection
+from database.connection import get_pool
+from database.queries import get_queries
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
@@ -36,7 +36,7 @@ def extract_termid_from_filename(filename):
     return None
 
 
-def process_csv_file(csv_path, real_mode=False, diagnostic=False):
+def process_csv_file(csv_path, real_mode=False, diagnostic=False, pool=None):
     """
     Process a single CSV file from failed/ folder.
     
@@ -48,11 +48,13 @@ def process_csv_file(csv_path, real_mode=False, diagnostic=False):
         csv_path: Path to the CSV file
         real_mode: If True, execute UPDATE. If False, dry run only.
         diagnostic: If True, provide detailed breakdown of why records don't match
+        pool: ConnectionPool to check a connection out of (default: the shared pool)
     
     Returns:
         dict with processing results
     """
     logger.info(f"Processing: {csv_path.name}")
+    pool = pool or get_pool()
     
     results = {
         'file': csv_path.name,
@@ -86,87 +88,89 @@ def process_csv_file(csv_path, real_mode=False, diagnostic=False):
             results['errors'].append("Empty CSV file")
             return results
         
-        # Connect to database
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        # Every record's statements take the term as a LIKE prefix
+        term_pattern = f"{termid}%"
+        queries = get_queries()
         
-        # Process each record
-        updated_count = 0
-        not_found_count = 0
+        # Check a connection out of the pool
+        with pool.connection() as conn:
+            cursor = conn.cursor()
         
-        for row in rows:
-            try:
-                # Parse CSV columns - based on the sample: "EHSS-02 final 28-06-21_2021T2T2E,11993,A"
-                # Columns are: filename, student_id, grade
-                filename_val = row.get('filename', '').strip()
-                student_id = row.get('student_id', '').strip().zfill(5)
-                grade = row.get('grade', '').strip().upper()
-                
-                if not student_id or not grade:
-                    results['errors'].append(f"Missing student_id or grade in row: {row}")
-                    logger.warning(f"  ⚠ Skipping row with missing data: {row}")
-                    continue
+            # Process each record
+            updated_count = 0
+            not_found_count = 0
+        
+            for row in rows:
+                try:
+                    # Parse CSV columns - based on the sample: "EHSS-02 final 28-06-21_2021T2T2E,11993,A"
+                    # Columns are: filename, student_id, grade
+                    filename_val = row.get('filename', '').strip()
+                    student_id = row.get('student_id', '').strip().zfill(5)
+                    grade = row.get('grade', '').strip().upper()
                 
-                # Build the exact UPDATE statement as specified
-                update_query = f"""
-                    UPDATE academiccoursetakers 
-                    SET grade = '{grade}'
-                    WHERE classid LIKE '{termid}%' 
-                      AND grade = 'IP' 
-                      AND ID = '{student_id}'
-                """
+                    if not student_id or not grade:
+                        results['errors'].append(f"Missing student_id or grade in row: {row}")
+                        logger.warning(f"  ⚠ Skipping row with missing data: {row}")
+                        continue
                 
-                if not real_mode:
-                    # Dry run: check if records would be found
+                    if not real_mode:
+                        # Dry run: check if records would be found
                     
-                    if diagnostic:
-                        # Detailed diagnostic: check each condition separately
-                        student_exists_query = f"SELECT COUNT(*) FROM academiccoursetakers WHERE ID = '{student_id}'"
-                        cursor.execute(student_exists_query)
-                        student_exists = cursor.fetchone()[0]
+                        if diagnostic:
+                            # Detailed diagnostic: check each condition separately
+                            queries.execute(cursor, 'count_student_records', student_id)
+                            student_exists = cursor.fetchone()[0]
                         
-                        term_match_query = f"SELECT COUNT(*) FROM academiccoursetakers WHERE ID = '{student_id}' AND classid LIKE '{termid}%'"
-                        cursor.execute(term_match_query)
-                        term_match = cursor.fetchone()[0]
+                            queries.execute(cursor, 'count_term_records', student_id, term_pattern)
+                            term_match = cursor.fetchone()[0]
                         
-                        ip_status_query = f"SELECT COUNT(*) FROM academiccoursetakers WHERE ID = '{student_id}' AND classid LIKE '{termid}%' AND grade = 'IP'"
-                        cursor.execute(ip_status_query)
-                        ip_status = cursor.fetchone()[0]
+                            queries.execute(cursor, 'count_ip_records', term_pattern, student_id)
+                            ip_status = cursor.fetchone()[0]
                         
-                        if student_exists == 0:
-                            reason = "Student ID not in database"
-                        elif term_match == 0:
-                            reason = "No records for this term"
-                        elif ip_status == 0:
-                            reason = "No IP grade (already updated or different status)"
+                            if student_exists == 0:
+                                reason = "Student ID not in database"
+                            elif term_match == 0:
+                                reason = "No records for this term"
+                            elif ip_status == 0:
+                                reason = "No IP grade (already updated or different status)"
+                            else:
+                                reason = "Unknown"
+                        
+                            not_found_count += 1
+                            results['not_found_records'].append({
+                                'student_id': student_id,
+                                'grade': grade,
+                                'termid': termid,
+                                'reason': reason,
+                                'student_exists': student_exists > 0,
+                                'has_term_records': term_match > 0,
+                                'has_ip_grade': ip_status > 0
+                            })
+                            logger.warning(f"    ⚠ NOT FOUND: {student_id} | exists: {student_exists > 0} | term: {term_match > 0} | IP: {ip_status > 0} ({reason})")
                         else:
-                            reason = "Unknown"
+                            # Simple check: all conditions together
+                            queries.execute(cursor, 'count_ip_records', term_pattern, student_id)
+                            result = cursor.fetchone()
+                            record_count = result[0] if result else 0
                         
-                        not_found_count += 1
-                        results['not_found_records'].append({
-                            'student_id': student_id,
-                            'grade': grade,
-                            'termid': termid,
-                            'reason': reason,
-                            'student_exists': student_exists > 0,
-                            'has_term_records': term_match > 0,
-                            'has_ip_grade': ip_status > 0
-                        })
-                        logger.warning(f"    ⚠ NOT FOUND: {student_id} | exists: {student_exists > 0} | term: {term_match > 0} | IP: {ip_status > 0} ({reason})")
+                            if record_count == 0:
+                                not_found_count += 1
+                                results['not_found_records'].append({
+                                    'student_id': student_id,
+                                    'grade': grade,
+                                    'termid': termid,
+                                    'reason': 'No records matching criteria'
+                                })
+                                logger.warning(f"    ⚠ NOT FOUND: student {student_id} for term {termid}")
+                            else:
+                                logger.info(f"    ✓ Would update: student {student_id} → {grade} ({record_count} records)")
+                                updated_count += 1
                     else:
-                        # Simple check: all conditions together
-                        check_query = f"""
-                            SELECT COUNT(*) as cnt
-                            FROM academiccoursetakers
-                            WHERE classid LIKE '{termid}%'
-                              AND grade = 'IP'
-                              AND ID = '{student_id}'
-                        """
-                        cursor.execute(check_query)
-                        result = cursor.fetchone()
-                        record_count = result[0] if result else 0
-                        
-                        if record_count == 0:
+                        # Real mode: execute UPDATE
+                        queries.execute(cursor, 'update_ip_grade', grade, term_pattern, student_id)
+                        rows_affected = cursor.fetchone()[0]
+                    
+                        if rows_affected == 0:
                             not_found_count += 1
                             results['not_found_records'].append({
                                 'student_id': student_id,
@@ -176,35 +180,16 @@ def process_csv_file(csv_path, real_mode=False, diagnostic=False):
                             })
                             logger.warning(f"    ⚠ NOT FOUND: student {student_id} for term {termid}")
                         else:
-                            logger.info(f"    ✓ Would update: student {student_id} → {grade} ({record_count} records)")
                             updated_count += 1
-                else:
-                    # Real mode: execute UPDATE
-                    cursor.execute(update_query)
-                    rows_affected = cursor.rowcount
-                    
-                    if rows_affected == 0:
-                        not_found_count += 1
-                        results['not_found_records'].append({
-                            'student_id': student_id,
-                            'grade': grade,
-                            'termid': termid,
-                            'reason': 'No records matching criteria'
-                        })
-                        logger.warning(f"    ⚠ NOT FOUND: student {student_id} for term {termid}")
-                    else:
-                        updated_count += 1
-                        results['updated_records'] += rows_affected
-                        logger.info(f"    ✓ Updated: student {student_id} → {grade} ({rows_affected} records)")
+                            results['updated_records'] += rows_affected
+                            logger.info(f"    ✓ Updated: student {student_id} → {grade} ({rows_affected} records)")
             
-            except Exception as e:
-                results['errors'].append(f"Error processing row {row}: {e}")
-                logger.error(f"    ✗ Error: {e}")
-        
-        if real_mode:
-            conn.commit()
+                except Exception as e:
+                    results['errors'].append(f"Error processing row {row}: {e}")
+                    logger.error(f"    ✗ Error: {e}")
         
-        conn.close()
+            if real_mode:
+                conn.commit()
         
         # Determine success based on results
         if len(results['not_found_records']) == 0 and len(results['errors']) == 0:
@@ -361,6 +346,8 @@ def generate_audit_report(all_results, real_mode, output_file=None):
 
 
 def main():
+    logging.basicConfig(level=logging.INFO)
+
     parser = argparse.ArgumentParser(
         description='Process failed grade CSV files and update database'
     )
@@ -429,10 +416,11 @@ def main():
     
     logger.info(f"Found {len(csv_files)} file(s) to process\n")
     
-    # Process each file
+    # Process each file, reusing pooled connections across files
+    pool = get_pool()
     all_results = []
     for csv_file in csv_files:
-        results = process_csv_file(csv_file, real_mode=real_mode, diagnostic=args.diagnostic)
+        results = process_csv_file(csv_file, real_mode=real_mode, diagnostic=args.diagnostic, pool=pool)
         all_results.append(results)
         
         # Move successful files to success/ (only in real mode)
@@ -441,6 +429,10 @@ def main():
         
         logger.info("")
     
+    logger.info(f"Connection pool: {pool.describe()}")
+    logger.info(f"Statements: {get_queries().describe()}")
+    pool.close()
+    
     # Generate audit report
     audit_file = args.audit_report if args.audit_report else None
     generate_audit_report(all_results, real_mode, output_file=audit_file)
@@ -0,0 +1,80 @@
+import shutil
+from pathlib import Path
+
+from extract_grades import process_directory_by_term
+from extraction.manifest import ExtractionManifest, MANIFEST_NAME
+from extraction.records import GradeBatch
+
+REPO = Path(__file__).resolve().parent.parent
+WORKBOOK = REPO / 'EHSS 8 final grades July 2022_2022T4E.xlsx'
+
+
+def test_parse_failures_are_not_served(tmp_path):
+    workbook = tmp_path / 'book.xlsx'
+    workbook.write_bytes(b'not really a workbook')
+    manifest = ExtractionManifest(tmp_path / MANIFEST_NAME)
+
+    manifest.record(workbook, GradeBatch('book'), 'parse_timeout')
+    assert manifest.lookup(workbook) is None
+    assert not manifest.is_recorded(workbook, workbook.stat())
+
+    manifest.record(workbook, GradeBatch('book'), 'no_grades')
+    assert manifest.lookup(workbook) is not None
+    assert manifest.is_recorded(workbook, workbook.stat())
+
+
+def test_timed_out_file_is_parsed_again(tmp_path):
+    input_dir = tmp_path / 'input'
+    input_dir.mkdir()
+    shutil.copy(WORKBOOK, input_dir)
+    output_dir = tmp_path / 'output'
+    run = dict(terms_file=REPO / 'terms.csv', move=False, use_templates=False)
+
+    assert process_directory_by_term(input_dir, output_dir, timeout=0.001, **run) == {}
+    entry, = ExtractionManifest(output_dir / MANIFEST_NAME).entries.values()
+    assert entry['disposition'] == 'parse_timeout'
+
+    summary = process_directory_by_term(input_dir, output_dir, timeout=0, **run)
+    assert summary and all(summary.values())
+    entry, = ExtractionManifest(output_dir / MANIFEST_NAME).entries.values()
+    assert entry['disposition'] == 'extracted'
+
+
+def test_entries_read_with_another_crop_are_not_served(tmp_path):
+    workbook = tmp_path / 'book.xlsx'
+    workbook.write_bytes(b'not really a workbook')
+    manifest = ExtractionManifest(tmp_path / MANIFEST_NAME, crop=(10, 5))
+    manifest.record(workbook, GradeBatch('book'), 'no_grades')
+    manifest.save()
+
+    for crop, served in [((10, 5), True), ((10, 0), False), ((None, None), False), ((0, 0), False)]:
+        manifest = ExtractionManifest(tmp_path / MANIFEST_NAME, crop=crop)
+        assert (manifest.lookup(workbook) is not None) is served
+        assert manifest.is_recorded(workbook, workbook.stat()) is served
+
+
+def test_cropped_records_are_not_reused_without_the_crop(tmp_path):
+    input_dir = tmp_path / 'input'
+    input_dir.mkdir()
+    shutil.copy(WORKBOOK, input_dir)
+    output_dir = tmp_path / 'output'
+    run = dict(terms_file=REPO / 'terms.csv', move=False, use_templates=False, timeout=0)
+
+    cropped, = process_directory_by_term(input_dir, output_dir, max_rows=12, **run).values()
+    full, = process_directory_by_term(input_dir, output_dir, **run).values()
+    assert cropped < full
+    assert process_directory_by_term(input_dir, output_dir, **run) == {('2022T4E', 'EHSS-8'): full}
+
+
+def test_records_are_kept_compact_and_saved_as_json(tmp_path):
+    workbook = tmp_path / 'book.xlsx'
+    workbook.write_bytes(b'not really a workbook')
+    records = [('12345', 'A'), ('00042', 'B'), ('١٢٣٤٥', 'C')]
+    manifest = ExtractionManifest(tmp_path / MANIFEST_NAME)
+    manifest.record(workbook, records, 'extracted')
+    assert isinstance(manifest.entries[manifest._key(workbook)]['records'], GradeBatch)
+    manifest.save()
+
+    manifest = ExtractionManifest(tmp_path / MANIFEST_NAME)
+    assert manifest.lookup(workbook) == GradeBatch.from_records('book', records)
+    assert manifest.previous(workbook) == (GradeBatch.from_records('book', records), 'extracted')
@@ -0,0 +1,20 @@
+from extract_grades import TermMatcher
+
+
+def test_match_many_prefers_longest_term():
+    matcher = TermMatcher(['2022T4E', '2022T4ET4E', '2023T2E'])
+    names = ['grades_2022T4ET4E.xlsx', 'EHSS 8 2022T4E.xlsx', 'no term.xlsx', '2023t2e.xlsx']
+    assert matcher.match_many(names) == ['2022T4ET4E', '2022T4E', None, '2023T2E']
+    assert matcher.match_many(names) == [matcher.match(name) for name in names]
+
+
+def test_match_many_names_that_grow_when_upper_cased():
+    # 'ß'.upper() == 'SS', so each name below is longer once upper-cased
+    matcher = TermMatcher(['2022T4E', '2023T2E'])
+    names = ['Straße ßß 2022T4E.xlsx', 'maß.xlsx', 'ßßßßßß_2023T2E', 'ß2022T4E']
+    assert matcher.match_many(names) == ['2022T4E', None, '2023T2E', '2022T4E']
+    assert matcher.match_many(names) == [matcher.match(name) for name in names]
+
+
+def test_match_many_without_terms():
+    assert TermMatcher([]).match_many(['2022T4E.xlsx', 'x']) == [None, None]
@@ -0,0 +1,127 @@
+import csv
+from collections import Counter
+
+from database.connection import ConnectionPool
+from update_grades import generate_audit_report, process_csv_file
+
+CLASS_FILE = 'EHSS-03 final_2021T2E'
+
+
+class FakeCursor:
+    """
+    Answers the statements update_grades sends, from records: student ID ->
+    number of AcademicCourseTakers rows for the class. rowcount stays -1,
+    as pymssql may leave it after EXEC sp_executesql.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+        self.rowcount = -1
+
+    def execute(self, sql, params=()):
+        records = self.connection.records
+        self.rows = []
+        if sql == "SELECT 1":
+            self.rows = [(1,)]
+        elif 'CREATE TABLE #staged_grades' in sql:
+            self.connection.staged = {}
+            self.connection.updated = []
+        elif 'INSERT INTO #staged_grades' in sql:
+            self.connection.staged.update(zip(params[::2], params[1::2]))
+        elif 'JOIN #staged_grades' in sql:
+            for student_id in self.connection.staged:
+                if 2 <= records.get(student_id, 0) <= 3:
+                    self.connection.updated += [student_id] * records[student_id]
+        elif 'FROM #updated_ids' in sql:
+            self.rows = list(Counter(self.connection.updated).items())
+        elif 'UPDATE AcademicCourseTakers' in sql:
+            count = records.get(params[1], 0)
+            if 2 <= count <= 3:
+                self.connection.updated += [params[1]] * count
+        elif 'SELECT ID, COUNT(*)' in sql:
+            self.rows = [(student_id, records[student_id]) for student_id in set(params[1:])
+                         if records.get(student_id)]
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+
+class FakeConnection:
+    def __init__(self, records):
+        self.records = records
+        self.staged = {}
+        self.updated = []
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['filename', 'student_id', 'grade'])
+        writer.writerows((CLASS_FILE, student_id, grade) for student_id, grade in rows)
+    return path
+
+
+def test_conflicting_grades_are_a_warning(tmp_path):
+    # 10003 is listed twice, with different grades, but has too many
+    # records to be updated, so the file still succeeds
+    csv_path = write_csv(tmp_path / 'grades_extract_2021T2E_EHSS-03.csv',
+                         [('10001', 'A'), ('10002', 'B'), ('10003', 'C'), ('10003', 'B')])
+    records = {'10001': 2, '10002': 3, '10003': 4}
+    pool = ConnectionPool(connect=lambda: FakeConnection(records))
+
+    for options in [dict(dry_run=True), dict(dry_run=False), dict(dry_run=False, staged=False)]:
+        results = process_csv_file(csv_path, min_match_percent=0, pool=pool, **options)
+        assert results['success'], options
+        assert results['errors'] == []
+        assert results['warnings'] == ['Conflicting grades: 10003 (C/B)']
+        if not options['dry_run']:
+            assert results['updated_records'] == 5
+            assert results['student_updates'] == {'10001': 2, '10002': 3, '10003': 0}
+
+        report = generate_audit_report([results], options['dry_run'])
+        successful = report.split('SUCCESSFUL FILES:')[1].split('FAILED FILES:')[0]
+        assert 'Warning: Conflicting grades: 10003 (C/B)' in successful
+
+
+def test_repeated_updated_student_fails_the_file(tmp_path):
+    csv_path = write_csv(tmp_path / 'grades_extract_2021T2E_EHSS-03.csv',
+                         [('10001', 'A'), ('10002', 'B'), ('10002', 'C')])
+    pool = ConnectionPool(connect=lambda: FakeConnection({'10001': 2, '10002': 2}))
+
+    for staged in (True, False):
+        results = process_csv_file(csv_path, dry_run=False, min_match_percent=0, pool=pool, staged=staged)
+        assert not results['success']
+        assert results['errors'] == ['Update mismatch: 3/2']
+        assert results['warnings'] == ['Conflicting grades: 10002 (B/C)']
+
+
+def test_rows_updated_are_counted_when_rowcount_is_unknown(tmp_path):
+    csv_path = write_csv(tmp_path / 'grades_extract_2021T2E_EHSS-03.csv',
+                         [('10001', 'A'), ('10002', 'B'), ('10003', 'C'), ('10004', 'D')])
+    records = {'10001': 2, '10002': 3, '10003': 5}
+    connection = FakeConnection(records)
+    pool = ConnectionPool(connect=lambda: connection)
+
+    for staged in (True, False):
+        results = process_csv_file(csv_path, dry_run=False, min_match_percent=0, pool=pool, staged=staged)
+        assert results['success'], staged
+        assert results['student_updates'] == {'10001': 2, '10002': 3, '10003': 0, '10004': 0}
+        assert results['updated_records'] == 5
+    assert connection.commits == 2
@@ -11,14 +11,20 @@ import csv
 import re
 import argparse
 import shutil
+import textwrap
 from pathlib import Path
 from datetime import datetime
-from database.connection import get_db_connection
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from database.connection import get_pool
+from database.queries import MAX_LIST_SIZE, get_queries, values_batches
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Times a file is run again after its transaction was chosen as a deadlock
+# victim (and rolled back) while running alongside other files
+DEADLOCK_RETRIES = 2
+
 
 def parse_filename_column(filename_value):
     """
@@ -64,7 +70,25 @@ def get_class_pattern(class_code):
     return f"%{class_code}%"
 
 
-def find_best_class_match(cursor, class_pattern, student_ids_str):
+def count_class_records(cursor, class_pattern, student_ids):
+    """
+    Count each student's records for this class across ALL time, in one
+    grouped query per MAX_LIST_SIZE students.
+
+    Returns: {student_id: record_count}; students with no records are left out.
+    """
+    queries = get_queries()
+    student_ids = list(student_ids)
+    counts = {}
+    for start in range(0, len(student_ids), MAX_LIST_SIZE):
+        batch = student_ids[start:start + MAX_LIST_SIZE]
+        queries.execute(cursor, 'count_class_records', class_pattern, rows=batch)
+        for student_id, record_count in cursor.fetchall():
+            counts[str(student_id).strip()] = record_count
+    return counts
+
+
+def find_best_class_match(cursor, class_pattern, student_ids):
     """
     Find students who have 2-3 total records for this class (normal enrollment).
     Skips students with 4+ records (likely failed and retook multiple times).
@@ -74,20 +98,9 @@ def find_best_class_match(cursor, class_pattern, student_ids_str):
     matched_students = 0
     skipped_students = 0
 
-    student_list = student_ids_str.split("', '")
-
-    for student_id in student_list:
-        # Count total records for this student-class combination across ALL time
-        count_query = f"""
-            SELECT COUNT(*)
-            FROM AcademicCourseTakers
-            WHERE classid LIKE '{class_pattern}'
-              AND ID = '{student_id}'
-              AND section NOT IN ('87', '147')
-              AND Attendance = 'Normal'
-        """
-        cursor.execute(count_query)
-        record_count = cursor.fetchone()[0]
+    counts = count_class_records(cursor, class_pattern, student_ids)
+    for student_id in student_ids:
+        record_count = counts.get(student_id, 0)
 
         # Only include students with 2-3 records (normal enrollment, one class instance)
         if record_count >= 2 and record_count <= 3:
@@ -98,7 +111,76 @@ def find_best_class_match(cursor, class_pattern, student_ids_str):
     return matched_students, skipped_students
 
 
-def process_csv_file(csv_path, dry_run=True, min_match_percent=80):
+def _rows_updated(cursor, grades):
+    """
+    Count the rows each student had updated, from the IDs captured in
+    #updated_ids, then drop the temp tables so the pooled connection can
+    stage the next file.
+
+    Returns: {student_id: rows_affected}
+    """
+    queries = get_queries()
+    queries.execute(cursor, 'count_updated_ids')
+    updated = {str(student_id).strip(): count for student_id, count in cursor.fetchall()}
+    queries.execute(cursor, 'drop_staging')
+    return {student_id: updated.get(student_id, 0) for student_id in grades}
+
+
+def apply_updates_per_student(cursor, class_pattern, grades):
+    """
+    Update each student's grade with its own UPDATE, whose subquery checks
+    the student still has 2-3 records for this class. Updated rows are
+    captured with OUTPUT, as in apply_updates_staged.
+
+    Returns: {student_id: rows_affected}
+    """
+    queries = get_queries()
+    queries.execute(cursor, 'drop_staging')
+    queries.execute(cursor, 'create_staging')
+    for student_id, grade in grades.items():
+        queries.execute(cursor, 'apply_class_grade', grade, student_id, class_pattern)
+    return _rows_updated(cursor, grades)
+
+
+def apply_updates_staged(cursor, class_pattern, grades):
+    """
+    Update every student's grade with one joined UPDATE: the (ID, grade)
+    pairs are staged in a temp table, students with 2-3 records for this
+    class are found with one GROUP BY, and the IDs of updated rows are
+    captured with OUTPUT to count rows affected per student.
+
+    Runs in the caller's transaction.
+
+    Returns: {student_id: rows_affected}
+    """
+    queries = get_queries()
+    queries.execute(cursor, 'drop_staging')
+    queries.execute(cursor, 'create_staging')
+    for batch in values_batches(grades.items()):
+        queries.execute(cursor, 'stage_grades', rows=batch)
+
+    # Eligibility (2-3 records across ALL time) is computed once, for every
+    # staged student, and the UPDATE joins against it
+    queries.execute(cursor, 'apply_staged_grades', class_pattern)
+    return _rows_updated(cursor, grades)
+
+
+def sample_class_records(cursor, class_pattern, student_ids, limit=5):
+    """The first limit records (by ID) the update would touch, for the dry-run sample."""
+    queries = get_queries()
+    student_ids = sorted(student_ids)
+    samples = []
+    # Batches are in ID order, so the first batches' rows come first
+    for start in range(0, len(student_ids), MAX_LIST_SIZE):
+        queries.execute(cursor, 'sample_class_records', class_pattern,
+                        rows=student_ids[start:start + MAX_LIST_SIZE])
+        samples.extend(cursor.fetchall())
+        if len(samples) >= limit:
+            break
+    return samples[:limit]
+
+
+def process_csv_file(csv_path, dry_run=True, min_match_percent=80, pool=None, staged=True):
     """
     Process a single CSV file and update/query the database.
 
@@ -106,11 +188,15 @@ def process_csv_file(csv_path, dry_run=True, min_match_percent=80):
         csv_path: Path to the CSV file
         dry_run: If True, only SELECT to verify. If False, perform UPDATE.
         min_match_percent: Minimum match percentage to consider success (default 80%)
+        pool: ConnectionPool to check a connection out of (default: the shared pool)
+        staged: If True, apply the file's grades with one staged UPDATE; if False,
+            with one UPDATE per student
 
     Returns:
         dict with processing results
     """
     logger.info(f"Processing: {csv_path.name}")
+    pool = pool or get_pool()
 
     results = {
         'file': csv_path.name,
@@ -122,7 +208,9 @@ def process_csv_file(csv_path, dry_run=True, min_match_percent=80):
         'class_code': None,
         'termid': None,
         'success': False,
-        'errors': []
+        'errors': [],
+        'warnings': [],  # reported, but don't fail the file
+        'student_updates': {},  # student_id -> rows affected (real mode)
     }
 
     try:
@@ -157,106 +245,93 @@ def process_csv_file(csv_path, dry_run=True, min_match_percent=80):
                 grade = row['grade'].strip().upper()
                 student_data.append({'id': student_id, 'grade': grade})
 
+            # Flag students listed more than once with different grades
+            # (e.g. from two source workbooks); only the last row's grade
+            # is applied. A warning, not an error: whether the file
+            # succeeds is still decided by the match and update counts
+            grades_by_student = {}
+            for s in student_data:
+                grades_by_student.setdefault(s['id'], []).append(s['grade'])
+            conflicting = sorted(student_id for student_id, grades in grades_by_student.items()
+                                 if len(set(grades)) > 1)
+            if conflicting:
+                details = ', '.join(f"{student_id} ({'/'.join(grades_by_student[student_id])})"
+                                    for student_id in conflicting)
+                logger.warning(f"  ⚠ Students listed with different grades: {details}")
+                results['warnings'].append(f"Conflicting grades: {details}")
+
             # Get list of unique student IDs
             unique_student_ids = list(set(s['id'] for s in student_data))
-            student_ids_str = "', '".join(unique_student_ids)
 
-            # Connect to database
-            conn = get_db_connection()
-            cursor = conn.cursor()
+            # Check a connection out of the pool
+            with pool.connection() as conn:
+                cursor = conn.cursor()
 
-            # Find matching students (2-3 records = normal enrollment)
-            matched_count, skipped_repeats = find_best_class_match(
-                cursor, class_pattern, student_ids_str
-            )
+                # Find matching students (2-3 records = normal enrollment)
+                matched_count, skipped_repeats = find_best_class_match(
+                    cursor, class_pattern, unique_student_ids
+                )
 
-            results['matched_students'] = matched_count
-            results['unmatched_students'] = len(unique_student_ids) - matched_count
-            results['match_percent'] = (matched_count / len(unique_student_ids) * 100) if len(unique_student_ids) > 0 else 0
+                results['matched_students'] = matched_count
+                results['unmatched_students'] = len(unique_student_ids) - matched_count
+                results['match_percent'] = (matched_count / len(unique_student_ids) * 100) if len(unique_student_ids) > 0 else 0
 
-            if matched_count == 0:
-                logger.warning(f"  ✗ No matching records found in database")
-                results['errors'].append("No matching records in database")
-                conn.close()
-                return results
+                if matched_count == 0:
+                    logger.warning(f"  ✗ No matching records found in database")
+                    results['errors'].append("No matching records in database")
+                    return results
 
-            logger.info(f"  Matched: {matched_count}/{len(unique_student_ids)} students ({results['match_percent']:.1f}%)")
-            if skipped_repeats > 0:
-                logger.info(f"  Skipped {skipped_repeats} students with 4+ records (took class multiple times)")
+                logger.info(f"  Matched: {matched_count}/{len(unique_student_ids)} students ({results['match_percent']:.1f}%)")
+                if skipped_repeats > 0:
+                    logger.info(f"  Skipped {skipped_repeats} students with 4+ records (took class multiple times)")
 
-            # Check if match percentage is acceptable
-            if results['match_percent'] < min_match_percent:
-                logger.warning(f"  ⚠ Match rate {results['match_percent']:.1f}% below threshold {min_match_percent}%")
-                results['errors'].append(f"Low match rate: {results['match_percent']:.1f}% < {min_match_percent}%")
-                conn.close()
-                return results
+                # Check if match percentage is acceptable
+                if results['match_percent'] < min_match_percent:
+                    logger.warning(f"  ⚠ Match rate {results['match_percent']:.1f}% below threshold {min_match_percent}%")
+                    results['errors'].append(f"Low match rate: {results['match_percent']:.1f}% < {min_match_percent}%")
+                    return results
+
+                if dry_run:
+                    logger.info(f"  DRY RUN - Would update grades for {matched_count} students")
+
+                    # Show sample of what would be updated
+                    samples = sample_class_records(cursor, class_pattern, unique_student_ids)
+
+                    logger.info(f"  Sample records to update:")
+                    for record in samples:
+                        student_id = record[0]
+                        current_grade = record[2].strip() if record[2] else 'NULL'
+                        new_grade = next((s['grade'] for s in student_data if s['id'] == student_id), '?')
+                        logger.info(f"    {student_id} | {record[1]} | Section {record[3]} | {current_grade} → {new_grade}")
 
-            if dry_run:
-                logger.info(f"  DRY RUN - Would update grades for {matched_count} students")
-
-                # Show sample of what would be updated
-                sample_query = f"""
-                    SELECT TOP 5 ID, classid, Grade, section
-                    FROM AcademicCourseTakers
-                    WHERE classid LIKE '{class_pattern}'
-                      AND ID IN ('{student_ids_str}')
-                      AND section NOT IN ('87', '147')
-                      AND Attendance = 'Normal'
-                    ORDER BY ID
-                """
-                cursor.execute(sample_query)
-                samples = cursor.fetchall()
-
-                logger.info(f"  Sample records to update:")
-                for record in samples:
-                    student_id = record[0]
-                    current_grade = record[2].strip() if record[2] else 'NULL'
-                    new_grade = next((s['grade'] for s in student_data if s['id'] == student_id), '?')
-                    logger.info(f"    {student_id} | {record[1]} | Section {record[3]} | {current_grade} → {new_grade}")
-
-                results['success'] = True
-            else:
-                logger.info(f"  REAL UPDATE - Updating grades...")
-
-                # Update each student's grade (only if they have 2-3 total records)
-                updated_count = 0
-                for student in student_data:
-                    # Update uses subquery to validate 2-3 records
-                    update_query = f"""
-                        UPDATE AcademicCourseTakers
-                        SET Grade = '{student['grade']}'
-                        WHERE ID = '{student['id']}'
-                          AND classid LIKE '{class_pattern}'
-                          AND section NOT IN ('87', '147')
-                          AND Attendance = 'Normal'
-                          AND (
-                            SELECT COUNT(*)
-                            FROM AcademicCourseTakers AS t
-                            WHERE t.ID = '{student['id']}'
-                              AND t.classid LIKE '{class_pattern}'
-                              AND t.section NOT IN ('87', '147')
-                              AND t.Attendance = 'Normal'
-                          ) BETWEEN 2 AND 3
-                    """
-
-                    cursor.execute(update_query)
-                    rows_affected = cursor.rowcount
-
-                    if rows_affected > 0:
-                        updated_count += 1
-                        results['updated_records'] += rows_affected
-
-                conn.commit()
-
-                logger.info(f"  ✓ Updated {updated_count} students ({results['updated_records']} total records)")
-
-                if updated_count == matched_count:
                     results['success'] = True
                 else:
-                    logger.warning(f"  ⚠ Expected to update {matched_count} students but only updated {updated_count}")
-                    results['errors'].append(f"Update mismatch: {updated_count}/{matched_count}")
+                    logger.info(f"  REAL UPDATE - Updating grades...")
+
+                    # Last grade in the file wins for a student listed twice,
+                    # as when each row was applied in turn
+                    grades = {student['id']: student['grade'] for student in student_data}
+                    if staged:
+                        rows_affected = apply_updates_staged(cursor, class_pattern, grades)
+                    else:
+                        rows_affected = apply_updates_per_student(cursor, class_pattern, grades)
+
+                    # Counted per CSV row: an updated student listed twice counts
+                    # twice, so the file fails the check below and is moved to
+                    # failed/ for review
+                    results['student_updates'] = rows_affected
+                    updated_count = sum(1 for s in student_data if rows_affected[s['id']] > 0)
+                    results['updated_records'] = sum(rows_affected[s['id']] for s in student_data)
+
+                    conn.commit()
 
-            conn.close()
+                    logger.info(f"  ✓ Updated {updated_count} students ({results['updated_records']} total records)")
+
+                    if updated_count == matched_count:
+                        results['success'] = True
+                    else:
+                        logger.warning(f"  ⚠ Expected to update {matched_count} students but only updated {updated_count}")
+                        results['errors'].append(f"Update mismatch: {updated_count}/{matched_count}")
 
     except Exception as e:
         logger.error(f"  ✗ Error processing {csv_path.name}: {e}")
@@ -278,6 +353,106 @@ def move_to_failed(csv_path, failed_dir):
         return False
 
 
+def file_footprint(csv_path):
+    """
+    The class pattern and student IDs a CSV file's updates touch, read
+    without the database, or None if the file can't be read.
+    """
+    try:
+        with open(csv_path, 'r') as f:
+            rows = list(csv.DictReader(f))
+        if not rows:
+            return None
+        class_code, _ = parse_filename_column(rows[0]['filename'])
+        return get_class_pattern(class_code), {row['student_id'].zfill(5) for row in rows}
+    except Exception:
+        return None
+
+
+def group_conflicting_files(csv_files):
+    """
+    Group files so that any two files whose updates could touch the same
+    (class pattern, student) rows are in the same group. Patterns are
+    substring matches, so '%EHSS-1%' also reaches EHSS-10's rows: two files
+    conflict when they share a student and one pattern contains the other.
+
+    Returns: lists of indexes into csv_files, each in file order, with the
+    groups ordered by their first file.
+    """
+    parent = list(range(len(csv_files)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    files_by_student = {}
+    for i, csv_path in enumerate(csv_files):
+        footprint = file_footprint(csv_path)
+        if footprint is None:
+            continue
+        class_pattern, student_ids = footprint
+        core = class_pattern.strip('%')
+        for student_id in student_ids:
+            files_by_student.setdefault(student_id, []).append((i, core))
+
+    for entries in files_by_student.values():
+        for n, (i, core) in enumerate(entries):
+            for j, other in entries[:n]:
+                if core in other or other in core:
+                    parent[find(i)] = find(j)
+
+    groups = {}
+    for i in range(len(csv_files)):
+        groups.setdefault(find(i), []).append(i)
+    return sorted(groups.values())
+
+
+def _is_deadlock(results):
+    return any('deadlock' in error.lower() for error in results['errors'])
+
+
+def process_files_concurrently(csv_files, workers, pool, failed_dir=None, **options):
+    """
+    Process csv_files with up to workers files in flight, each on its own
+    pooled connection. Files that conflict (see group_conflicting_files)
+    run one after another in a single worker, so they can't race or
+    deadlock on the same rows; a file that still loses a deadlock to an
+    unrelated file is run again, up to DEADLOCK_RETRIES times.
+
+    Failed files are moved to failed_dir (if given) as their group finishes.
+    options are passed to process_csv_file.
+
+    Returns: the results for every file, in the order of csv_files.
+    """
+    def run_group(indexes):
+        group_results = []
+        for i in indexes:
+            results = process_csv_file(csv_files[i], pool=pool, **options)
+            for _ in range(DEADLOCK_RETRIES):
+                if results['success'] or not _is_deadlock(results):
+                    break
+                logger.warning(f"  Deadlock on {csv_files[i].name}; running it again")
+                results = process_csv_file(csv_files[i], pool=pool, **options)
+            group_results.append((i, results))
+        return group_results
+
+    groups = group_conflicting_files(csv_files)
+    logger.info(f"Running {len(csv_files)} file(s) in {len(groups)} independent group(s) "
+                f"on {workers} worker(s)\n")
+
+    all_results = [None] * len(csv_files)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_group, indexes) for indexes in groups]
+        for future in as_completed(futures):
+            for i, results in future.result():
+                all_results[i] = results
+                if failed_dir is not None and not results['success']:
+                    move_to_failed(csv_files[i], failed_dir)
+    return all_results
+
+
 def generate_audit_report(all_results, dry_run, output_file=None):
     """Generate detailed audit report."""
 
@@ -324,6 +499,8 @@ def generate_audit_report(all_results, dry_run, output_file=None):
                 f"  ✓ {r['file']:<50} | {r['class_code']:<12} | {r['termid']:<15} | "
                 f"{r['matched_students']:>3}/{r['total_students']:>3} students ({r['match_percent']:>5.1f}%)"
             )
+            for warning in r['warnings']:
+                report_lines.append(f"     Warning: {warning}")
 
     if not any(r['success'] for r in all_results):
         report_lines.append("  (none)")
@@ -343,11 +520,34 @@ def generate_audit_report(all_results, dry_run, output_file=None):
                 f"  ✗ {r['file']:<50} | {r['class_code']:<12} | {r['termid']:<15}"
             )
             report_lines.append(f"     Reason: {errors}")
+            for warning in r['warnings']:
+                report_lines.append(f"     Warning: {warning}")
             report_lines.append(f"     Match: {r['matched_students']}/{r['total_students']} students ({r['match_percent']:.1f}%)")
 
     if not any(not r['success'] for r in all_results):
         report_lines.append("  (none)")
 
+    # Rows affected per student, for every file that ran its UPDATE
+    if not dry_run:
+        report_lines.extend([
+            "",
+            "=" * 80,
+            "RECORDS UPDATED PER STUDENT:",
+            "=" * 80,
+        ])
+        listed = False
+        for r in all_results:
+            entries = [f"{student_id}:{count}" for student_id, count in sorted(r['student_updates'].items())
+                       if count > 0]
+            if entries:
+                listed = True
+                report_lines.append(f"  {r['file']}  (student ID:records)")
+                report_lines.extend(textwrap.wrap(' '.join(entries), width=76,
+                                                  initial_indent='     ', subsequent_indent='     '))
+
+        if not listed:
+            report_lines.append("  (none)")
+
     report_lines.extend([
         "",
         "=" * 80,
@@ -368,6 +568,8 @@ def generate_audit_report(all_results, dry_run, output_file=None):
 
 
 def main():
+    logging.basicConfig(level=logging.INFO)
+
     parser = argparse.ArgumentParser(
         description='Update MSSQL database with grades from extracted CSV files'
     )
@@ -392,6 +594,18 @@ def main():
         default=80,
         help='Minimum match percentage to consider success (default: 80)'
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Process up to N files at once, each on its own connection; files that update '
+             'the same students in overlapping classes still run one after another (default: 1)'
+    )
+    parser.add_argument(
+        '--per-student-updates',
+        action='store_true',
+        help='Issue one UPDATE per student instead of one staged UPDATE per file'
+    )
     parser.add_argument(
         '--audit-report',
         type=str,
@@ -425,17 +639,31 @@ def main():
 
     logger.info(f"Found {len(csv_files)} file(s) to process\n")
 
-    # Process each file
-    all_results = []
-    for csv_file in csv_files:
-        results = process_csv_file(csv_file, dry_run=args.dry_run, min_match_percent=args.min_match)
-        all_results.append(results)
+    # Process each file, reusing pooled connections across files
+    pool = get_pool()
+    options = {'dry_run': args.dry_run, 'min_match_percent': args.min_match,
+               'staged': not args.per_student_updates}
+    if args.workers > 1:
+        # Each worker holds a connection while it runs a file
+        pool.max_size = max(pool.max_size, args.workers)
+        all_results = process_files_concurrently(csv_files, args.workers, pool,
+                                                 failed_dir=None if args.dry_run else failed_dir,
+                                                 **options)
+    else:
+        all_results = []
+        for csv_file in csv_files:
+            results = process_csv_file(csv_file, pool=pool, **options)
+            all_results.append(results)
+
+            # Move failed files to failed/ directory (only in real mode)
+            if not args.dry_run and not results['success']:
+                move_to_failed(csv_file, failed_dir)
 
-        # Move failed files to failed/ directory (only in real mode)
-        if not args.dry_run and not results['success']:
-            move_to_failed(csv_file, failed_dir)
+            logger.info("")
 
-        logger.info("")
+    logger.info(f"Connection pool: {pool.describe()}")
+    logger.info(f"Statements: {get_queries().describe()}")
+    pool.close()
 
     # Generate audit report
     audit_file = args.audit_report if args.audit_report else None